@@ -1,7 +1,10 @@
 from ai.agents.Business.business_info_structure import BusinessInfoStructure
-from config.models.structured_anthropic import StructuredAnthropicChat
+from config.models.structured_chat import StructuredChat
+
+class BusinessAgent(StructuredChat):
+    # The business type only depends on the description
+    cacheable = True
 
-class BusinessAgent(StructuredAnthropicChat):
     def __init__(self):
         super().__init__()
         self.add_system_message(f"""You are a agent that reads what the user said about a business and your tasks is to answer what type of business it is. """)
@@ -9,4 +12,4 @@ class BusinessAgent(StructuredAnthropicChat):
 
     
     def get_model_assistant_message(self, model_response):
-        return model_response.business_type
\ No newline at end of file
+        return model_response.business_type.value
\ No newline at end of file
@@ -0,0 +1,215 @@
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: learned counts are still merged, only the cross-process file lock is missing
+    fcntl = None
+
+from ai.agents.Business.business_type import BusinessType
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Hand-picked hints so the classifier is useful before it has seen any labelled session
+SEED_KEYWORDS = {
+    BusinessType.e_commerce: [
+        "tienda", "tiendas", "vender", "vendo", "vendemos", "venta", "ventas", "producto", "productos",
+        "catalogo", "carrito", "compra", "compras", "comprar", "pedido", "pedidos", "orden", "ordenes",
+        "envio", "envios", "delivery", "domicilio", "pago", "pagos", "pagar", "precio", "precios",
+        "stock", "inventario", "ecommerce", "shop", "store", "checkout", "descuento", "descuentos",
+    ],
+    BusinessType.simple_informative: [
+        "informacion", "informar", "informativo", "horario", "horarios", "ubicacion", "direccion",
+        "contacto", "consulta", "consultas", "preguntas", "frecuentes", "faq", "dudas", "servicio",
+        "servicios", "cita", "citas", "agendar", "atencion", "soporte", "requisitos", "tramite",
+        "tramites", "clinica", "consultorio", "colegio", "universidad", "oficina", "sucursales",
+    ],
+}
+
+
+class BusinessClassifier:
+    """
+    Local naive Bayes classifier that answers the business type without calling the LLM.
+
+    It starts from SEED_KEYWORDS and learns from every label BusinessAgent returns. Only
+    predictions with a posterior of at least threshold are used directly; a random
+    audit_rate of those still go to the LLM so the agreement stats measure its accuracy.
+
+    Several processes can learn into the same file: every save re-reads it under a file lock
+    and adds this instance's unsaved counts to what is there. Use shared_classifier() for
+    one instance per file in a process.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.9, audit_rate: float = 0.05,
+                 seed_weight: float = 3.0):
+        self.path = path
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.seed_weight = seed_weight
+        # label -> number of labelled descriptions / token -> count
+        self.doc_counts: Dict[str, int] = {label.value: 0 for label in BusinessType}
+        self.token_counts: Dict[str, Dict[str, float]] = {label.value: {} for label in BusinessType}
+        # fast_path: answered locally, confident_*: audited confident predictions,
+        # uncertain_*: fallbacks where the local guess is compared with the LLM label
+        self.stats = {"fast_path": 0, "llm_calls": 0, "audits": 0,
+                      "confident_agreements": 0, "confident_disagreements": 0,
+                      "uncertain_agreements": 0, "uncertain_disagreements": 0}
+        # Learned since the last save, added to the file's counts when saving
+        self._pending_docs: Dict[str, int] = {}
+        self._pending_tokens: Dict[str, Dict[str, float]] = {}
+        self._pending_stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        with self._file_lock():
+            self._load()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        text = unicodedata.normalize("NFKD", text.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        return [word for word in re.findall(r"[a-z0-9]+", text) if len(word) > 2]
+
+    def predict(self, text: str) -> Tuple[BusinessType, float]:
+        """Most likely business type and its posterior probability."""
+        counts = self._counts_with_seeds()
+        vocabulary = set().union(*(tokens.keys() for tokens in counts.values()))
+        doc_counts = {label: count + self._pending_docs.get(label, 0) for label, count in self.doc_counts.items()}
+        total_docs = sum(doc_counts.values())
+        scores = {}
+        for label, tokens in counts.items():
+            label_total = sum(tokens.values())
+            score = math.log((doc_counts[label] + 1) / (total_docs + len(counts)))
+            for token in self.tokenize(text):
+                # Unknown words say nothing about the label, skip them instead of smoothing
+                if token in vocabulary:
+                    score += math.log((tokens.get(token, 0) + 1) / (label_total + len(vocabulary)))
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return BusinessType(best), 1 / norm
+
+    def classify(self, text: str) -> Optional[BusinessType]:
+        """Business type when the local prediction is confident enough, None to ask the LLM."""
+        label, confidence = self.predict(text)
+        if confidence < self.threshold:
+            return None
+        if random.random() < self.audit_rate:
+            self._count("audits")
+            return None
+        self._count("fast_path")
+        logger.info(f"Business type {label.value} classified locally ({confidence:.2f}), stats: {self.stats}")
+        return label
+
+    def learn(self, text: str, label: BusinessType) -> None:
+        """Record the LLM label for text, updating the agreement stats and the model."""
+        predicted, confidence = self.predict(text)
+        kind = "confident" if confidence >= self.threshold else "uncertain"
+        outcome = "agreements" if predicted == label else "disagreements"
+        with self._lock:
+            self._count("llm_calls")
+            self._count(f"{kind}_{outcome}")
+            self._pending_docs[label.value] = self._pending_docs.get(label.value, 0) + 1
+            tokens = self._pending_tokens.setdefault(label.value, {})
+            for token in self.tokenize(text):
+                tokens[token] = tokens.get(token, 0) + 1
+        logger.info(f"Local business type {predicted.value} ({confidence:.2f}) vs LLM {label.value}, stats: {self.stats}")
+        self._save()
+
+    def _count(self, stat: str) -> None:
+        self.stats[stat] += 1
+        self._pending_stats[stat] = self._pending_stats.get(stat, 0) + 1
+
+    def _counts_with_seeds(self) -> Dict[str, Dict[str, float]]:
+        counts = {label: dict(tokens) for label, tokens in self.token_counts.items()}
+        for label, tokens in self._pending_tokens.items():
+            for token, count in tokens.items():
+                counts[label][token] = counts[label].get(token, 0) + count
+        for label, keywords in SEED_KEYWORDS.items():
+            for keyword in keywords:
+                counts[label.value][keyword] = counts[label.value].get(keyword, 0) + self.seed_weight
+        return counts
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for label in BusinessType:
+                self.doc_counts[label.value] = data["doc_counts"].get(label.value, 0)
+                self.token_counts[label.value] = data["token_counts"].get(label.value, {})
+            for stat, value in data.get("stats", {}).items():
+                self.stats[stat] = value + self._pending_stats.get(stat, 0)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable business classifier data {self.path}: {e}")
+
+    @contextmanager
+    def _file_lock(self):
+        # Serializes the read-merge-write of every process learning into the same file
+        if not self.path or fcntl is None:
+            yield
+            return
+        try:
+            lock_file = open(f"{self.path}.lock", "a")
+        except OSError as e:
+            logger.warning(f"Couldn't lock business classifier data: {e}")
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._lock, self._file_lock():
+            # Counts other sessions and processes saved since we last read the file
+            self._load()
+            doc_counts = dict(self.doc_counts)
+            token_counts = {label: dict(tokens) for label, tokens in self.token_counts.items()}
+            for label, count in self._pending_docs.items():
+                doc_counts[label] += count
+            for label, tokens in self._pending_tokens.items():
+                for token, count in tokens.items():
+                    token_counts[label][token] = token_counts[label].get(token, 0) + count
+            data = {"doc_counts": doc_counts, "token_counts": token_counts, "stats": self.stats}
+            try:
+                # A unique tmp file per writer, os.replace swaps it in atomically
+                fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.path)}.", suffix=".tmp",
+                                                dir=os.path.dirname(self.path) or None)
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(data, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except OSError as e:
+                logger.warning(f"Couldn't save business classifier data: {e}")
+                return
+            self.doc_counts, self.token_counts = doc_counts, token_counts
+            self._pending_docs, self._pending_tokens, self._pending_stats = {}, {}, {}
+
+
+_classifiers: Dict[str, BusinessClassifier] = {}
+_classifiers_lock = threading.Lock()
+
+
+def shared_classifier(path: str) -> BusinessClassifier:
+    """The process-wide classifier learning into path, every wizard session shares it."""
+    path = os.path.abspath(path)
+    with _classifiers_lock:
+        classifier = _classifiers.get(path)
+        if classifier is None:
+            classifier = _classifiers[path] = BusinessClassifier(path)
+        return classifier
@@ -1,8 +1,8 @@
 from ai.agents.Business.business_info_structure import BusinessInfoStructure
-from config.models.structured_anthropic import StructuredAnthropicChat
+from config.models.structured_chat import StructuredChat
 
 
-class BusinessFlowAgent(StructuredAnthropicChat):
+class BusinessFlowAgent(StructuredChat):
     def __init__(self):
         super().__init__()
         self.add_system_message(f"""You are an agent that will create a workflow of tasks based on business 
@@ -1,11 +1,14 @@
 from ai.agents.Business.flow.business_flow_agent import BusinessFlowAgent
 from ai.agents.Business.flow.ebusiness_workflow_structure import EBusinessWorkflowStructure
-from config.models.structured_anthropic import StructuredAnthropicChat
-from config.models.structured_openai import StructuredOpenAIChat
+from ai.agents.Business.flow.workflow_edit_structure import EBusinessWorkflowEditStructure
+from ai.agents.Business.flow.workflow_steps import WORKFLOW_EDIT_INSTRUCTIONS, workflow_edit_assistant_message
+from config.models.structured_chat import StructuredChat
 
-class SimpleInformativeFlowAgent(StructuredOpenAIChat):
-    def __init__(self):
+class SimpleInformativeFlowAgent(StructuredChat):
+    def __init__(self,workflow_steps=None):
         super().__init__()
+        # With a WorkflowSteps document the model returns step edits instead of the whole workflow
+        self.workflow_steps = workflow_steps
         # self.add_system_message(f"""You are an agent that will create a ai agent workflow of tasks using for a chat e-business based on business 
         # info and also on what the user tells you needs to be in the workflow.
         # **Business info**
@@ -50,6 +53,14 @@ class SimpleInformativeFlowAgent(StructuredOpenAIChat):
         -Añade como nota importante:"No uses bloque inputs o mensajes con botones. Que los mensajes deben ser simples y directos".
         """)
         self.response_format = EBusinessWorkflowStructure
+        if workflow_steps is not None:
+            self.add_system_message(WORKFLOW_EDIT_INSTRUCTIONS)
+            self.response_format = EBusinessWorkflowEditStructure
     
     def get_model_assistant_message(self, model_response):
-        return model_response.bot_response
\ No newline at end of file
+        if self.workflow_steps is not None:
+            return workflow_edit_assistant_message(model_response)
+        return model_response.bot_response
+
+    def get_turn_context(self):
+        return self.workflow_steps.context_text() if self.workflow_steps is not None else None
\ No newline at end of file
@@ -0,0 +1,22 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+WORKFLOW_EDIT_OPS = ["insert", "replace", "delete", "move"]
+
+
+class WorkflowEditOperation(BaseModel):
+    # A str with the enum only in the schema: the edits are streamed, and a half-streamed Literal ("mo") fails validation.
+    # WorkflowSteps.apply skips unknown operations
+    op: str = Field(..., description="insert a new step, replace a step text, delete a step or move a step to another position",
+                    json_schema_extra={"enum": WORKFLOW_EDIT_OPS})
+    index: Optional[int] = Field(default=None, description="1-based step number the operation applies to. For insert it is the position the new step will take (leave empty to append at the end)")
+    to_index: Optional[int] = Field(default=None, description="Only for move: 1-based position the step ends up in")
+    text: Optional[str] = Field(default=None, description="Only for insert and replace: full text of the step, without its number")
+
+
+# Patch-based counterpart of EBusinessWorkflowStructure: step edits instead of the whole workflow
+class EBusinessWorkflowEditStructure(BaseModel):
+    bot_response:str =Field(...,description="Bot response, never write the workflow in this message.")
+    user_want_workflow:bool = Field(..., description="If the user at the instant says that wants to see the workflow(ignore past user petitions to see the workflow)")
+    edits: List[WorkflowEditOperation] = Field(default_factory=list, description="Step edits applied in order to the current workflow. Only the steps that change, empty if nothing changes. For the first workflow insert every step in order.")
+    user_confirmed: bool = Field(description="If the user confirmed or says that the business workflow is correct")
@@ -0,0 +1,74 @@
+from typing import List, Optional
+
+
+WORKFLOW_EDIT_INSTRUCTIONS = """**Edición por pasos**
+-El flujo se guarda como una lista numerada de pasos, antes de cada mensaje del usuario recibes el flujo actual.
+-Nunca reescribas el flujo completo: en edits devuelve solo las operaciones necesarias (insert, replace, delete, move) usando los números de paso del flujo actual.
+-Para el primer flujo usa un insert por cada paso, en orden.
+-Si el usuario no pide cambios deja edits vacío."""
+
+
+class WorkflowSteps():
+    """The workflow as an ordered list of steps, edited with step-level operations."""
+
+    def __init__(self, steps: Optional[List[str]] = None):
+        self.steps: List[str] = list(steps or [])
+        # Operations from the last apply() that couldn't be applied, reported back to the model
+        self.last_errors: List[str] = []
+
+    def apply(self, edits) -> List[str]:
+        """Apply the edits in order. Invalid operations are skipped and returned as errors."""
+        errors = []
+        for edit in edits:
+            op, index, to_index, text = edit.op, edit.index, edit.to_index, edit.text
+            try:
+                if op == "insert":
+                    position = len(self.steps) + 1 if index is None else index
+                    self._check(position, len(self.steps) + 1)
+                    self.steps.insert(position - 1, self._require_text(text))
+                elif op == "replace":
+                    self._check(index, len(self.steps))
+                    self.steps[index - 1] = self._require_text(text)
+                elif op == "delete":
+                    self._check(index, len(self.steps))
+                    del self.steps[index - 1]
+                elif op == "move":
+                    self._check(index, len(self.steps))
+                    self._check(to_index, len(self.steps))
+                    self.steps.insert(to_index - 1, self.steps.pop(index - 1))
+                else:
+                    raise ValueError("unknown operation")
+            except ValueError as e:
+                errors.append(f"{op} {index}: {e}")
+        self.last_errors = errors
+        return errors
+
+    @staticmethod
+    def _check(index: Optional[int], upper: int) -> None:
+        if index is None or not 1 <= index <= upper:
+            raise ValueError(f"step number must be between 1 and {upper}")
+
+    @staticmethod
+    def _require_text(text: Optional[str]) -> str:
+        if not text or not text.strip():
+            raise ValueError("text is required")
+        return text.strip()
+
+    def render(self) -> str:
+        return "\n".join(f"{number}. {step}" for number, step in enumerate(self.steps, start=1))
+
+    def context_text(self) -> str:
+        """Current workflow for the model, sent after the newest user message (see get_turn_context)."""
+        content = "Flujo actual:\n" + (self.render() or "(vacío)")
+        if self.last_errors:
+            content += "\nEdiciones que no se pudieron aplicar:\n" + "\n".join(self.last_errors)
+        return content
+
+
+def workflow_edit_assistant_message(model_response) -> str:
+    """bot_response plus a short log of the edits made in this turn."""
+    message = model_response.bot_response
+    if model_response.edits:
+        done = ", ".join(f"{edit.op} {edit.index if edit.index is not None else ''}".strip() for edit in model_response.edits)
+        message += f"\n[Ediciones: {done}]"
+    return message
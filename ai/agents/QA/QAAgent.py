@@ -1,9 +1,13 @@
+from ai.agents.QA.question_delta_structure import QuestionResponseDeltaStructure
 from ai.agents.QA.question_response_structure import QuestionResponseStructure
-from config.models.structured_anthropic import StructuredAnthropicChat
+from ai.agents.QA.slot_store import delta_assistant_message
+from config.models.structured_chat import StructuredChat
 
-class QAAgent(StructuredAnthropicChat):
-    def __init__(self, question,answered_questions=""):
+class QAAgent(StructuredChat):
+    def __init__(self, question,answered_questions="",slot_store=None):
         super().__init__()
+        # With a slot store the model only returns the slots changed in each turn
+        self.slot_store = slot_store
         self.add_system_message(f"""You are an ai that will append what the users has being answering about a questions.After all questions have been answered ask if
         the given information is correct and then if not modify the information, if it is correct then tell that the info is correct and consider the process finished.
         **Answered Questions**
@@ -16,6 +20,23 @@ class QAAgent(StructuredAnthropicChat):
         -Talk in spanish.
         Questions: {question}""")
         self.response_format = QuestionResponseStructure
+        if slot_store is not None:
+            self.add_system_message(INCREMENTAL_INSTRUCTIONS)
+            self.response_format = QuestionResponseDeltaStructure
     
     def get_model_assistant_message(self, model_response):
-        return model_response.bot_response
\ No newline at end of file
+        if self.slot_store is not None:
+            return delta_assistant_message(model_response)
+        return model_response.bot_response
+
+    def get_history_anchor(self):
+        if self.slot_store is not None:
+            return self.slot_store.as_dict()
+        return super().get_history_anchor()
+
+
+INCREMENTAL_INSTRUCTIONS = """**Incremental answers**
+-In changed_slots write ONLY the answers that were added or changed by the user's last message, never repeat the ones you already saved.
+-In removed_slots write the questions whose answer the user asked to delete.
+-Your previous messages end with the slots you saved in that turn."""
+
@@ -0,0 +1,10 @@
+from typing import Dict, List
+from pydantic import BaseModel, Field
+
+# Incremental counterpart of QuestionResponseStructure: only what changed in this turn
+class QuestionResponseDeltaStructure(BaseModel):
+    bot_response:str = Field(..., description="Bot response.")
+    all_questions_answered:bool = Field(..., description="All questions have been answered")
+    finished :bool = Field(...,description="After all questions have been anweserd and  the user says that the info is correct.")
+    changed_slots: Dict[str, str] = Field(default_factory=dict,description="ONLY the questions (as key, written as a section) whose answer was added or changed by the user's last message, with the full answer as value. Never repeat unchanged answers.")
+    removed_slots: List[str] = Field(default_factory=list,description="Keys of previously answered questions that the user asked to remove.")
@@ -3,8 +3,9 @@ from pydantic import BaseModel, Field
 
 # 1. Define your structured schema with Pydantic (or JSON schema)
 class QuestionResponseStructure(BaseModel):
-    user_description :str = Field(...,description="The questions and all what the user said about the questions well redacted and formatted without mentioning the user.")
+    # bot_response goes first so it can be streamed to the user before the rest is generated
     bot_response:str = Field(..., description="Bot response.")
+    user_description :str = Field(...,description="The questions and all what the user said about the questions well redacted and formatted without mentioning the user.")
     all_questions_answered:bool = Field(..., description="All questions have been answered")
     finished :bool = Field(...,description="After all questions have been anweserd and  the user says that the info is correct.")
     updated_slots: Dict[str, str] = Field(...,description="Questions as key(Write is as a section) and answers as values(full answers) of what the user has answered(user answered with no info excluded).")
\ No newline at end of file
@@ -0,0 +1,32 @@
+import json
+from typing import Dict, Iterable, Optional
+
+
+class SlotStore():
+    """Slots collected during an interview, built up from the per-turn deltas the model returns."""
+
+    def __init__(self, slots: Optional[Dict[str, str]] = None):
+        self._slots: Dict[str, str] = dict(slots or {})
+
+    def apply(self, changed: Optional[Dict[str, str]] = None, removed: Optional[Iterable[str]] = None) -> None:
+        for key in removed or []:
+            self._slots.pop(key, None)
+        for key, value in (changed or {}).items():
+            self._slots[key] = value
+
+    def as_dict(self) -> Dict[str, str]:
+        return dict(self._slots)
+
+    def render(self) -> str:
+        """Questions and answers formatted like the model's user_description."""
+        return "\n\n".join(f"**{key}**\n{value}" for key, value in self._slots.items())
+
+
+def delta_assistant_message(model_response):
+    """bot_response plus the slots saved in this turn, so the model can tell what it already has."""
+    message = model_response.bot_response
+    if model_response.changed_slots:
+        message += f"\n[Guardado: {json.dumps(model_response.changed_slots, ensure_ascii=False)}]"
+    if model_response.removed_slots:
+        message += f"\n[Eliminado: {json.dumps(model_response.removed_slots, ensure_ascii=False)}]"
+    return message
@@ -1,8 +1,12 @@
+from ai.agents.QA.slot_store import delta_assistant_message
 from ai.agents.jelou_package.package_inputs import PackageInputsStructure
-from config.models.structured_anthropic import StructuredAnthropicChat
-class PackageFillerAgent(StructuredAnthropicChat):
-    def __init__(self, package_info):
+from ai.agents.jelou_package.package_inputs_delta import PackageInputsDeltaStructure
+from config.models.structured_chat import StructuredChat
+class PackageFillerAgent(StructuredChat):
+    def __init__(self, package_info, slot_store=None):
         super().__init__()
+        # With a slot store the model only returns the inputs changed in each turn
+        self.slot_store = slot_store
         self.add_system_message(f"""Your are an agent that will ask about a jelou package inputs like it were questions to the user,
          when all inputs are filled tell the user all that is filled and ask for confirmation or correction.
          Package info: {package_info}.
@@ -12,7 +16,20 @@ class PackageFillerAgent(StructuredAnthropicChat):
          Ask each REQUIRED value one by one first.
          After getting an answer about all required values then tell to the user all posible optional inputs and then ask the user if he wants to add values to them""")
         self.response_format = PackageInputsStructure
+        if slot_store is not None:
+            self.add_system_message("""**Incremental inputs**
+         In changed_slots write ONLY the inputs given or changed in the user's last message, never repeat the ones already saved.
+         In removed_slots write the inputs the user asked to clear.
+         Your previous messages end with the inputs you saved in that turn.""")
+            self.response_format = PackageInputsDeltaStructure
 
     
     def get_model_assistant_message(self, model_response):
-        return model_response.bot_response
\ No newline at end of file
+        if self.slot_store is not None:
+            return delta_assistant_message(model_response)
+        return model_response.bot_response
+
+    def get_history_anchor(self):
+        if self.slot_store is not None:
+            return self.slot_store.as_dict()
+        return super().get_history_anchor()
\ No newline at end of file
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List
+
+
+class PackageInputsDeltaStructure(BaseModel):
+    """Incremental counterpart of PackageInputsStructure: only the inputs changed in this turn."""
+    bot_response: str = Field(description="Bot response")
+    package_name: str = Field(..., description="Package name")
+    all_inputs_filled: bool = Field(description="If all inputs are filled")
+    user_confirmed: bool = Field(description="If the user confirmed the inputs after filling them")
+    changed_slots: Dict[str, str] = Field(default_factory=dict,description="ONLY the inputs (name as key) whose value was given or changed in the user's last message, with the full value. Never repeat unchanged inputs.")
+    removed_slots: List[str] = Field(default_factory=list,description="Input names whose value the user asked to remove.")
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List
+
+
+class PackageInputsDelta(BaseModel):
+    """Inputs of one package changed in this turn."""
+    package_name: str = Field(..., description="Package name, exactly as given in the packages list")
+    changed_slots: Dict[str, str] = Field(default_factory=dict,description="ONLY the inputs (name as key) whose value was filled or changed in this turn, with the full value. Never repeat unchanged inputs.")
+    removed_slots: List[str] = Field(default_factory=list,description="Input names whose value the user asked to remove.")
+
+
+class PackagesPrefillStructure(BaseModel):
+    """Inputs of every selected package, filled together from the collected answers and one conversation."""
+    bot_response: str = Field(description="Bot response")
+    packages: List[PackageInputsDelta] = Field(default_factory=list,description="One item per package whose inputs changed in this turn.")
+    all_inputs_filled: bool = Field(description="If all required inputs of every package are filled")
+    user_confirmed: bool = Field(description="If the user confirmed the inputs of every package after filling them")
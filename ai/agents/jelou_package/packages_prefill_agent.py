@@ -0,0 +1,43 @@
+import json
+
+from ai.agents.jelou_package.packages_prefill import PackagesPrefillStructure
+from config.models.structured_chat import StructuredChat
+
+
+class PackagesPrefillAgent(StructuredChat):
+    def __init__(self, packages, collected_answers, slot_stores):
+        super().__init__()
+        # package name -> SlotStore, merged by the wizard from each turn's deltas
+        self.slot_stores = slot_stores
+        packages_text = "\n".join(
+            f"- {package['info'].name}: inputs {json.dumps(package['info'].inputs, ensure_ascii=False)}"
+            + (f" (ignore these inputs, don't ask or mention them: {package['ignore_inputs']})" if package.get("ignore_inputs") else "")
+            for package in packages)
+        self.add_system_message(f"""You are an agent that fills the inputs of several jelou packages at once.
+         First fill every input you can from the answers the user already gave about the business, then in a single message
+         tell the user what you filled for each package and ask, all together, for the values still missing.
+         When all inputs are filled tell the user all that is filled and ask for confirmation or correction.
+         **Packages**
+         {packages_text}
+         **Answers already given by the user**
+         {json.dumps(collected_answers, ensure_ascii=False, indent=1)}
+
+         **Important**
+         Ask in spanish.
+         Never invent values, only use what the user said.
+         Ask about required inputs; mention the optional ones once and fill them only if the user wants to.
+         In packages write ONLY the inputs filled or changed in this turn, never repeat the ones already saved.
+         Your previous messages end with the inputs you saved in that turn.""")
+        self.response_format = PackagesPrefillStructure
+
+    def get_model_assistant_message(self, model_response):
+        message = model_response.bot_response
+        for package in model_response.packages:
+            if package.changed_slots:
+                message += f"\n[Guardado {package.package_name}: {json.dumps(package.changed_slots, ensure_ascii=False)}]"
+            if package.removed_slots:
+                message += f"\n[Eliminado {package.package_name}: {json.dumps(package.removed_slots, ensure_ascii=False)}]"
+        return message
+
+    def get_history_anchor(self):
+        return {name: slots.as_dict() for name, slots in self.slot_stores.items()}
@@ -1,33 +1,168 @@
 import asyncio
 import json
 import os
+import time
+import warnings
 from typing import Dict, Any, List, Optional
 from mcp_use import MCPAgent, MCPClient
 from langchain_anthropic import ChatAnthropic
 
 from ai.agents.jelouai.jelou_response_structure import PackageInfoStructure
+from ai.agents.jelouai.mcp_pool import MCPSessionPool
+from ai.agents.jelouai.package_parser import PackageParseError, parse_package_info, tool_result_text
+from config.models.recorder import traffic_recorder
+from config.models.routing import Route, model_router
+from config.tracing import MCP, tracer
 
 import logging
 logging.getLogger("mcp_use").setLevel(logging.CRITICAL)
 logging.getLogger("httpx").setLevel(logging.CRITICAL)
+logger = logging.getLogger(__name__)
+
+SEARCH_PACKAGES_TOOL = "search-workflow-packages"
 
 class JelouMCP():
-    
-    def __init__(self):
+    # Shared across every JelouMCP instance for the lifetime of the process
+    _pool: Optional[MCPSessionPool] = None
+    _llm: Optional[ChatAnthropic] = None
+    _route: Optional[Route] = None
+    # direct: answered by the fast path, *_fallbacks: fast path lookups the agent had to answer
+    _lookup_stats: Dict[str, int] = {"direct": 0, "parse_fallbacks": 0, "tool_error_fallbacks": 0}
+
+    def __init__(self, fast_mode: Optional[bool] = None):
+        # Fast mode calls the search tool directly and only falls back to the LLM agent when parsing fails
+        if fast_mode is None:
+            fast_mode = os.getenv('JELOU_MCP_FAST_MODE', '1').lower() not in ('0', 'false', 'no')
+        self.fast_mode = fast_mode
+        if traffic_recorder.replaying:
+            # Lookups come from the recording, no MCP server or LLM needed
+            self.pool = None
+            return
         # Initialize Anthropic client
         jelou_mcp_url = os.getenv('JELOU_MCP_URL')
         if not jelou_mcp_url:
             raise ValueError("JELOU_MCP_URL environment variable is required")
-        config = {"mcpServers": {"http": {"url": jelou_mcp_url}}}
-        mcp_client = MCPClient.from_dict(config)
-        llm = ChatAnthropic(model="claude-3-5-sonnet-20241022", api_key=os.getenv('ANTHROPIC_API_KEY'))
-        self.mcp_agent = MCPAgent(llm=llm,client=mcp_client)
-    
-    
+        if JelouMCP._pool is None:
+            config = {"mcpServers": {"http": {"url": jelou_mcp_url}}}
+            max_sessions = int(os.getenv('JELOU_MCP_MAX_SESSIONS', '4'))
+            JelouMCP._pool = MCPSessionPool(config, max_sessions=max_sessions)
+        if JelouMCP._llm is None:
+            # One LLM for the whole process, its model comes from the routing policy
+            JelouMCP._route = model_router.route("JelouMCP", "anthropic")
+            JelouMCP._llm = ChatAnthropic(model=JelouMCP._route.model, api_key=os.getenv('ANTHROPIC_API_KEY'),
+                                        default_request_timeout=JelouMCP._route.deadline)
+        self.pool = JelouMCP._pool
+
+    @classmethod
+    async def close_pool(cls) -> None:
+        """Close every pooled MCP session. Call once on shutdown."""
+        if cls._pool is not None:
+            await cls._pool.close()
+            cls._pool = None
+
+    @classmethod
+    def pool_metrics(cls) -> Dict[str, Any]:
+        metrics = cls._pool.metrics() if cls._pool is not None else {}
+        return {**metrics, "lookups": dict(cls._lookup_stats)}
+
+    async def _get_agent(self, pooled) -> MCPAgent:
+        agent = pooled.extras.get("agent")
+        if agent is None:
+            # Memory is disabled so a reused agent doesn't carry previous lookups into the next one
+            agent = MCPAgent(llm=JelouMCP._llm, client=pooled.client, memory_enabled=False)
+            await agent.initialize()
+            pooled.extras["agent"] = agent
+        return agent
+
     async def get_package_info(self, package_use: str) -> PackageInfoStructure:
         """Search workflow packages via MCP and return structured info.
         Uses tool 'search-workflow-packages' and extracts workflow syntax, inputs, and usage.
         """
-        result = await self.mcp_agent.run(f"Search for Jelou package about {package_use} and bring information of it.",output_schema=PackageInfoStructure)        
+        with tracer.span("package_info", MCP, query=package_use) as span:
+            replayed = await traffic_recorder.areplay("mcp.package_info", package_use)
+            if replayed is not None:
+                span.set(replayed=True)
+                return PackageInfoStructure.model_validate(replayed["response"])
+            started = time.perf_counter()
+            result = await self._lookup_package(package_use)
+            traffic_recorder.record("mcp.package_info", package_use, result.model_dump(mode="json"), time.perf_counter() - started)
+            return result
+
+    async def _lookup_package(self, package_use: str) -> PackageInfoStructure:
+        started = time.perf_counter()
+        async with self.pool.acquire() as pooled:
+            # Time spent waiting for a free pooled session (or opening one)
+            tracer.current().set(wait_seconds=time.perf_counter() - started)
+            if self.fast_mode:
+                try:
+                    result = await self._search_package_direct(pooled, package_use)
+                    tracer.current().set(path="direct")
+                    JelouMCP._lookup_stats["direct"] += 1
+                    return result
+                except PackageParseError as e:
+                    JelouMCP._lookup_stats["parse_fallbacks"] += 1
+                    logger.info(f"Direct package search for '{package_use}' couldn't be parsed, using the agent: {e}")
+                except Exception as e:
+                    # list_tools/call_tool failures (transport errors, timeouts), the agent may still get there
+                    JelouMCP._lookup_stats["tool_error_fallbacks"] += 1
+                    logger.warning(f"Direct package search for '{package_use}' failed, using the agent: {e!r}")
+            tracer.current().set(path="agent")
+            agent = await self._get_agent(pooled)
+            # The pool owns the session lifecycle, so the agent must not close it after the run
+            with model_router.observe(JelouMCP._route):
+                result = await agent.run(f"Search for Jelou package about {package_use} and bring information of it.",
+                                         output_schema=PackageInfoStructure, manage_connector=False)
         return result
-        
\ No newline at end of file
+
+    async def _search_package_direct(self, pooled, package_use: str) -> PackageInfoStructure:
+        """Single round trip: call the search tool ourselves and parse its result."""
+        session, tool = await self._search_tool(pooled)
+        try:
+            result = await session.call_tool(SEARCH_PACKAGES_TOOL, self._search_arguments(tool, package_use))
+        except Exception:
+            # The tool may have changed or the session reconnected, list the tools again next time
+            pooled.extras["search_tool"] = None
+            raise
+        return parse_package_info(tool_result_text(result), package_use)
+
+    async def _search_tool(self, pooled):
+        """The session serving the search tool and its schema, listed once per pooled session."""
+        sessions = list(pooled.client.get_all_active_sessions().values())
+        cached = pooled.extras.get("search_tool")
+        # A session that was reopened is a new object, its tools are listed again
+        if cached is not None and any(session is cached[0] for session in sessions):
+            return cached
+        for session in sessions:
+            # Until a call fails, the handshake's tool list is good enough
+            tool = self._handshake_tool(session) if "search_tool" not in pooled.extras else None
+            if tool is None:
+                tool = next((tool for tool in await session.list_tools() if tool.name == SEARCH_PACKAGES_TOOL), None)
+            if tool is not None:
+                pooled.extras["search_tool"] = (session, tool)
+                return session, tool
+        raise PackageParseError(f"Tool '{SEARCH_PACKAGES_TOOL}' is not available")
+
+    @staticmethod
+    def _handshake_tool(session):
+        # The handshake already listed the tools when the session opened, reuse that list instead of another round trip
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            try:
+                tools = session.connector.tools
+            except (AttributeError, RuntimeError):
+                return None
+        return next((tool for tool in tools if tool.name == SEARCH_PACKAGES_TOOL), None)
+
+    @staticmethod
+    def _search_arguments(tool, package_use: str) -> Dict[str, Any]:
+        # Put the query in the tool's search parameter, read from its input schema
+        schema = getattr(tool, "inputSchema", None) or {}
+        properties = schema.get("properties", {})
+        string_params = [name for name, spec in properties.items() if spec.get("type", "string") == "string"]
+        for name in ("query", "search", "q", "term", "keyword", "name"):
+            if name in properties:
+                return {name: package_use}
+        required = [name for name in schema.get("required", []) if name in string_params]
+        if required or string_params:
+            return {(required or string_params)[0]: package_use}
+        return {"query": package_use}
@@ -0,0 +1,200 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from mcp_use import MCPClient
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PooledSession():
+    """An MCP client with its sessions already opened, owned by MCPSessionPool."""
+
+    def __init__(self, client: MCPClient, handshake_seconds: float):
+        self.client = client
+        self.handshake_seconds = handshake_seconds
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        # Objects built on top of the client (e.g. an MCPAgent) that should live as long as it
+        self.extras: Dict[str, Any] = {}
+
+    def is_connected(self) -> bool:
+        sessions = self.client.get_all_active_sessions()
+        return bool(sessions) and all(session.is_connected for session in sessions.values())
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            for session in self.client.get_all_active_sessions().values():
+                await asyncio.wait_for(session.list_tools(), timeout=timeout)
+            return True
+        except Exception as e:
+            logger.debug(f"MCP session health check failed: {e!r}")
+            return False
+
+    async def close(self) -> None:
+        try:
+            await self.client.close_all_sessions()
+        except Exception as e:
+            logger.debug(f"Error closing MCP sessions: {e!r}")
+
+
+class MCPSessionPool():
+    """Process-wide pool of long-lived MCP sessions.
+
+    Sessions are opened lazily on first use, kept alive by a background task that
+    health-checks idle sessions, and closed together by close().
+    """
+
+    def __init__(self, config: Dict[str, Any], max_sessions: int = 4,
+                 keepalive_interval: float = 60.0, health_check_timeout: float = 10.0):
+        self.config = config
+        self.max_sessions = max_sessions
+        self.keepalive_interval = keepalive_interval
+        self.health_check_timeout = health_check_timeout
+        self._idle: List[PooledSession] = []
+        self._open = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Metrics
+        self.sessions_created = 0
+        self.reuse_count = 0
+        self.health_check_failures = 0
+        self._handshake_total = 0.0
+
+    @asynccontextmanager
+    async def acquire(self):
+        entry = await self._checkout()
+        try:
+            yield entry
+        except BaseException:
+            # The session may be in an unknown state after a failure, check it before reuse
+            if not await entry.ping(self.health_check_timeout):
+                await self._discard(entry)
+                entry = None
+            raise
+        finally:
+            if entry is not None:
+                await self._checkin(entry)
+
+    async def _checkout(self) -> PooledSession:
+        if self._closed:
+            raise RuntimeError("MCP session pool is closed")
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        self._start_keepalive()
+        async with self._condition:
+            while True:
+                while self._idle:
+                    entry = self._idle.pop()
+                    if not entry.is_connected():
+                        await self._discard(entry, locked=True)
+                        continue
+                    entry.uses += 1
+                    entry.last_used = time.monotonic()
+                    self.reuse_count += 1
+                    return entry
+                if self._open < self.max_sessions:
+                    self._open += 1
+                    break
+                await self._condition.wait()
+        try:
+            entry = await self._open_session()
+        except BaseException:
+            async with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        entry.uses += 1
+        return entry
+
+    async def _checkin(self, entry: PooledSession) -> None:
+        entry.last_used = time.monotonic()
+        async with self._condition:
+            if self._closed:
+                self._open -= 1
+                await entry.close()
+            else:
+                self._idle.append(entry)
+            self._condition.notify()
+
+    async def _discard(self, entry: PooledSession, locked: bool = False) -> None:
+        await entry.close()
+        if locked:
+            self._open -= 1
+            self._condition.notify()
+            return
+        async with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    async def _open_session(self) -> PooledSession:
+        start = time.perf_counter()
+        client = MCPClient.from_dict(self.config)
+        await client.create_all_sessions()
+        handshake = time.perf_counter() - start
+        self.sessions_created += 1
+        self._handshake_total += handshake
+        return PooledSession(client, handshake)
+
+    def _start_keepalive(self) -> None:
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def _keepalive(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(self.keepalive_interval)
+            pinged = set()
+            while not self._closed:
+                async with self._condition:
+                    # One idle session at a time, the others stay available for checkouts
+                    entry = next((entry for entry in self._idle if id(entry) not in pinged), None)
+                    if entry is None:
+                        break
+                    self._idle.remove(entry)
+                pinged.add(id(entry))
+                healthy = False
+                try:
+                    healthy = await entry.ping(self.health_check_timeout)
+                    if not healthy:
+                        self.health_check_failures += 1
+                finally:
+                    # Also runs when close() cancels us mid ping, so the session isn't leaked
+                    if healthy and not self._closed:
+                        async with self._condition:
+                            self._idle.append(entry)
+                            self._condition.notify()
+                    else:
+                        await self._discard(entry)
+
+    async def close(self) -> None:
+        self._closed = True
+        # Stopped first, it closes the session it is pinging before the idle ones are drained
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._keepalive_task = None
+        idle, self._idle = self._idle, []
+        for entry in idle:
+            await entry.close()
+            self._open -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        average_handshake = self._handshake_total / self.sessions_created if self.sessions_created else 0.0
+        return {
+            "sessions_open": self._open,
+            "sessions_idle": len(self._idle),
+            "sessions_created": self.sessions_created,
+            "reuse_count": self.reuse_count,
+            "health_check_failures": self.health_check_failures,
+            "average_handshake_seconds": average_handshake,
+            "handshake_time_saved_seconds": average_handshake * self.reuse_count,
+        }
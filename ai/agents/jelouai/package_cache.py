@@ -0,0 +1,178 @@
+import datetime
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from pydantic import ValidationError
+
+from ai.agents.jelouai.jelou_response_structure import PackageInfoStructure
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PackageCacheEntry():
+    def __init__(self, query: str, package: PackageInfoStructure, created_at: float, expires_at: float):
+        self.query = query
+        self.package = package
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    @property
+    def ts(self) -> datetime.datetime:
+        """Creation time as an aware UTC datetime."""
+        return datetime.datetime.fromtimestamp(self.created_at, tz=datetime.timezone.utc)
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+
+class PackageCacheStore():
+    """SQLite (WAL mode) package cache shared safely by several wizard processes.
+
+    Every write is a per-key upsert inside its own transaction, entries carry their
+    own TTL, and the table is bounded to max_entries with LRU eviction. Reads don't take
+    the write lock, an entry's last_access is only bumped when it's touch_interval old.
+    """
+
+    def __init__(self, path: str, max_entries: int = 256, default_ttl: float = 24 * 60 * 60,
+                 legacy_json_path: Optional[str] = None, touch_interval: float = 5 * 60):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.touch_interval = touch_interval
+        is_new = not os.path.exists(path)
+        self._init_schema()
+        if is_new and legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_legacy_json(legacy_json_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so concurrent writers queue instead of deadlocking
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._transaction() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS packages (
+                query TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS packages_last_access ON packages (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS packages_expires_at ON packages (expires_at)")
+
+    def _import_legacy_json(self, legacy_json_path: str) -> None:
+        """One-time import of the old .package_cache.json when the database is first created."""
+        try:
+            with open(legacy_json_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Couldn't read legacy package cache {legacy_json_path}: {e}")
+            return
+        for query, rec in raw.items():
+            try:
+                created_at = datetime.datetime.fromisoformat(rec["ts"]).replace(tzinfo=datetime.timezone.utc).timestamp()
+                package = PackageInfoStructure.model_validate(rec.get("data", {}))
+            except (KeyError, TypeError, ValueError, ValidationError) as e:
+                # A bad entry only loses itself, not the whole cache
+                logger.warning(f"Skipping legacy package cache entry '{query}': {e}")
+                continue
+            self.put(query, package, created_at=created_at, overwrite=False)
+
+    def _row_to_entry(self, row) -> Optional[PackageCacheEntry]:
+        query, data, created_at, expires_at = row
+        try:
+            package = PackageInfoStructure.model_validate_json(data)
+        except ValidationError as e:
+            logger.warning(f"Dropping unreadable package cache entry '{query}': {e}")
+            self.delete(query)
+            return None
+        return PackageCacheEntry(query, package, created_at, expires_at)
+
+    def get(self, query: str, include_expired: bool = False) -> Optional[PackageCacheEntry]:
+        # Plain read, WAL lets it run next to other readers and the writer
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT query, data, created_at, expires_at, last_access FROM packages WHERE query = ?",
+                               (query,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        *row, last_access = row
+        now = time.time()
+        if now - last_access >= self.touch_interval:
+            # LRU order only needs to be roughly right, most reads never write
+            with self._transaction() as conn:
+                conn.execute("UPDATE packages SET last_access = ? WHERE query = ? AND last_access < ?",
+                             (now, query, now))
+        entry = self._row_to_entry(row)
+        if entry is None or (entry.expired and not include_expired):
+            return None
+        return entry
+
+    def items(self, include_expired: bool = True) -> Dict[str, PackageCacheEntry]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT query, data, created_at, expires_at FROM packages").fetchall()
+        finally:
+            conn.close()
+        entries = {}
+        for row in rows:
+            entry = self._row_to_entry(row)
+            if entry is not None and (include_expired or not entry.expired):
+                entries[entry.query] = entry
+        return entries
+
+    def put(self, query: str, package: PackageInfoStructure, ttl: Optional[float] = None,
+            created_at: Optional[float] = None, overwrite: bool = True) -> None:
+        self.put_many([(query, package)], ttl=ttl, created_at=created_at, overwrite=overwrite)
+
+    def put_many(self, entries: Iterable[Tuple[str, PackageInfoStructure]], ttl: Optional[float] = None,
+                 created_at: Optional[float] = None, overwrite: bool = True) -> None:
+        now = time.time()
+        created_at = now if created_at is None else created_at
+        expires_at = created_at + (self.default_ttl if ttl is None else ttl)
+        conflict = ("DO UPDATE SET data = excluded.data, created_at = excluded.created_at, "
+                    "expires_at = excluded.expires_at, last_access = excluded.last_access") if overwrite else "DO NOTHING"
+        with self._transaction() as conn:
+            for query, package in entries:
+                if not isinstance(package, PackageInfoStructure):
+                    package = PackageInfoStructure.model_validate(package)
+                conn.execute(f"INSERT INTO packages (query, data, created_at, expires_at, last_access) "
+                             f"VALUES (?, ?, ?, ?, ?) ON CONFLICT(query) {conflict}",
+                             (query, package.model_dump_json(), created_at, expires_at, now))
+            self._evict(conn)
+
+    def delete(self, query: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM packages WHERE query = ?", (query,))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM packages").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute("DELETE FROM packages WHERE query IN "
+                         "(SELECT query FROM packages ORDER BY last_access ASC LIMIT ?)", (overflow,))
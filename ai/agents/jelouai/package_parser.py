@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from ai.agents.jelouai.jelou_response_structure import PackageInfoStructure
+
+
+class PackageParseError(ValueError):
+    """Raised when a raw MCP tool result can't be mapped into a PackageInfoStructure."""
+
+
+# Accepted spellings for every PackageInfoStructure field in the raw tool payload
+FIELD_ALIASES = {
+    "name": ["name", "package_name", "packageName", "title", "slug"],
+    "version": ["version", "latest_version", "latestVersion"],
+    "workflow_syntax": ["workflow_syntax", "workflowSyntax", "syntax", "dsl", "example", "usage_example", "usageExample"],
+    "inputs": ["inputs", "input", "parameters", "params"],
+    "outputs": ["outputs", "output", "results"],
+    "usage": ["usage", "description", "summary", "readme"],
+    "homepage": ["homepage", "url", "docs", "documentation", "package"],
+    "source": ["source", "repository", "registry", "id"],
+}
+CONTAINER_KEYS = ["packages", "results", "items", "data", "workflows"]
+
+
+def tool_result_text(result: Any) -> str:
+    """Concatenate the text blocks of an MCP CallToolResult."""
+    if getattr(result, "isError", False):
+        raise PackageParseError(f"Tool returned an error: {result}")
+    content = getattr(result, "content", result)
+    if isinstance(content, str):
+        return content
+    parts: List[str] = []
+    for block in content or []:
+        text = getattr(block, "text", None)
+        if text is None and isinstance(block, dict):
+            text = block.get("text")
+        if text:
+            parts.append(text)
+    return "\n".join(parts)
+
+
+def _load_records(text: str) -> List[Dict[str, Any]]:
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError:
+        # Some servers wrap the JSON in prose or a code fence, keep the outermost object/array
+        start = min([i for i in (text.find("{"), text.find("[")) if i != -1], default=-1)
+        end = max(text.rfind("}"), text.rfind("]"))
+        if start == -1 or end <= start:
+            raise PackageParseError("Tool result is not JSON")
+        try:
+            payload = json.loads(text[start:end + 1])
+        except json.JSONDecodeError as e:
+            raise PackageParseError(f"Tool result is not JSON: {e}")
+
+    while isinstance(payload, dict):
+        container = next((payload[key] for key in CONTAINER_KEYS if key in payload), None)
+        if container is None:
+            return [payload]
+        payload = container
+    if isinstance(payload, list):
+        return [record for record in payload if isinstance(record, dict)]
+    raise PackageParseError("Tool result has no package records")
+
+
+def _pick(record: Dict[str, Any], field: str) -> Any:
+    for alias in FIELD_ALIASES[field]:
+        value = record.get(alias)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def _as_field_list(value: Any) -> List[Dict[str, Any]]:
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        # {"context": {"type": "STRING", ...}} -> [{"name": "context", "type": "STRING", ...}]
+        return [{"name": name, **spec} if isinstance(spec, dict) else {"name": name, "type": str(spec)}
+                for name, spec in value.items()]
+    if isinstance(value, list):
+        return [item if isinstance(item, dict) else {"name": str(item)} for item in value]
+    raise PackageParseError(f"Unexpected inputs/outputs shape: {type(value).__name__}")
+
+
+def _score(record: Dict[str, Any], query: str) -> int:
+    name = str(_pick(record, "name") or "").lower()
+    query = query.lower()
+    if name == query:
+        return 3
+    # An empty name is "in" every query
+    if name and (query in name or name in query):
+        return 2
+    return 1 if query in json.dumps(record, ensure_ascii=False).lower() else 0
+
+
+def parse_package_info(text: str, query: str) -> PackageInfoStructure:
+    """Deterministically map a 'search-workflow-packages' result into a PackageInfoStructure.
+
+    The best matching record for the query is used; records missing a required
+    field are skipped. Raises PackageParseError when nothing usable is found.
+    """
+    records = _load_records(text)
+    records.sort(key=lambda record: _score(record, query), reverse=True)
+    errors: List[str] = []
+    for record in records:
+        data: Dict[str, Optional[Any]] = {field: _pick(record, field) for field in FIELD_ALIASES}
+        try:
+            data["inputs"] = _as_field_list(data["inputs"])
+            data["outputs"] = _as_field_list(data["outputs"])
+            for field in ("name", "version", "workflow_syntax", "usage", "homepage", "source"):
+                if data[field] is not None and not isinstance(data[field], str):
+                    data[field] = json.dumps(data[field], ensure_ascii=False)
+            return PackageInfoStructure(**data)
+        except (ValidationError, PackageParseError) as e:
+            errors.append(str(e))
+    raise PackageParseError(f"No usable package record in tool result: {errors}")
@@ -0,0 +1,232 @@
+"""
+Headless batch mode: onboard many businesses from a file of pre-filled answers.
+
+Each record (a JSONL line, or an item of a YAML list) looks like:
+
+    {"id": "pizzeria-42",
+     "business_info": {"Me podrias describir tu negocio?": "...", ...},
+     "workflow_info": {"¿Cual sera el flujo de trabajo propuesto?": "..."},
+     "personality": {"Quieres que tu ia tenga una identidad en particular?": "..."}}
+
+Keys are the wizard's question texts (BASIC_QUESTIONS, WORKFLOW_QUESTIONS, PERSONALITY_QUESTIONS).
+Every record gets one output line with its result or its error, written as soon as it finishes.
+
+    python batch.py businesses.jsonl -o results.jsonl --concurrency 8 --rpm 120
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from anthropic import RateLimitError as AnthropicRateLimitError
+from openai import RateLimitError as OpenAIRateLimitError
+
+from ai.agents.jelouai.jelou_mcp import JelouMCP
+from config.models.client_registry import client_registry
+from config.models.recorder import traffic_recorder
+from config.models.resilience import provider_guard
+from config.models.response_cache import response_cache
+from config.models.routing import model_router
+from config.tracing import tracer
+from wizard import BASIC_QUESTIONS, PERSONALITY_QUESTIONS, WORKFLOW_QUESTIONS, JelouWizard
+from wizard_io import NullIO
+
+import logging
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ERRORS = (AnthropicRateLimitError, OpenAIRateLimitError)
+
+
+class RateLimiter():
+    """
+    Token bucket shared by every LLM request of the batch.
+
+    Allows requests_per_minute on average with bursts of up to burst requests. After a 429,
+    pause() holds every request until the provider's retry-after has passed.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 6)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.stats = {"acquired": 0, "waited_seconds": 0.0, "pauses": 0}
+
+    async def acquire(self) -> None:
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        self.stats["acquired"] += 1
+        self.stats["waited_seconds"] += time.monotonic() - started
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out requests for seconds and drop the burst allowance."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self.stats["pauses"] += 1
+
+    __call__ = acquire
+
+
+def retry_after(error: Exception, default: float) -> float:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    if path.endswith((".yaml", ".yml")):
+        import yaml
+        with open(path, "r", encoding="utf-8") as f:
+            records = yaml.safe_load(f) or []
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    for index, record in enumerate(records):
+        record.setdefault("id", str(index))
+    return records
+
+
+def check_record(record: Dict[str, Any]) -> List[str]:
+    """Warnings for answers that don't match a wizard question, they are still passed to the agents."""
+    warnings = []
+    for field, questions in (("business_info", BASIC_QUESTIONS), ("workflow_info", WORKFLOW_QUESTIONS),
+                             ("personality", PERSONALITY_QUESTIONS)):
+        known = {question.get("question") or question.get("question:") for question in questions}
+        for key in (record.get(field) or {}):
+            if key not in known:
+                warnings.append(f"{field}: unknown question {key!r}")
+    if not record.get("business_info"):
+        warnings.append("business_info: no answers")
+    return warnings
+
+
+class BatchRunner():
+    """Runs records through headless wizards with at most concurrency of them in flight."""
+
+    def __init__(self, concurrency: int = 4, max_attempts: int = 3, rate_limiter: Optional[RateLimiter] = None,
+                 default_backoff: float = 10.0):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.rate_limiter = rate_limiter
+        self.default_backoff = default_backoff
+        self._packages: Optional[JelouWizard] = None
+        self.stats = {"succeeded": 0, "failed": 0, "retries": 0}
+
+    async def run(self, records: List[Dict[str, Any]], output) -> None:
+        # Package lookups are the same for every business, resolve them once and share them
+        # Opening the package store reads SQLite, kept off the event loop
+        self._packages = await asyncio.to_thread(JelouWizard, io=NullIO(), stream=False, checkpointer=False)
+        await self._packages.init_packages()
+        queue: asyncio.Queue = asyncio.Queue()
+        for record in records:
+            queue.put_nowait(record)
+        workers = [asyncio.create_task(self._worker(queue, output)) for _ in range(min(self.concurrency, len(records)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _worker(self, queue: asyncio.Queue, output) -> None:
+        while True:
+            try:
+                record = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            line = await self._run_record(record)
+            output.write(json.dumps(line, ensure_ascii=False) + "\n")
+            output.flush()
+
+    async def _run_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.monotonic()
+        line = {"id": record["id"], "warnings": check_record(record)}
+        for attempt in range(1, self.max_attempts + 1):
+            line["attempts"] = attempt
+            try:
+                wizard = self._wizard()
+                line["output"] = await wizard.run_headless(record.get("business_info") or {},
+                                                           record.get("workflow_info") or {},
+                                                           record.get("personality") or {})
+                line["status"] = "ok"
+                self.stats["succeeded"] += 1
+                break
+            except RATE_LIMIT_ERRORS as e:
+                wait = retry_after(e, self.default_backoff)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.pause(wait)
+                error = e
+            except Exception as e:
+                logger.exception(f"Record {record['id']} failed (attempt {attempt})")
+                wait = self.default_backoff * attempt
+                error = e
+            if attempt == self.max_attempts:
+                line["status"] = "error"
+                line["error"] = f"{type(error).__name__}: {error}"
+                self.stats["failed"] += 1
+            else:
+                self.stats["retries"] += 1
+                await asyncio.sleep(wait)
+        line["seconds"] = round(time.monotonic() - started, 3)
+        return line
+
+    def _wizard(self) -> JelouWizard:
+        # Shares the packages loaded once by run(), nothing is read from disk per record
+        return JelouWizard(io=NullIO(), stream=False, checkpointer=False, shared_packages=self._packages)
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the wizard headless over a file of business answers")
+    parser.add_argument("input", help=".jsonl file, or .yaml file with a list of records")
+    parser.add_argument("-o", "--output", help="JSONL results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("JELOU_BATCH_CONCURRENCY", "4")))
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("JELOU_BATCH_RPM", "0")),
+                        help="LLM requests per minute for the whole batch, 0 for no limit")
+    parser.add_argument("--attempts", type=int, default=3, help="Attempts per record")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.input)
+    rate_limiter = RateLimiter(args.rpm) if args.rpm > 0 else None
+    client_registry.request_limiter = rate_limiter
+    runner = BatchRunner(concurrency=args.concurrency, max_attempts=args.attempts, rate_limiter=rate_limiter)
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    started = time.monotonic()
+    try:
+        await runner.run(records, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await JelouMCP.close_pool()
+        await client_registry.aclose()
+    logger.info(f"Batch of {len(records)} finished in {time.monotonic() - started:.1f}s: {runner.stats}")
+    if rate_limiter is not None:
+        logger.info(f"Rate limiter: {rate_limiter.stats}")
+    logger.info(f"Response cache: {response_cache.metrics()}")
+    logger.info(f"Traffic recorder: {traffic_recorder.metrics()}")
+    logger.info(f"Model routes: {model_router.metrics()}")
+    logger.info(f"Provider guard: {provider_guard.metrics()}")
+    tracer.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("mcp_use").setLevel(logging.CRITICAL)
+    asyncio.run(main())
@@ -0,0 +1,317 @@
+"""
+Load generator: how many concurrent wizard sessions one worker sustains.
+
+Synthetic users drawn from bench/personas.yaml run whole onboarding sessions against an
+in-process SessionStore (the one server.py serves), answering every question after a think
+time. Concurrency ramps through --levels; each level runs for --duration seconds, users start
+a new session as soon as theirs finishes. Backends are the bench mocks (on their own thread,
+so they don't load the worker's event loop) or a recording (JELOU_RECORD=replay):
+
+    python -m bench.load --levels 1,4,16,64 --duration 60 --profile realistic
+    python -m bench.load --backend replay --recording recordings.jsonl --think-scale 0
+
+Per level it reports sessions and turns per second, p50/p99 turn latency (answer sent to
+next question), event loop lag, memory per session and whether the worker is saturated:
+p99 turn latency over --saturation-factor times the first level's, or p99 loop lag over
+--max-loop-lag.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+import yaml
+
+from bench.mock_servers import PROFILES, MockProviders
+from bench.run import BENCH_DIR, configure_environment, free_port
+
+import logging
+logger = logging.getLogger(__name__)
+
+PERSONAS_PATH = os.path.join(BENCH_DIR, "personas.yaml")
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest rank
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+def rss_bytes() -> int:
+    """Current resident set size, the peak one where /proc isn't available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def load_personas(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+class Persona():
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.think_seconds = spec.get("think_seconds", [2, 10])
+        # phase -> answers, in the order the wizard asks
+        self.answers: Dict[str, List[str]] = spec["answers"]
+
+    def script(self, turns_per_phase: Optional[int]) -> List[str]:
+        """Flat list of answers. With turns_per_phase each phase gets exactly that many, the last one repeated."""
+        script = []
+        for answers in self.answers.values():
+            if turns_per_phase is None:
+                script.extend(answers)
+            else:
+                script.extend((answers + [answers[-1]] * turns_per_phase)[:turns_per_phase])
+        return script
+
+
+class LevelStats():
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.turn_latencies: List[float] = []
+        self.first_prompt_latencies: List[float] = []
+        self.loop_lags: List[float] = []
+        self.peak_rss = 0
+        self.errors: Dict[str, int] = {}
+
+    def error(self, reason: str) -> None:
+        self.failed += 1
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+class SyntheticUser():
+    def __init__(self, persona: Persona, rng: random.Random, think_scale: float, turns_per_phase: Optional[int],
+                 turn_timeout: float):
+        self.persona = persona
+        self.rng = rng
+        self.think_scale = think_scale
+        self.turns_per_phase = turns_per_phase
+        self.turn_timeout = turn_timeout
+
+    async def think(self) -> None:
+        low, high = self.persona.think_seconds
+        await asyncio.sleep(self.rng.uniform(low, high) * self.think_scale)
+
+    async def run(self, store, stats: LevelStats, deadline: float) -> None:
+        # Spread the first sessions over one think time instead of starting them all at once
+        await self.think()
+        while time.monotonic() < deadline:
+            await self.run_session(store, stats)
+
+    async def run_session(self, store, stats: LevelStats) -> None:
+        session = store.create()
+        if session is None:
+            stats.rejected += 1
+            await asyncio.sleep(1.0)
+            return
+        stats.started += 1
+        script = self.persona.script(self.turns_per_phase)
+        sent = time.perf_counter()
+        first = True
+        try:
+            while True:
+                events = await session.io.next_events(self.turn_timeout)
+                if not events:
+                    stats.error("turn timeout")
+                    return
+                kinds = [event["type"] for event in events]
+                if "error" in kinds:
+                    stats.error(next(event["text"] for event in events if event["type"] == "error")[:80])
+                    return
+                if "prompt" not in kinds and "result" not in kinds:
+                    continue
+                latency = time.perf_counter() - sent
+                (stats.first_prompt_latencies if first else stats.turn_latencies).append(latency)
+                first = False
+                if "result" in kinds:
+                    stats.completed += 1
+                    return
+                if not script:
+                    stats.error(f"{self.persona.name}: script exhausted")
+                    return
+                await self.think()
+                session.io.feed(script.pop(0))
+                sent = time.perf_counter()
+        finally:
+            await store.close(session.id)
+
+
+async def monitor(stats: LevelStats, stop: asyncio.Event, interval: float = 0.1) -> None:
+    """Event loop lag (how late a sleep wakes up) and peak memory while a level runs."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lags.append(max(0.0, time.perf_counter() - started - interval))
+        stats.peak_rss = max(stats.peak_rss, rss_bytes())
+
+
+async def run_level(store, personas: List[Persona], concurrency: int, duration: float, args, rng: random.Random) -> LevelStats:
+    stats = LevelStats(concurrency)
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(monitor(stats, stop))
+    deadline = time.monotonic() + duration
+    turns = args.turns_per_phase if args.backend == "mock" else None
+    users = [SyntheticUser(personas[index % len(personas)], random.Random(rng.random()), args.think_scale, turns, args.turn_timeout)
+             for index in range(concurrency)]
+    await asyncio.gather(*(user.run(store, stats, deadline) for user in users))
+    stop.set()
+    await watcher
+    return stats
+
+
+def summarize(stats: LevelStats, seconds: float, idle_rss: int) -> Dict[str, Any]:
+    return {
+        "concurrency": stats.concurrency,
+        "seconds": round(seconds, 2),
+        "sessions_started": stats.started,
+        "sessions_completed": stats.completed,
+        "sessions_failed": stats.failed,
+        "sessions_rejected": stats.rejected,
+        "sessions_per_minute": round(stats.completed * 60 / seconds, 2),
+        "turns_per_second": round(len(stats.turn_latencies) / seconds, 3),
+        "first_prompt_p50": round(percentile(stats.first_prompt_latencies, 0.5), 4),
+        "turn_p50": round(percentile(stats.turn_latencies, 0.5), 4),
+        "turn_p99": round(percentile(stats.turn_latencies, 0.99), 4),
+        "loop_lag_p99": round(percentile(stats.loop_lags, 0.99), 4),
+        "loop_lag_max": round(max(stats.loop_lags, default=0.0), 4),
+        "peak_rss_mb": round(stats.peak_rss / 2**20, 1),
+        "mb_per_session": round(max(0, stats.peak_rss - idle_rss) / 2**20 / stats.concurrency, 2),
+        "errors": stats.errors,
+    }
+
+
+def saturation(level: Dict[str, Any], first: Dict[str, Any], factor: float, max_loop_lag: float) -> Optional[str]:
+    if first["turn_p99"] and level["turn_p99"] > first["turn_p99"] * factor:
+        return f"p99 turn latency {level['turn_p99']:.3f}s > {factor}x {first['turn_p99']:.3f}s"
+    if level["loop_lag_p99"] > max_loop_lag:
+        return f"p99 loop lag {level['loop_lag_p99']:.3f}s > {max_loop_lag}s"
+    if level["sessions_failed"] or level["sessions_rejected"]:
+        return f"{level['sessions_failed']} failed and {level['sessions_rejected']} rejected sessions"
+    return None
+
+
+def format_table(levels: List[Dict[str, Any]]) -> str:
+    lines = [f"{'users':>6} {'done':>6} {'fail':>5} {'sess/min':>9} {'turns/s':>8} {'turn p50':>9} {'turn p99':>9} "
+             f"{'lag p99':>8} {'lag max':>8} {'MB/sess':>8}  saturated"]
+    for level in levels:
+        lines.append(f"{level['concurrency']:>6} {level['sessions_completed']:>6} {level['sessions_failed']:>5} "
+                     f"{level['sessions_per_minute']:>9.2f} {level['turns_per_second']:>8.3f} {level['turn_p50']:>9.3f} "
+                     f"{level['turn_p99']:>9.3f} {level['loop_lag_p99']:>8.3f} {level['loop_lag_max']:>8.3f} "
+                     f"{level['mb_per_session']:>8.2f}  {level.get('saturated') or '-'}")
+    return "\n".join(lines)
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    """Run an ASGI app on its own thread and event loop."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(),), daemon=True, name="bench-mocks")
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Mock servers didn't start on port {port}")
+        time.sleep(0.01)
+    return server
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ramp concurrent synthetic wizard users and find the saturation point")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds per level")
+    parser.add_argument("--personas", default=PERSONAS_PATH)
+    parser.add_argument("--backend", choices=("mock", "replay"), default="mock")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="Mock latency profile")
+    parser.add_argument("--turns-per-phase", type=int, default=1, help="Answers before a mock question loop finishes")
+    parser.add_argument("--recording", help="Recording to replay (JELOU_RECORD_PATH)")
+    parser.add_argument("--think-scale", type=float, default=1.0, help="Multiplier of the personas' think times")
+    parser.add_argument("--turn-timeout", type=float, default=120.0)
+    parser.add_argument("--saturation-factor", type=float, default=2.0)
+    parser.add_argument("--max-loop-lag", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the per level results to this file")
+    args = parser.parse_args(argv)
+
+    corpus = load_personas(args.personas)
+    personas = [Persona(spec) for spec in corpus["personas"]]
+    mock_server = None
+    if args.backend == "mock":
+        mocks = MockProviders(PROFILES[args.profile], turns_to_finish=args.turns_per_phase, overrides=corpus.get("responses"))
+        port = free_port()
+        mock_server = serve_in_thread(mocks, port)
+        configure_environment(f"http://127.0.0.1:{port}")
+    else:
+        configure_environment("http://127.0.0.1:9")
+        os.environ["JELOU_RECORD"] = "replay"
+        if args.recording:
+            os.environ["JELOU_RECORD_PATH"] = os.path.abspath(args.recording)
+    # Spans would add to the memory per session
+    os.environ["JELOU_TRACE"] = "0"
+
+    from ai.agents.jelouai.jelou_mcp import JelouMCP
+    from config.models.client_registry import client_registry
+    from server import SessionStore
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    store = SessionStore(max_sessions=max(levels))
+    rng = random.Random(args.seed)
+    results: List[Dict[str, Any]] = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="jelou-load-") as workdir:
+        # The package cache is shared by the sessions like in a real worker, but starts cold
+        os.chdir(workdir)
+        try:
+            idle_rss = rss_bytes()
+            for concurrency in levels:
+                started = time.monotonic()
+                stats = await run_level(store, personas, concurrency, args.duration, args, rng)
+                level = summarize(stats, time.monotonic() - started, idle_rss)
+                level["saturated"] = saturation(level, results[0] if results else level, args.saturation_factor, args.max_loop_lag)
+                results.append(level)
+                logger.info(f"{concurrency} users: {json.dumps(level, ensure_ascii=False)}")
+        finally:
+            os.chdir(cwd)
+            await store.stop()
+            await JelouMCP.close_pool()
+            await client_registry.aclose()
+            if mock_server is not None:
+                mock_server.should_exit = True
+
+    print(format_table(results))
+    saturated = next((index for index, level in enumerate(results) if level["saturated"]), None)
+    if saturated is None:
+        print(f"No saturation up to {results[-1]['concurrency']} concurrent sessions")
+    else:
+        sustained = results[saturated - 1]["concurrency"] if saturated else 0
+        print(f"Saturated at {results[saturated]['concurrency']} concurrent sessions ({results[saturated]['saturated']}), "
+              f"sustained {sustained}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("mcp_use").setLevel(logging.CRITICAL)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    sys.exit(asyncio.run(main()))
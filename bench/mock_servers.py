@@ -0,0 +1,405 @@
+"""
+Local stand-ins for every remote the wizard talks to, in one ASGI app:
+
+    POST /v1/messages                 Anthropic Messages (instructor tool calls, SSE streaming)
+    POST /v1/chat/completions         OpenAI Chat Completions (instructor tool calls, SSE streaming)
+    POST|GET|DELETE /mcp              MCP streamable HTTP (JSON-RPC) with 'search-workflow-packages'
+    POST /session                     opencode session
+    POST /session/{id}/message        opencode chat
+
+Structured responses are generated from the tool's JSON schema: booleans that end a
+conversation turn true once the conversation has turns_to_finish user answers, strings get
+output_tokens of filler, and a scenario can pin fields per schema (e.g. the business type),
+always or only for conversations mentioning some text.
+Latency follows a LatencyProfile. Every request is counted with the tokens it reported.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+SEARCH_PACKAGES_TOOL = "search-workflow-packages"
+
+PACKAGES = [
+    {"name": "package-conversational-eco", "version": "1.0.0",
+     "workflow_syntax": "use package-conversational-eco { personality: $personality, context: $context, store_url: $store_url }",
+     "usage": "Conversational e-commerce assistant that sells the store's catalog",
+     "inputs": [{"name": "personality", "type": "STRING", "required": True},
+                {"name": "context", "type": "STRING", "required": True},
+                {"name": "store_url", "type": "STRING", "required": True}],
+     "outputs": [{"name": "order", "type": "OBJECT"}]},
+    {"name": "payment_method_package", "version": "1.2.0",
+     "workflow_syntax": "use payment_method_package { provider: $provider, currency: $currency }",
+     "usage": "Collects the payment of an order",
+     "inputs": [{"name": "provider", "type": "STRING", "required": True},
+                {"name": "currency", "type": "STRING", "required": False}],
+     "outputs": [{"name": "paid", "type": "BOOLEAN"}]},
+]
+
+# Boolean fields that close a turn loop in the wizard (QA, package filling, prefill, workflow)
+FINISHING_FIELDS = {"finished", "all_questions_answered", "all_inputs_filled", "user_confirmed", "user_want_workflow"}
+
+
+class LatencyProfile():
+    def __init__(self, name: str, first_token_seconds: float, tokens_per_second: float, output_tokens: int,
+                 mcp_seconds: float, opencode_seconds: float):
+        self.name = name
+        # Time until the first token, then output is produced at tokens_per_second
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        # Approximate length of every generated bot_response
+        self.output_tokens = output_tokens
+        self.mcp_seconds = mcp_seconds
+        self.opencode_seconds = opencode_seconds
+
+    def generation_seconds(self, tokens: int) -> float:
+        return self.first_token_seconds + tokens / self.tokens_per_second
+
+
+PROFILES = {
+    "instant": LatencyProfile("instant", 0.0, 1e9, 40, 0.0, 0.0),
+    "fast": LatencyProfile("fast", 0.05, 400.0, 60, 0.02, 0.1),
+    "realistic": LatencyProfile("realistic", 0.8, 60.0, 120, 0.3, 4.0),
+}
+
+
+def count_tokens(value: Any) -> int:
+    # ~4 characters per token, good enough for relative comparisons
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return max(1, len(text) // 4)
+
+
+class SchemaFiller():
+    """Builds an instance of a tool's JSON schema for the current conversation."""
+
+    def __init__(self, schema: Dict[str, Any], done: bool, last_user_message: str, output_tokens: int,
+                 overrides: Optional[Dict[str, Any]] = None):
+        self.defs = schema.get("$defs", {})
+        self.schema = schema
+        self.done = done
+        self.last_user_message = last_user_message
+        self.output_tokens = output_tokens
+        self.overrides = overrides or {}
+
+    def build(self) -> Dict[str, Any]:
+        instance = self._value(self.schema, None)
+        instance.update(self.overrides)
+        return instance
+
+    def _value(self, schema: Dict[str, Any], name: Optional[str]) -> Any:
+        if "$ref" in schema:
+            return self._value(self.defs[schema["$ref"].split("/")[-1]], name)
+        if "anyOf" in schema:
+            options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+            return self._value(options[0], name) if options else None
+        if "enum" in schema:
+            return schema["enum"][0]
+        kind = schema.get("type")
+        if kind == "object":
+            properties = schema.get("properties")
+            if properties is None:
+                # Dict[str, str] slots: the user's last answer
+                return {"respuesta": self.last_user_message} if self.last_user_message else {}
+            return {key: self._value(spec, key) for key, spec in properties.items()}
+        if kind == "array":
+            return []
+        if kind == "boolean":
+            return self.done if name in FINISHING_FIELDS else False
+        if kind in ("integer", "number"):
+            return 0
+        if name == "bot_response":
+            return self._filler(self.output_tokens)
+        return self._filler(min(self.output_tokens, 20))
+
+    def _filler(self, tokens: int) -> str:
+        words = ["respuesta", "simulada", "del", "asistente", "para", "el", "benchmark"]
+        return " ".join(words[i % len(words)] for i in range(max(1, tokens * 4 // 10)))
+
+
+class MockStats():
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.round_trips: Dict[str, int] = {}
+        self.tokens: Dict[str, int] = {"input": 0, "output": 0, "cache_read": 0, "cache_write": 0}
+
+    def count(self, api: str, input_tokens: int = 0, output_tokens: int = 0, cache_read: int = 0, cache_write: int = 0) -> None:
+        self.round_trips[api] = self.round_trips.get(api, 0) + 1
+        self.tokens["input"] += input_tokens
+        self.tokens["output"] += output_tokens
+        self.tokens["cache_read"] += cache_read
+        self.tokens["cache_write"] += cache_write
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"round_trips": dict(sorted(self.round_trips.items())), "tokens": dict(self.tokens)}
+
+
+class MockProviders():
+    """Raw ASGI app serving every mock API."""
+
+    def __init__(self, profile: LatencyProfile, turns_to_finish: int = 1, overrides: Optional[Dict[str, Any]] = None):
+        self.profile = profile
+        self.turns_to_finish = turns_to_finish
+        # schema name -> fields pinned in every response of that schema, or a list of rules (see _overrides_for)
+        self.overrides = overrides or {}
+        self.stats = MockStats()
+        # Prompt prefixes seen before, served as cache reads like the providers' prompt caching
+        self._cached_prefixes = set()
+
+    def configure(self, profile: LatencyProfile, turns_to_finish: int = 1, overrides: Optional[Dict[str, Any]] = None) -> None:
+        self.profile = profile
+        self.turns_to_finish = turns_to_finish
+        self.overrides = overrides or {}
+        self.stats.reset()
+        self._cached_prefixes = set()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        method, path = scope["method"], scope["path"].rstrip("/")
+        body = await self._read_body(receive)
+        payload = json.loads(body) if body else {}
+        if path.endswith("/v1/messages") and method == "POST":
+            await self._anthropic(payload, send)
+        elif path.endswith("/chat/completions") and method == "POST":
+            await self._openai(payload, send)
+        elif path == "/mcp":
+            await self._mcp(method, payload, dict(scope["headers"]), send)
+        elif path == "/session" and method == "POST":
+            await self._opencode_session(send)
+        elif path.startswith("/session/") and path.endswith("/message") and method == "POST":
+            await self._opencode_chat(path.split("/")[2], payload, send)
+        else:
+            await self._json(send, 404, {"error": f"No mock for {method} {path}"})
+
+    # Anthropic
+
+    async def _anthropic(self, payload: Dict[str, Any], send) -> None:
+        tool = payload["tools"][0]
+        messages = payload["messages"]
+        arguments = self._fill(tool["name"], tool["input_schema"], messages)
+        system_tokens = count_tokens(payload.get("system") or "")
+        cache_read, cache_write = self._prompt_cache(self._anthropic_blocks(payload))
+        input_tokens = max(count_tokens(messages) + system_tokens - cache_read - cache_write, 0)
+        output_tokens = count_tokens(arguments)
+        self.stats.count("anthropic", input_tokens, output_tokens, cache_read, cache_write)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "cache_read_input_tokens": cache_read, "cache_creation_input_tokens": cache_write}
+        message_id = f"msg_{uuid.uuid4().hex[:20]}"
+        tool_id = f"toolu_{uuid.uuid4().hex[:20]}"
+        if not payload.get("stream"):
+            await asyncio.sleep(self.profile.generation_seconds(output_tokens))
+            await self._json(send, 200, {
+                "id": message_id, "type": "message", "role": "assistant", "model": payload["model"],
+                "content": [{"type": "tool_use", "id": tool_id, "name": tool["name"], "input": arguments}],
+                "stop_reason": "tool_use", "stop_sequence": None, "usage": usage})
+            return
+        events = [("message_start", {"type": "message_start", "message": {
+                      "id": message_id, "type": "message", "role": "assistant", "model": payload["model"], "content": [],
+                      "stop_reason": None, "stop_sequence": None, "usage": {**usage, "output_tokens": 1}}}),
+                  ("content_block_start", {"type": "content_block_start", "index": 0,
+                                           "content_block": {"type": "tool_use", "id": tool_id, "name": tool["name"], "input": {}}})]
+        events += [("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                            "delta": {"type": "input_json_delta", "partial_json": chunk}})
+                   for chunk in self._chunks(json.dumps(arguments, ensure_ascii=False))]
+        events += [("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                   ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "tool_use", "stop_sequence": None},
+                                      "usage": {"output_tokens": output_tokens}}),
+                   ("message_stop", {"type": "message_stop"})]
+        await self._sse(send, [f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n" for name, data in events])
+
+    # OpenAI
+
+    async def _openai(self, payload: Dict[str, Any], send) -> None:
+        function = payload["tools"][0]["function"]
+        messages = payload["messages"]
+        arguments = json.dumps(self._fill(function["name"], function["parameters"], messages), ensure_ascii=False)
+        # OpenAI caches the whole prompt, every message boundary is a cacheable prefix
+        cache_read, _ = self._prompt_cache([(message["role"], message, True) for message in messages])
+        prompt_tokens = count_tokens(messages)
+        output_tokens = count_tokens(arguments)
+        # OpenAI caches automatically, writes aren't billed or reported
+        self.stats.count("openai", prompt_tokens - cache_read, output_tokens, cache_read)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens,
+                 "prompt_tokens_details": {"cached_tokens": cache_read}}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:20]}"
+        call_id = f"call_{uuid.uuid4().hex[:20]}"
+        base = {"id": completion_id, "created": int(time.time()), "model": payload["model"]}
+        if not payload.get("stream"):
+            await asyncio.sleep(self.profile.generation_seconds(output_tokens))
+            await self._json(send, 200, {**base, "object": "chat.completion", "usage": usage, "choices": [{
+                "index": 0, "finish_reason": "stop", "logprobs": None,
+                "message": {"role": "assistant", "content": None, "tool_calls": [
+                    {"id": call_id, "type": "function", "function": {"name": function["name"], "arguments": arguments}}]}}]})
+            return
+        chunks = [{**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": None, "delta": {
+            "role": "assistant", "tool_calls": [{"index": 0, "id": call_id, "type": "function",
+                                                  "function": {"name": function["name"], "arguments": ""}}]}}]}]
+        chunks += [{**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": None, "delta": {
+            "tool_calls": [{"index": 0, "function": {"arguments": chunk}}]}}]} for chunk in self._chunks(arguments)]
+        chunks.append({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]})
+        await self._sse(send, [f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"])
+
+    # Shared LLM helpers
+
+    def _fill(self, name: str, schema: Dict[str, Any], messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        user_messages = [message for message in messages if message["role"] == "user"]
+        last = user_messages[-1]["content"] if user_messages else ""
+        if not isinstance(last, str):
+            last = " ".join(block.get("text", "") for block in last if isinstance(block, dict))
+        # The first user message opens the conversation, the following ones are answers
+        done = len(user_messages) > self.turns_to_finish
+        return SchemaFiller(schema, done, last if len(user_messages) > 1 else "", self.profile.output_tokens,
+                            self._overrides_for(name, messages)).build()
+
+    def _overrides_for(self, name: str, messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # Streamed turns name the tool after instructor's partial model, e.g. PartialBusinessInfoStructure
+        overrides = self.overrides.get(name.removeprefix("Partial"))
+        if not isinstance(overrides, list):
+            return overrides
+        # Rules [{"when": text, "set": fields}], the first whose text is in the conversation applies
+        conversation = json.dumps(messages, ensure_ascii=False)
+        for rule in overrides:
+            if rule.get("when", "") in conversation:
+                return rule["set"]
+        return None
+
+    @staticmethod
+    def _anthropic_blocks(payload: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any], bool]]:
+        """The system and message content blocks in prompt order, with whether each carries a cache_control breakpoint."""
+        blocks = []
+        system = payload.get("system") or []
+        turns = [("system", system)] + [(message["role"], message["content"]) for message in payload["messages"]]
+        for role, content in turns:
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            for block in content:
+                blocks.append((role, {key: value for key, value in block.items() if key != "cache_control"}, "cache_control" in block))
+        return blocks
+
+    def _prompt_cache(self, blocks: List[Tuple[str, Dict[str, Any], bool]]) -> Tuple[int, int]:
+        """Cache read and write tokens of a prompt, as (role, block, marked) in prompt order.
+
+        The prefix up to every marked block is cached. A request reads the longest prefix
+        cached by an earlier one and writes the rest up to its last marked block, nothing
+        after that is cached.
+        """
+        marked = [i for i, (_, _, is_marked) in enumerate(blocks) if is_marked]
+        if not marked:
+            return 0, 0
+        prefix = hashlib.sha256()
+        tokens = read = 0
+        keys = []
+        for role, block, _ in blocks[:marked[-1] + 1]:
+            prefix.update(json.dumps([role, block], ensure_ascii=False, sort_keys=True).encode("utf-8") + b"\n")
+            tokens += count_tokens(block["text"] if "text" in block else block)
+            key = prefix.hexdigest()
+            keys.append(key)
+            if key in self._cached_prefixes:
+                read = tokens
+        self._cached_prefixes.update(keys[i] for i in marked)
+        return read, tokens - read
+
+    def _chunks(self, text: str, size: int = 16) -> List[str]:
+        return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+    async def _sse(self, send, events: List[str]) -> None:
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+        await asyncio.sleep(self.profile.first_token_seconds)
+        # ~4 characters per token, each chunk waits for the tokens it carries
+        per_event = 4.0 / self.profile.tokens_per_second
+        for event in events:
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+            await asyncio.sleep(per_event)
+        await send({"type": "http.response.body", "body": b""})
+
+    # MCP
+
+    async def _mcp(self, method: str, payload: Any, headers: Dict[bytes, bytes], send) -> None:
+        if method == "GET":
+            # No server initiated messages
+            await self._json(send, 405, {"error": "Method not allowed"})
+            return
+        if method == "DELETE":
+            await self._json(send, 200, {})
+            return
+        if "id" not in payload:
+            # Notifications get no response
+            await send({"type": "http.response.start", "status": 202, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        self.stats.count(f"mcp.{payload['method']}")
+        session_id = headers.get(b"mcp-session-id", b"").decode() or uuid.uuid4().hex
+        result = await self._mcp_result(payload["method"], payload.get("params") or {})
+        await self._json(send, 200, {"jsonrpc": "2.0", "id": payload["id"], "result": result},
+                         extra_headers=[(b"mcp-session-id", session_id.encode())])
+
+    async def _mcp_result(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if method == "initialize":
+            return {"protocolVersion": params.get("protocolVersion", "2025-03-26"),
+                    "capabilities": {"tools": {"listChanged": False}},
+                    "serverInfo": {"name": "jelou-mock", "version": "0.0.1"}}
+        if method == "tools/list":
+            return {"tools": [{"name": SEARCH_PACKAGES_TOOL, "description": "Search Jelou workflow packages",
+                               "inputSchema": {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]}}]}
+        if method == "tools/call":
+            await asyncio.sleep(self.profile.mcp_seconds)
+            # Every package, the client picks the best match for its query
+            return {"content": [{"type": "text", "text": json.dumps({"packages": PACKAGES}, ensure_ascii=False)}],
+                    "isError": False}
+        if method in ("resources/list", "prompts/list"):
+            return {method.split("/")[0]: []}
+        return {}
+
+    # opencode
+
+    async def _opencode_session(self, send) -> None:
+        self.stats.count("opencode.session")
+        now = time.time()
+        await self._json(send, 200, {"id": f"ses_{uuid.uuid4().hex[:20]}", "title": "Workflow Builder Session",
+                                     "version": "0.0.0-mock", "time": {"created": now, "updated": now}})
+
+    async def _opencode_chat(self, session_id: str, payload: Dict[str, Any], send) -> None:
+        text = " ".join(part.get("text", "") for part in payload.get("parts", []))
+        workflow = "```wf\nworkflow bench {\n  step start -> reply\n}\n```"
+        input_tokens, output_tokens = count_tokens(text), count_tokens(workflow)
+        self.stats.count("opencode.chat", input_tokens, output_tokens)
+        started = time.time()
+        await asyncio.sleep(self.profile.opencode_seconds)
+        await self._json(send, 200, {
+            "id": f"msg_{uuid.uuid4().hex[:20]}", "role": "assistant", "sessionID": session_id, "mode": "build",
+            "modelID": payload.get("modelID", "mock"), "providerID": payload.get("providerID", "mock"), "cost": 0.0,
+            "path": {"cwd": "/tmp", "root": "/tmp"}, "system": [], "time": {"created": started, "completed": time.time()},
+            "tokens": {"input": input_tokens, "output": output_tokens, "reasoning": 0, "cache": {"read": 0, "write": 0}},
+            "parts": [{"type": "text", "text": f"Workflow DSL:\n{workflow}"}]})
+
+    # HTTP
+
+    async def _read_body(self, receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    async def _json(self, send, status: int, body: Dict[str, Any], extra_headers: Optional[List] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())] + (extra_headers or [])
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
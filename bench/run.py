@@ -0,0 +1,263 @@
+"""
+Offline benchmark: the whole wizard plus the main.py editor loop against local stand-ins.
+
+Every remote (Anthropic, OpenAI, the Jelou MCP server and opencode) is served by
+bench/mock_servers.py on a local port with a latency profile, and a scenario file scripts the
+user's answers. Each scenario runs --repeat times; the report has the median wall time and
+per phase latency, round trips per API and tokens, compared with
+bench/baselines/<scenario>-<profile>.json:
+
+    python -m bench.run                          # every scenario, 'fast' profile
+    python -m bench.run ecommerce --profile realistic
+    python -m bench.run --update-baseline        # accept the current numbers
+
+Round trips and tokens regress as soon as they go over the baseline (the mocks are
+deterministic). Latencies are only reported, with --gate-latency (and at least 3 runs, a
+single run of a ~0.2s phase is mostly scheduling noise) they regress when they are over
+baseline * (1 + tolerance) + 50ms. Any regression exits with status 1.
+
+    python -m bench.run --gate-latency --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+import yaml
+
+from bench.mock_servers import PROFILES, MockProviders
+
+import logging
+logger = logging.getLogger(__name__)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS_DIR = os.path.join(BENCH_DIR, "scenarios")
+BASELINES_DIR = os.path.join(BENCH_DIR, "baselines")
+# Latency slack on top of the relative tolerance, small phases are mostly scheduling noise
+LATENCY_SLACK_SECONDS = 0.05
+# Latencies are the median of the runs, fewer than this are not compared
+MIN_GATED_RUNS = 3
+
+
+class ScriptExhaustedError(RuntimeError):
+    """The wizard asked for more input than the scenario scripts."""
+
+
+def load_scenario(name: str) -> Dict[str, Any]:
+    with open(os.path.join(SCENARIOS_DIR, f"{name}.yaml"), "r", encoding="utf-8") as f:
+        scenario = yaml.safe_load(f)
+    scenario["name"] = name
+    return scenario
+
+
+def scenario_names() -> List[str]:
+    return sorted(name[:-len(".yaml")] for name in os.listdir(SCENARIOS_DIR) if name.endswith(".yaml"))
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def configure_environment(base_url: str) -> None:
+    """Point every client at the mocks. Must run before the wizard modules are imported."""
+    os.environ.update({
+        "ANTHROPIC_BASE_URL": base_url,
+        "ANTHROPIC_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "JELOU_MCP_URL": f"{base_url}/mcp",
+        "OPENCODE_BASE_URL": base_url,
+        "JELOU_TRACE": "1",
+        # Every run starts cold: no response cache, checkpoints, recording or learned classifier
+        "JELOU_RESPONSE_CACHE": "0",
+        "JELOU_CHECKPOINTS": "0",
+        "JELOU_RECORD": "off",
+        "JELOU_LOCAL_CLASSIFIER": "0",
+    })
+    for name in ("JELOU_TRACE_PATH", "JELOU_TRACE_OTLP_PATH"):
+        os.environ.pop(name, None)
+
+
+def _build_script_io():
+    from wizard_io import WizardIO
+
+    class ScriptedIO(WizardIO):
+        """Answers the wizard's questions, then the editor prompts, from the scenario."""
+
+        def __init__(self, answers: List[str], editor_messages: List[str]):
+            self.answers = list(answers)
+            self.editor_messages = list(editor_messages)
+            self.reads = 0
+
+        def write(self, *values: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+            pass
+
+        async def read(self, prompt: str = "") -> str:
+            # The editor loop is the only prompt asking for a modification request
+            script = self.editor_messages if "modification request" in prompt else self.answers
+            if not script:
+                raise ScriptExhaustedError(f"No scripted input left for prompt {prompt.strip()!r} after {self.reads} reads")
+            self.reads += 1
+            return script.pop(0)
+
+    return ScriptedIO
+
+
+async def run_scenario(scenario: Dict[str, Any], profile: str, mocks: MockProviders) -> Dict[str, Any]:
+    import main
+    from ai.agents.jelouai.jelou_mcp import JelouMCP
+    from config.models.client_registry import client_registry
+    from config.tracing import PHASE, tracer
+
+    mocks.configure(PROFILES[profile], turns_to_finish=scenario.get("turns_to_finish", 1),
+                    overrides=scenario.get("responses"))
+    tracer.clear()
+    io = _build_script_io()(scenario["answers"], scenario.get("editor", []) + ["quit"])
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="jelou-bench-") as workdir:
+        # Package cache, checkpoints and classifier files go to the scenario's own directory
+        os.chdir(workdir)
+        started = time.perf_counter()
+        try:
+            await main.main(io=io)
+        finally:
+            wall = time.perf_counter() - started
+            os.chdir(cwd)
+            await JelouMCP.close_pool()
+            await client_registry.aclose()
+    if io.answers:
+        logger.warning(f"{scenario['name']}: {len(io.answers)} scripted answers were not used")
+    summary = tracer.summary()
+    phases = {key.split(":", 1)[1]: round(stats["total"], 4) for key, stats in summary.items() if key.startswith(f"{PHASE}:")}
+    stats = mocks.stats.as_dict()
+    return {"scenario": scenario["name"], "profile": profile, "wall_seconds": round(wall, 4), "phases": phases,
+            "round_trips": stats["round_trips"], "tokens": stats["tokens"], "user_reads": io.reads}
+
+
+def combine(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median latencies and worst counts over repeated runs of one scenario."""
+    result = dict(runs[-1])
+    result["runs"] = len(runs)
+    result["wall_seconds"] = statistics.median(run["wall_seconds"] for run in runs)
+    result["phases"] = {name: statistics.median(run["phases"].get(name, 0.0) for run in runs) for name in runs[-1]["phases"]}
+    for group in ("round_trips", "tokens"):
+        result[group] = {key: max(run[group].get(key, 0) for run in runs) for key in runs[-1][group]}
+    return result
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: Optional[float] = None) -> List[str]:
+    """Regressions against the baseline, latencies are only checked with a tolerance."""
+    regressions = []
+    for group in ("round_trips", "tokens"):
+        for key, value in result[group].items():
+            expected = baseline.get(group, {}).get(key, 0)
+            if value > expected:
+                regressions.append(f"{group}.{key}: {value} > baseline {expected}")
+    if tolerance is None:
+        return regressions
+    latencies = [("wall_seconds", result["wall_seconds"], baseline.get("wall_seconds"))]
+    latencies += [(f"phases.{name}", value, baseline.get("phases", {}).get(name)) for name, value in result["phases"].items()]
+    for key, value, expected in latencies:
+        if expected is None:
+            regressions.append(f"{key}: not in baseline")
+        elif value > expected * (1 + tolerance) + LATENCY_SLACK_SECONDS:
+            regressions.append(f"{key}: {value:.3f}s > baseline {expected:.3f}s (+{tolerance:.0%})")
+    return regressions
+
+
+def format_result(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> str:
+    def versus(value, expected, unit=""):
+        if expected is None:
+            return f"{value}{unit}"
+        return f"{value}{unit} (baseline {expected}{unit})"
+
+    baseline = baseline or {}
+    lines = [f"== {result['scenario']} [{result['profile']}] wall {versus(result['wall_seconds'], baseline.get('wall_seconds'), 's')}"]
+    for name, value in result["phases"].items():
+        lines.append(f"   phase {name:<22} {versus(value, baseline.get('phases', {}).get(name), 's')}")
+    for name, value in result["round_trips"].items():
+        lines.append(f"   round trips {name:<16} {versus(value, baseline.get('round_trips', {}).get(name))}")
+    for name, value in result["tokens"].items():
+        lines.append(f"   tokens {name:<21} {versus(value, baseline.get('tokens', {}).get(name))}")
+    return "\n".join(lines)
+
+
+def baseline_path(scenario: str, profile: str) -> str:
+    return os.path.join(BASELINES_DIR, f"{scenario}-{profile}.json")
+
+
+def load_baseline(scenario: str, profile: str) -> Optional[Dict[str, Any]]:
+    path = baseline_path(scenario, profile)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline wizard benchmark against local mock providers")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenario names in {SCENARIOS_DIR} (default: all)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario, latencies are their median")
+    parser.add_argument("--gate-latency", action="store_true", help="Also fail on latency regressions (needs --repeat 3 or more)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative latency increase with --gate-latency")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baselines")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+    if args.gate_latency and args.repeat < MIN_GATED_RUNS:
+        parser.error(f"--gate-latency needs --repeat {MIN_GATED_RUNS} or more, fewer runs are too noisy to compare")
+
+    mocks = MockProviders(PROFILES[args.profile])
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(mocks, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+    configure_environment(f"http://127.0.0.1:{port}")
+
+    results, failed = [], False
+    try:
+        for name in args.scenarios or scenario_names():
+            scenario = load_scenario(name)
+            result = combine([await run_scenario(scenario, args.profile, mocks) for _ in range(max(1, args.repeat))])
+            results.append(result)
+            baseline = load_baseline(name, args.profile)
+            print(format_result(result, baseline))
+            if args.update_baseline:
+                os.makedirs(BASELINES_DIR, exist_ok=True)
+                with open(baseline_path(name, args.profile), "w", encoding="utf-8") as f:
+                    json.dump(result, f, indent=2, ensure_ascii=False)
+                    f.write("\n")
+                print(f"   baseline written to {baseline_path(name, args.profile)}")
+            elif baseline is None:
+                print(f"   no baseline, run with --update-baseline to create {baseline_path(name, args.profile)}")
+            else:
+                regressions = compare(result, baseline, args.tolerance if args.gate_latency else None)
+                for regression in regressions:
+                    print(f"   REGRESSION {regression}")
+                failed = failed or bool(regressions)
+    finally:
+        server.should_exit = True
+        await serving
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if failed:
+        print("Benchmark regressed against the baselines")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main()))
@@ -2,5 +2,11 @@ from .anthropic import AnthropicChat
 from .structured_anthropic import StructuredAnthropicChat
 from .openai import OpenAIChat
 from .structured_openai import StructuredOpenAIChat
+from .structured_chat import StructuredChat
+from .client_registry import ClientRegistry, client_registry
+from .response_cache import ResponseCache, response_cache
+from .recorder import ReplayMissError, TrafficRecorder, traffic_recorder
+from .routing import ModelRouter, Route, model_router
+from .resilience import CircuitBreaker, CircuitOpenError, DeadlineExceededError, ProviderGuard, provider_guard
 
-__all__ = ['AnthropicChat', 'StructuredAnthropicChat', 'OpenAIChat', 'StructuredOpenAIChat']
+__all__ = ['AnthropicChat', 'StructuredAnthropicChat', 'OpenAIChat', 'StructuredOpenAIChat', 'StructuredChat', 'ClientRegistry', 'client_registry', 'ResponseCache', 'response_cache', 'ReplayMissError', 'TrafficRecorder', 'traffic_recorder', 'ModelRouter', 'Route', 'model_router', 'CircuitBreaker', 'CircuitOpenError', 'DeadlineExceededError', 'ProviderGuard', 'provider_guard']
@@ -1,60 +1,168 @@
 import os
-from typing import List, Dict, Any, Optional
-from anthropic import Anthropic
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 
+from .client_registry import client_registry
+from .history import HistoryManager
+from .recorder import traffic_recorder
+from .routing import model_router
+from ..tracing import LLM, tracer
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Prompt caching is still a beta feature for the pinned anthropic SDK
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
 
 class AnthropicChat:
-    def __init__(self, model: str = "claude-3-5-sonnet-20241022"):
-        # Load environment variables from .env if present
-        if os.path.exists('.env'):
-            from dotenv import load_dotenv
-            load_dotenv()
+    provider = "anthropic"
+
+    def __init__(self, model: Optional[str] = None):
+        # Load environment variables from .env if present (once per process)
+        client_registry.load_env()
         
         # Initialize Anthropic client
         api_key = os.getenv('ANTHROPIC_API_KEY')
-        if not api_key:
+        # Replays are served from the recording, no key needed
+        if not api_key and not traffic_recorder.replaying:
             raise ValueError("ANTHROPIC_API_KEY environment variable is required")
         
-        self.client = Anthropic(api_key=api_key)
-        self.model = model
+        # Model from the routing policy, model= pins one
+        self.route = model_router.route(type(self).__name__, self.provider, model)
+        self.model = self.route.model
+        # Shared clients, every agent reuses the same keep-alive connection pool
+        self.client = client_registry.get("anthropic", self.model)
+        # Async client for use inside the event loop (asend_message)
+        self.async_client = client_registry.get("anthropic", self.model, use_async=True)
         self.messages: List[Dict[str, Any]] = []
+        # Decides what part of self.messages is actually sent (token budget, older turns folded into an excerpt)
+        self.history = HistoryManager()
+        self.last_usage: Dict[str, int] = {}
+        self.usage_totals: Dict[str, int] = {}
     
     def add_system_message(self, content: str) -> None:
-        """Add a system message to the conversation."""
-        self.messages.append({"role": "user", "content": content})
+        """Add a system message to the conversation (sent as the cached system prompt)."""
+        self._append_message({"role": "system", "content": content})
     
     def add_user_message(self, content: str) -> None:
         """Add a user message to the conversation."""
-        self.messages.append({"role": "user", "content": content})
+        self._append_message({"role": "user", "content": content})
     
     def add_assistant_message(self, content: str) -> None:
         """Add an assistant message to the conversation."""
-        self.messages.append({"role": "assistant", "content": content})
+        self._append_message({"role": "assistant", "content": content})
     
     def get_messages(self) -> List[Dict[str, Any]]:
         """Get the current message history."""
         return self.messages.copy()
-    
-    def send_message(self, content: str, max_tokens: int = 1000, response_format: Optional[BaseModel] = None) -> str:
-        """Send a message and get the assistant's response."""
-        # Add user message
-        self.add_user_message(content)
 
-        # Prepare the request parameters
+    def _append_message(self, message: Dict[str, Any]) -> None:
+        self.messages.append(message)
+        # Folds the oldest turns into the excerpt once the history is over its token budget
+        self.history.track(message, self.messages, self.get_history_anchor())
+
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-serializable conversation state, see load_state."""
+        return {"messages": self.messages, "history": self.history.get_state(), "usage_totals": self.usage_totals}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Continue a conversation saved with get_state."""
+        self.messages = list(state["messages"])
+        self.history.load_state(state["history"])
+        self.usage_totals = dict(state.get("usage_totals", {}))
+
+    def get_history_anchor(self) -> Optional[Dict[str, Any]]:
+        """Facts resent with every request once turns are folded, e.g. the slots collected so far."""
+        return None
+
+    def get_turn_context(self) -> Optional[str]:
+        """Per-request note sent after the newest user message and never kept in the history, e.g. the current workflow."""
+        return None
+
+    def _history_messages(self) -> List[Dict[str, Any]]:
+        """The history as it is sent: within the token budget, older turns folded into an excerpt."""
+        return self.history.build(self.messages)
+
+    def _request_context(self) -> Optional[str]:
+        """Everything that changes per request: the history anchor (once turns are folded) and the turn context."""
+        parts = [self.history.anchor_text(self.get_history_anchor()), self.get_turn_context()]
+        return "\n\n".join(part for part in parts if part) or None
+
+    def _request_messages(self) -> List[Dict[str, Any]]:
+        """The messages of the pending request, the request context appended to the newest one."""
+        messages = self._history_messages()
+        context = self._request_context()
+        if context and messages and messages[-1]["role"] == "user":
+            last = messages[-1]
+            messages = messages[:-1] + [{**last, "content": f"{last['content']}\n\n{context}"}]
+        return messages
+
+    def _build_request(self, max_tokens: int, response_format: Optional[BaseModel] = None) -> Dict[str, Any]:
+        """Prepare the request parameters for the current history."""
+        system, messages = self._cache_marked_messages()
         request_params = {
             "model": self.model,
             "max_tokens": max_tokens,
-            "messages": self.messages
+            "messages": messages,
+            "extra_headers": {"anthropic-beta": PROMPT_CACHING_BETA},
+            # The SDK's own timeout is minutes long, a call never outlives its route's deadline
+            "timeout": self.route.deadline,
         }
+        if system:
+            request_params["system"] = system
         
         # Add response format if provided
         if response_format:
             request_params["response_format"] = {"type": "json_object"}
+        return request_params
 
-        response = self.client.messages.create(**request_params)
-        
-        # Extract and add assistant response
+    def _cache_marked_messages(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split out the system prompt and mark the stable prefixes for prompt caching.
+
+        Breakpoints go on the system prompt, the previous user turn (read what the
+        last call wrote) and the newest user turn (write the whole history). The
+        history itself is left untouched so the prefix stays byte-identical, and the
+        request context (anchor and turn context) goes in an unmarked block after the
+        last breakpoint.
+        """
+        request_messages = self._history_messages()
+        system = [{"type": "text", "text": m["content"]} for m in request_messages if m["role"] == "system"]
+        if system:
+            system[-1]["cache_control"] = {"type": "ephemeral"}
+        messages = [dict(m) for m in request_messages if m["role"] != "system"]
+        user_turns = [i for i, m in enumerate(messages) if m["role"] == "user"]
+        for i in user_turns[-2:]:
+            content = messages[i]["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            else:
+                content = [dict(block) for block in content]
+            content[-1]["cache_control"] = {"type": "ephemeral"}
+            messages[i]["content"] = content
+        context = self._request_context()
+        if context and messages and messages[-1]["role"] == "user":
+            content = messages[-1]["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            messages[-1]["content"] = content + [{"type": "text", "text": context}]
+        return system, messages
+
+    def _record_usage(self, usages: List[Any]) -> Dict[str, int]:
+        """Keep per-call (summed over retries) and accumulated token usage, including prompt cache reads/writes."""
+        self.last_usage = {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        for usage in usages:
+            for key in self.last_usage:
+                self.last_usage[key] += getattr(usage, key, 0) or 0
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] = self.usage_totals.get(key, 0) + value
+        # One usage per attempt, more than one means instructor retried a failed validation
+        tracer.current().set(attempts=len(usages), retries=max(len(usages) - 1, 0), **self.last_usage)
+        logger.debug(f"{type(self).__name__} usage: {self.last_usage}")
+        return self.last_usage
+
+    def _extract_text(self, response) -> str:
         assistant_content = ""
         if response.content:
             for block in response.content:
@@ -62,8 +170,49 @@ class AnthropicChat:
                     assistant_content += block.text
                 elif isinstance(block, dict) and 'text' in block:
                     assistant_content += block['text']
-        
-        # Add assistant response to history
+        return assistant_content
+    
+    def _replayed_text(self, entry: Dict[str, Any]) -> str:
+        """Recorded text response served in replay mode, with its usage."""
+        self.last_usage = dict(entry["usage"])
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] = self.usage_totals.get(key, 0) + value
+        return entry["response"]
+
+    def send_message(self, content: str, max_tokens: int = 1000, response_format: Optional[BaseModel] = None) -> str:
+        """Send a message and get the assistant's response."""
+        # Add user message
+        self.add_user_message(content)
+
+        replayed = traffic_recorder.replay_chat(self)
+        if replayed is not None:
+            assistant_content = self._replayed_text(replayed)
+        else:
+            started = time.perf_counter()
+            with tracer.span("anthropic.messages", LLM, model=self.model), model_router.observe(self.route, self):
+                response = self.client.messages.create(**self._build_request(max_tokens, response_format))
+                self._record_usage([response.usage])
+            # Extract the assistant response, recorded before it's added to the history
+            assistant_content = self._extract_text(response)
+            traffic_recorder.record_chat(self, assistant_content, time.perf_counter() - started, self.last_usage)
         self.add_assistant_message(assistant_content)
         
         return assistant_content
+
+    async def asend_message(self, content: str, max_tokens: int = 1000, response_format: Optional[BaseModel] = None) -> str:
+        """Async counterpart of send_message, doesn't block the event loop."""
+        self.add_user_message(content)
+
+        replayed = await traffic_recorder.areplay_chat(self)
+        if replayed is not None:
+            assistant_content = self._replayed_text(replayed)
+        else:
+            started = time.perf_counter()
+            with tracer.span("anthropic.messages", LLM, model=self.model), model_router.observe(self.route, self):
+                response = await self.async_client.messages.create(**self._build_request(max_tokens, response_format))
+                self._record_usage([response.usage])
+            assistant_content = self._extract_text(response)
+            traffic_recorder.record_chat(self, assistant_content, time.perf_counter() - started, self.last_usage)
+        self.add_assistant_message(assistant_content)
+
+        return assistant_content
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import instructor
+from anthropic import Anthropic, AsyncAnthropic
+from openai import OpenAI, AsyncOpenAI
+
+from .recorder import traffic_recorder
+from ..tracing import tracer
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# provider -> (api key env var, sync SDK class, async SDK class, instructor wrapper)
+PROVIDERS = {
+    "anthropic": ("ANTHROPIC_API_KEY", Anthropic, AsyncAnthropic, instructor.from_anthropic),
+    "openai": ("OPENAI_API_KEY", OpenAI, AsyncOpenAI, instructor.from_openai),
+}
+
+
+# Provider usage objects of the structured call running in the current context, see capture_usage
+_captured_usage: ContextVar[Optional[List[Any]]] = ContextVar("captured_usage", default=None)
+
+
+@contextmanager
+def capture_usage():
+    """Collect the raw usage of every completion (one per instructor attempt) made inside the block.
+
+    instructor swaps the usage of the returned completion for its own running total,
+    which drops provider specific fields such as prompt cache token counts.
+    """
+    usages: List[Any] = []
+    token = _captured_usage.set(usages)
+    try:
+        yield usages
+    finally:
+        _captured_usage.reset(token)
+
+
+def _on_completion_response(response) -> None:
+    usages = _captured_usage.get()
+    usage = getattr(response, "usage", None)
+    if usages is not None and usage is not None:
+        usages.append(usage)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of SDK clients shared by every chat agent.
+
+    SDK clients are keyed by provider and model, and every client of a provider sits on
+    the same keep-alive httpx connection pool, so new agents don't pay new TLS handshakes.
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 120.0, http2: Optional[bool] = None):
+        self._lock = threading.Lock()
+        self._env_loaded = False
+        self._clients: Dict[Tuple[str, str, bool, bool], Any] = {}
+        self._http_clients: Dict[Tuple[str, bool], Any] = {}
+        # Optional async callable awaited before every async request (batch mode rate limiting)
+        self.request_limiter: Optional[Callable[[], Awaitable[None]]] = None
+        self.configure(max_connections, max_keepalive_connections, keepalive_expiry, http2)
+        self._stats = {"clients_created": 0, "clients_reused": 0, "requests": 0, "connections_opened": 0}
+
+    def configure(self, max_connections: int = 20, max_keepalive_connections: int = 10,
+                  keepalive_expiry: float = 120.0, http2: Optional[bool] = None) -> None:
+        """Set pool limits. Only applies to connection pools created afterwards."""
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        if http2 is None:
+            http2 = os.getenv("JELOU_HTTP2", "0").lower() in ("1", "true", "yes")
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+
+    def load_env(self) -> None:
+        """Load .env once per process."""
+        if self._env_loaded:
+            return
+        with self._lock:
+            if not self._env_loaded:
+                if os.path.exists('.env'):
+                    from dotenv import load_dotenv
+                    load_dotenv()
+                self._env_loaded = True
+
+    def has_credentials(self, provider: str) -> bool:
+        """Whether the provider's API key is set, e.g. before failing over to it."""
+        self.load_env()
+        return bool(os.getenv(PROVIDERS[provider][0]))
+
+    def get(self, provider: str, model: str, use_async: bool = False, structured: bool = False):
+        """Return the shared (optionally instructor-wrapped) client for a provider and model."""
+        self.load_env()
+        key = (provider, model, use_async, structured)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._stats["clients_reused"] += 1
+                return client
+            api_key_env, sync_cls, async_cls, wrap = PROVIDERS[provider]
+            sdk_cls = async_cls if use_async else sync_cls
+            api_key = os.getenv(api_key_env)
+            if not api_key and traffic_recorder.replaying:
+                # The SDKs refuse to build without a key, replayed calls never reach them
+                api_key = "replay"
+            client = sdk_cls(api_key=api_key, http_client=self._http_client(provider, use_async))
+            if structured:
+                client = wrap(client=client)
+                client.on("completion:response", _on_completion_response)
+            self._clients[key] = client
+            self._stats["clients_created"] += 1
+            return client
+
+    def _http_client(self, provider: str, use_async: bool):
+        # Called with the lock held
+        key = (provider, use_async)
+        http_client = self._http_clients.get(key)
+        if http_client is None:
+            if use_async:
+                http_client = httpx.AsyncClient(limits=self.limits, http2=self.http2,
+                                                event_hooks={"request": [self._on_async_request]})
+            else:
+                http_client = httpx.Client(limits=self.limits, http2=self.http2,
+                                           event_hooks={"request": [self._on_request]})
+            self._http_clients[key] = http_client
+        return http_client
+
+    def _count_connection(self, event_name: str) -> None:
+        # Every new TCP connection means a handshake, the rest of the requests reused one
+        if event_name == "connection.connect_tcp.complete":
+            self._stats["connections_opened"] += 1
+
+    def _on_request(self, request: httpx.Request) -> None:
+        tracer.current().add("http_requests", 1)
+        self._stats["requests"] += 1
+        request.extensions["trace"] = lambda event_name, info: self._count_connection(event_name)
+
+    async def _on_async_request(self, request: httpx.Request) -> None:
+        if self.request_limiter is not None:
+            started = time.perf_counter()
+            await self.request_limiter()
+            tracer.current().add("wait_seconds", time.perf_counter() - started)
+        tracer.current().add("http_requests", 1)
+        self._stats["requests"] += 1
+
+        async def trace(event_name, info):
+            self._count_connection(event_name)
+        request.extensions["trace"] = trace
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["connections_reused"] = max(stats["requests"] - stats["connections_opened"], 0)
+        stats["connection_reuse_ratio"] = stats["connections_reused"] / stats["requests"] if stats["requests"] else 0.0
+        stats["http2"] = self.http2
+        return stats
+
+    def close(self) -> None:
+        """Close the sync connection pools (async ones are closed by aclose)."""
+        with self._lock:
+            for (provider, use_async), http_client in list(self._http_clients.items()):
+                if not use_async:
+                    http_client.close()
+                    del self._http_clients[(provider, use_async)]
+            self._clients = {key: client for key, client in self._clients.items() if key[2]}
+
+    async def aclose(self) -> None:
+        self.close()
+        with self._lock:
+            async_clients = [client for (_, use_async), client in self._http_clients.items() if use_async]
+            self._http_clients = {}
+            self._clients = {}
+        for http_client in async_clients:
+            await http_client.aclose()
+
+
+client_registry = ClientRegistry()
@@ -0,0 +1,129 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+
+class HistoryManager:
+    """
+    Keeps the history sent to the model under a token budget.
+
+    System messages and the last keep_last_turns turns are always sent verbatim. When a new
+    message takes the history over the budget, the oldest turns are folded into an excerpt
+    message right after the system prompt: one line per folded message, whitespace collapsed
+    and cut at summary_line_chars. Folding goes down to fold_target of the budget, so several
+    turns fit before the next fold.
+
+    The excerpt only changes when turns are folded (in track), so between folds it's part of
+    the cached prompt prefix. The anchor (e.g. the slots collected so far) changes every turn,
+    it's sent after the newest message instead, see anchor_text.
+    """
+
+    SUMMARY_HEADER = "Extracto de la conversación anterior (los mensajes originales ya no se muestran):"
+
+    def __init__(self, token_budget: Optional[int] = None, keep_last_turns: int = 4,
+                 chars_per_token: float = 4.0, summary_line_chars: int = 200, max_summary_lines: int = 40,
+                 fold_target: float = 0.75):
+        if token_budget is None:
+            token_budget = int(os.getenv("JELOU_HISTORY_TOKEN_BUDGET", "12000"))
+        self.token_budget = token_budget
+        self.keep_last_turns = keep_last_turns
+        self.chars_per_token = chars_per_token
+        self.summary_line_chars = summary_line_chars
+        self.max_summary_lines = max_summary_lines
+        self.fold_target = fold_target
+        # Token estimate of every message in the chat history, same order as chat.messages
+        self.token_counts: List[int] = []
+        # Conversation (non-system) messages already folded into the excerpt
+        self.folded = 0
+        self.summary_lines: List[str] = []
+
+    def count_tokens(self, message: Dict[str, Any]) -> int:
+        content = message["content"]
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        # Rough estimate plus the per-message overhead of the chat format
+        return int(len(content) / self.chars_per_token) + 4
+
+    def track(self, message: Dict[str, Any], messages: Optional[List[Dict[str, Any]]] = None,
+              anchor: Optional[Dict[str, Any]] = None) -> None:
+        """Count a message appended to the history. Given the whole history, fold and trim it to the budget."""
+        self.token_counts.append(self.count_tokens(message))
+        if messages is not None:
+            self._fold(messages, anchor)
+
+    def total_tokens(self) -> int:
+        return sum(self.token_counts)
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"token_counts": self.token_counts, "folded": self.folded, "summary_lines": self.summary_lines}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.token_counts = list(state["token_counts"])
+        self.folded = state["folded"]
+        self.summary_lines = list(state["summary_lines"])
+
+    def build(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the messages to send for the current history. Doesn't change any state, see track."""
+        if not self.folded:
+            return messages
+        system = [m for m in messages if m["role"] == "system"]
+        conversation = [m for m in messages if m["role"] != "system"]
+        summary = {"role": "user", "content": self._summary_text()}
+        return system + [summary] + conversation[self.folded:]
+
+    def anchor_text(self, anchor: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Note with the anchor once turns are folded, sent with the newest message (outside the cached prefix)."""
+        if not self.folded or not anchor:
+            return None
+        return "Datos confirmados hasta ahora:\n" + json.dumps(anchor, ensure_ascii=False, indent=1)
+
+    def _fold(self, messages: List[Dict[str, Any]], anchor: Optional[Dict[str, Any]]) -> None:
+        counts = self.token_counts if len(self.token_counts) == len(messages) else [self.count_tokens(m) for m in messages]
+        system = [(m, c) for m, c in zip(messages, counts) if m["role"] == "system"]
+        conversation = [(m, c) for m, c in zip(messages, counts) if m["role"] != "system"]
+        # The anchor note is sent with every request once folding started
+        budget = self.token_budget - sum(c for _, c in system) - self.count_tokens({"content": self.anchor_text(anchor) or ""})
+
+        def sent_tokens() -> int:
+            summary = self.count_tokens({"content": self._summary_text()}) if self.folded else 0
+            return summary + sum(c for _, c in conversation[self.folded:])
+
+        if sent_tokens() <= budget:
+            # Under budget the excerpt is left as it is, it stays in the cached prefix
+            return
+
+        turn_starts = [i for i, (m, _) in enumerate(conversation) if m["role"] == "user"]
+        # Never fold into the last keep_last_turns turns
+        max_fold = turn_starts[-self.keep_last_turns] if len(turn_starts) >= self.keep_last_turns else 0
+        target = budget * self.fold_target
+        folded = self.folded
+        while self.folded < max_fold and sent_tokens() > target:
+            # Fold the next whole turn
+            next_start = next((i for i in turn_starts if i > self.folded), max_fold)
+            for message, _ in conversation[self.folded:min(next_start, max_fold)]:
+                self.summary_lines.append(self._summarize(message))
+            self.folded = min(next_start, max_fold)
+            del self.summary_lines[:-self.max_summary_lines]
+
+        if self.folded == folded:
+            # Nothing left to fold, the recent turns alone are over budget
+            return
+        # Still over the target: drop the oldest excerpt lines, the anchor note keeps the collected facts
+        while self.summary_lines and sent_tokens() > target:
+            del self.summary_lines[0]
+
+    def _summarize(self, message: Dict[str, Any]) -> str:
+        content = message["content"]
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        content = " ".join(content.split())
+        if len(content) > self.summary_line_chars:
+            content = content[:self.summary_line_chars] + "…"
+        speaker = "Usuario" if message["role"] == "user" else "Asistente"
+        return f"- {speaker}: {content}"
+
+    def _summary_text(self) -> str:
+        parts = [self.SUMMARY_HEADER]
+        if self.summary_lines:
+            parts.append("Turnos anteriores:\n" + "\n".join(self.summary_lines))
+        return "\n".join(parts)
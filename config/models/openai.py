@@ -1,69 +1,164 @@
 import os
+import time
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
 from pydantic import BaseModel
 
+from .client_registry import client_registry
+from .history import HistoryManager
+from .recorder import traffic_recorder
+from .routing import model_router
+from ..tracing import LLM, tracer
+
+import logging
+logger = logging.getLogger(__name__)
+
 
 class OpenAIChat:
-    def __init__(self, model: str = "gpt-4.1"):
-        # Load environment variables from .env if present
-        if os.path.exists('.env'):
-            from dotenv import load_dotenv
-            load_dotenv()
+    provider = "openai"
+
+    def __init__(self, model: Optional[str] = None):
+        # Load environment variables from .env if present (once per process)
+        client_registry.load_env()
 
         api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
+        if not api_key and not traffic_recorder.replaying:
             raise ValueError("OPENAI_API_KEY environment variable is required")
 
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=api_key)
-        self.model = model
+        # Model from the routing policy, model= pins one
+        self.route = model_router.route(type(self).__name__, self.provider, model)
+        self.model = self.route.model
+        # Shared clients, every agent reuses the same keep-alive connection pool
+        self.client = client_registry.get("openai", self.model)
+        # Async client for use inside the event loop (asend_message)
+        self.async_client = client_registry.get("openai", self.model, use_async=True)
         self.messages: List[Dict[str, Any]] = []
+        # Decides what part of self.messages is actually sent (token budget, older turns folded into an excerpt)
+        self.history = HistoryManager()
+        self.last_usage: Dict[str, int] = {}
+        self.usage_totals: Dict[str, int] = {}
 
     def add_system_message(self, content: str) -> None:
-        self.messages.append({"role": "system", "content": content})
+        self._append_message({"role": "system", "content": content})
 
     def add_user_message(self, content: str) -> None:
-        self.messages.append({"role": "user", "content": content})
+        self._append_message({"role": "user", "content": content})
 
     def add_assistant_message(self, content: str) -> None:
-        self.messages.append({"role": "assistant", "content": content})
+        self._append_message({"role": "assistant", "content": content})
 
     def get_messages(self) -> List[Dict[str, Any]]:
         return self.messages.copy()
 
-    def send_message(self, content: str, max_tokens: int = 1000, response_format: Optional[BaseModel] = None) -> str:
-        # Add user message
-        self.add_user_message(content)
-
+    def _append_message(self, message: Dict[str, Any]) -> None:
+        self.messages.append(message)
+        # Folds the oldest turns into the excerpt once the history is over its token budget
+        self.history.track(message, self.messages, self.get_history_anchor())
+
+    def get_state(self) -> Dict[str, Any]:
+        # JSON-serializable conversation state, see load_state
+        return {"messages": self.messages, "history": self.history.get_state(), "usage_totals": self.usage_totals}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.messages = list(state["messages"])
+        self.history.load_state(state["history"])
+        self.usage_totals = dict(state.get("usage_totals", {}))
+
+    def get_history_anchor(self) -> Optional[Dict[str, Any]]:
+        # Facts resent with every request once turns are folded, e.g. the slots collected so far
+        return None
+
+    def get_turn_context(self) -> Optional[str]:
+        # Per-request note sent after the newest user message and never kept in the history, e.g. the current workflow
+        return None
+
+    def _request_context(self) -> Optional[str]:
+        # Everything that changes per request: the history anchor (once turns are folded) and the turn context
+        parts = [self.history.anchor_text(self.get_history_anchor()), self.get_turn_context()]
+        return "\n\n".join(part for part in parts if part) or None
+
+    def _request_messages(self) -> List[Dict[str, Any]]:
+        # The history as it is sent: within the token budget, older turns folded into an excerpt.
+        # The request context goes at the very end, so the automatically cached prefix stays the same
+        messages = self.history.build(self.messages)
+        context = self._request_context()
+        if context and messages and messages[-1]["role"] == "user":
+            last = messages[-1]
+            messages = messages[:-1] + [{**last, "content": f"{last['content']}\n\n{context}"}]
+        return messages
+
+    def _build_request(self, max_tokens: int, response_format: Optional[BaseModel] = None) -> Dict[str, Any]:
         request_params: Dict[str, Any] = {
             "model": self.model,
-            "messages": self.messages,
+            "messages": self._request_messages(),
             "max_tokens": max_tokens,
+            # OpenAI caches prompt prefixes automatically, the key keeps an agent's calls on the same cache
+            "extra_body": {"prompt_cache_key": self._prompt_cache_key()},
+            # The SDK's own timeout is minutes long, a call never outlives its route's deadline
+            "timeout": self.route.deadline,
         }
 
         # OpenAI's response_format can be {"type": "json_object"}
         if response_format is not None:
             request_params["response_format"] = {"type": "json_object"}
+        return request_params
+
+    def _prompt_cache_key(self) -> str:
+        return f"jelou-wizard:{type(self).__name__}:{self.model}"
+
+    def _record_usage(self, usages: List[Any]) -> Dict[str, int]:
+        # Per-call (summed over retries) and accumulated token usage,
+        # cached_tokens is the prompt prefix served from cache
+        # OpenAI doesn't report cache writes separately
+        self.last_usage = {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        for usage in usages:
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.last_usage["input_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.last_usage["output_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+            self.last_usage["cache_read_input_tokens"] += getattr(details, "cached_tokens", 0) or 0
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] = self.usage_totals.get(key, 0) + value
+        tracer.current().set(attempts=len(usages), retries=max(len(usages) - 1, 0), **self.last_usage)
+        logger.debug(f"{type(self).__name__} usage: {self.last_usage}")
+        return self.last_usage
+
+    def _replayed_text(self, entry: Dict[str, Any]) -> str:
+        # Recorded text response served in replay mode, with its usage
+        self.last_usage = dict(entry["usage"])
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] = self.usage_totals.get(key, 0) + value
+        return entry["response"]
 
-        response = self.client.chat.completions.create(**request_params)
+    def send_message(self, content: str, max_tokens: int = 1000, response_format: Optional[BaseModel] = None) -> str:
+        # Add user message
+        self.add_user_message(content)
 
-        assistant_content = response.choices[0].message.content if response.choices else ""
+        replayed = traffic_recorder.replay_chat(self)
+        if replayed is not None:
+            assistant_content = self._replayed_text(replayed)
+        else:
+            started = time.perf_counter()
+            with tracer.span("openai.chat", LLM, model=self.model), model_router.observe(self.route, self):
+                response = self.client.chat.completions.create(**self._build_request(max_tokens, response_format))
+                self._record_usage([response.usage])
+            assistant_content = response.choices[0].message.content if response.choices else ""
+            # Recorded before it's added to the history, the fingerprint is the request
+            traffic_recorder.record_chat(self, assistant_content, time.perf_counter() - started, self.last_usage)
         self.add_assistant_message(assistant_content)
         return assistant_content
 
+    async def asend_message(self, content: str, max_tokens: int = 1000, response_format: Optional[BaseModel] = None) -> str:
+        # Async counterpart of send_message, doesn't block the event loop
+        self.add_user_message(content)
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        replayed = await traffic_recorder.areplay_chat(self)
+        if replayed is not None:
+            assistant_content = self._replayed_text(replayed)
+        else:
+            started = time.perf_counter()
+            with tracer.span("openai.chat", LLM, model=self.model), model_router.observe(self.route, self):
+                response = await self.async_client.chat.completions.create(**self._build_request(max_tokens, response_format))
+                self._record_usage([response.usage])
+            assistant_content = response.choices[0].message.content if response.choices else ""
+            traffic_recorder.record_chat(self, assistant_content, time.perf_counter() - started, self.last_usage)
+        self.add_assistant_message(assistant_content)
+        return assistant_content
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+from .response_cache import response_cache
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ReplayMissError(LookupError):
+    """Replay mode got a request that isn't in the recording."""
+
+
+class TrafficRecorder:
+    """
+    Record/replay of the LLM and MCP traffic of a wizard run, one JSON line per exchange.
+
+    JELOU_RECORD=record appends every request with its response, duration and token usage
+    to JELOU_RECORD_PATH. JELOU_RECORD=replay serves those responses instead of calling the
+    providers, matched by request fingerprint (the same normalized key as the response
+    cache); a fingerprint seen several times is replayed in recorded order. Replayed calls
+    wait their recorded duration times JELOU_REPLAY_LATENCY (0 for instant).
+
+    The response cache is bypassed while recording or replaying, so a recording holds every
+    call and a replay doesn't depend on the cache contents.
+    """
+
+    def __init__(self, mode: Optional[str] = None, path: Optional[str] = None, latency_scale: Optional[float] = None):
+        mode = (mode if mode is not None else os.getenv("JELOU_RECORD", "")).lower()
+        if mode not in ("", "off", "record", "replay"):
+            raise ValueError(f"JELOU_RECORD must be 'record' or 'replay', got {mode!r}")
+        self.mode = mode if mode in ("record", "replay") else None
+        self.path = path or os.getenv("JELOU_RECORD_PATH", os.path.join(os.getcwd(), "recordings.jsonl"))
+        if latency_scale is None:
+            latency_scale = float(os.getenv("JELOU_REPLAY_LATENCY", "1"))
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._recorded: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    # Fingerprints
+
+    @staticmethod
+    def chat_fingerprint(chat) -> str:
+        return response_cache.key_for(chat)
+
+    @staticmethod
+    def fingerprint(kind: str, request: Any) -> str:
+        payload = json.dumps({"kind": kind, "request": request}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # Recording
+
+    def record_chat(self, chat, model_response: Union[BaseModel, str], duration: float, usage: Optional[Dict[str, int]] = None) -> None:
+        """Record a chat call (structured, or plain text). Call it before the response is added to the chat's history."""
+        if not self.recording:
+            return
+        # Plain chats take their response_format per call
+        response_format = getattr(chat, "response_format", None)
+        self._append({
+            "kind": "llm",
+            "fingerprint": self.chat_fingerprint(chat),
+            "agent": type(chat).__name__,
+            "provider": chat.provider,
+            "model": chat.model,
+            "request": {"messages": chat._request_messages(),
+                        "schema": response_format.__name__ if response_format else None},
+            "response": model_response.model_dump(mode="json") if isinstance(model_response, BaseModel) else model_response,
+            "usage": usage or {},
+            "duration": duration,
+        })
+
+    def record(self, kind: str, request: Any, response: Any, duration: float) -> None:
+        """Record any other exchange, e.g. an MCP lookup."""
+        if not self.recording:
+            return
+        self._append({"kind": kind, "fingerprint": self.fingerprint(kind, request), "request": request,
+                      "response": response, "usage": {}, "duration": duration})
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        entry["ts"] = time.time()
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.stats["recorded"] += 1
+
+    # Replay
+
+    def replay_chat(self, chat) -> Optional[Dict[str, Any]]:
+        """Recorded exchange for the chat's pending request, None when not replaying."""
+        if not self.replaying:
+            return None
+        entry = self._next(self.chat_fingerprint(chat), type(chat).__name__)
+        time.sleep(entry["duration"] * self.latency_scale)
+        return entry
+
+    async def areplay_chat(self, chat) -> Optional[Dict[str, Any]]:
+        if not self.replaying:
+            return None
+        entry = self._next(self.chat_fingerprint(chat), type(chat).__name__)
+        await asyncio.sleep(entry["duration"] * self.latency_scale)
+        return entry
+
+    async def areplay(self, kind: str, request: Any) -> Optional[Dict[str, Any]]:
+        if not self.replaying:
+            return None
+        entry = self._next(self.fingerprint(kind, request), kind)
+        await asyncio.sleep(entry["duration"] * self.latency_scale)
+        return entry
+
+    def _next(self, fingerprint: str, source: str) -> Dict[str, Any]:
+        with self._lock:
+            if self._recorded is None:
+                self._recorded = self._load()
+            entries = self._recorded.get(fingerprint)
+            if not entries:
+                self.stats["misses"] += 1
+                raise ReplayMissError(f"No recorded response for {source} request {fingerprint[:12]} in {self.path}")
+            # Repeated requests get their responses in recorded order, the last one is reused after that
+            index = min(self._cursors[fingerprint], len(entries) - 1)
+            self._cursors[fingerprint] += 1
+            self.stats["replayed"] += 1
+            return entries[index]
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        recorded: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        if not os.path.exists(self.path):
+            logger.warning(f"Replaying without a recording, {self.path} doesn't exist")
+            return recorded
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable recording line {number} of {self.path}")
+                    continue
+                recorded[entry["fingerprint"]].append(entry)
+        return recorded
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"mode": self.mode or "off", **self.stats}
+
+
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,405 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from instructor.exceptions import InstructorRetryException
+
+from .client_registry import client_registry
+from .recorder import traffic_recorder
+from .routing import Route, model_router
+from ..tracing import NOOP_SPAN, tracer
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceededError(TimeoutError):
+    """A call (hedges and failovers included) went over its route's deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider's circuit is open and there's nowhere to fail over."""
+
+
+class CircuitBreaker():
+    """
+    Consecutive failure counter of one provider.
+
+    After failure_threshold failed calls in a row the circuit opens and calls are refused
+    (or failed over) for reset_timeout seconds. Then one trial call at a time is let
+    through, a success closes the circuit again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # Trial call, the next one waits for its outcome or another reset_timeout
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+            if self.opened_at is None:
+                logger.warning(f"{self.name} circuit opened after {self.failures} failed calls")
+                self.times_opened += 1
+            # A failed trial call reopens it for another reset_timeout
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened}
+
+
+class ProviderGuard():
+    """
+    Deadlines, hedged requests and circuit breaking for structured LLM calls.
+
+    Every call has its route's deadline. When the primary call is still running after the
+    route's recent p95 latency (hedge_after until there are enough samples), the same request
+    is sent to the route's alternate provider or model and whichever answers first wins, the
+    other is cancelled. Hedges are capped at max_hedge_ratio of all calls, so they can't
+    double the spend. A primary that fails, or whose provider circuit is open, fails over to
+    the alternate right away. Hedging and failover send requests to a second provider, so they
+    are opt-in (JELOU_HEDGE=1); deadlines and circuits always apply. Recording and replay runs
+    are never hedged. Sync calls (complete_sync, stream_sync) get the same deadline, circuits
+    and failover, but can't be hedged.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_hedge_ratio: float = 0.1, min_hedge_delay: float = 0.5,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        if enabled is None:
+            enabled = os.getenv("JELOU_HEDGE", "0").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_hedge_delay = min_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._calls = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = self._breakers[provider] = CircuitBreaker(provider, self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def _stats_for(self, route: Route) -> Dict[str, int]:
+        with self._lock:
+            stats = self._stats.get(route.key)
+            if stats is None:
+                stats = self._stats[route.key] = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0,
+                                                  "deadline_exceeded": 0, "circuit_rejections": 0}
+            return stats
+
+    def _alternate(self, chat) -> Optional[Route]:
+        """Route to hedge and fail over chat's calls to, None when there's nowhere to go."""
+        if not self.enabled or traffic_recorder.active:
+            return None
+        route = model_router.alternate(chat.route)
+        if route is None or not client_registry.has_credentials(route.provider):
+            return None
+        from .structured_chat import StructuredChat
+        if route.provider != chat.provider and not isinstance(chat, StructuredChat):
+            # Bound to one provider's SDK
+            return None
+        return route if self.breaker(route.provider).state != "open" else None
+
+    def _hedge_delay(self, route: Route) -> float:
+        p95 = model_router.recent_percentile(route, 0.95)
+        return max(p95 if p95 is not None else route.hedge_after, self.min_hedge_delay)
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > self.max_hedge_ratio * self._calls:
+                return False
+            self._hedges += 1
+            return True
+
+    async def _race(self, chat, attempt: Callable[[Any], Awaitable[Any]],
+                    discard: Optional[Callable[[Any], Awaitable[None]]] = None, span=None) -> Tuple[Any, Any]:
+        """
+        Run attempt(chat) under the deadline, hedging and failing over to the alternate.
+
+        Returns the chat whose attempt won and its result. discard releases the result of an
+        attempt that finished but lost. Hedges and failovers are noted on span (the current one by default).
+        """
+        route = chat.route
+        stats = self._stats_for(route)
+        stats["calls"] += 1
+        with self._lock:
+            self._calls += 1
+        loop = asyncio.get_running_loop()
+        deadline = route.deadline or model_router.policy["deadline"]
+        ends_at = loop.time() + deadline
+        alternate = self._alternate(chat)
+        span = span if span is not None else tracer.current()
+
+        attempts: Dict[asyncio.Task, Any] = {}
+        pending = set()
+
+        def start(target: Route) -> None:
+            # The alternate's copy of chat is only built when it's needed
+            if target is route:
+                target_chat = chat
+            else:
+                from .structured_chat import provider_variant
+                target_chat = provider_variant(chat, target)
+            task = asyncio.create_task(attempt(target_chat))
+            attempts[task] = target_chat
+            pending.add(task)
+
+        if self.breaker(route.provider).allow():
+            start(route)
+        else:
+            stats["circuit_rejections"] += 1
+            if alternate is None:
+                raise CircuitOpenError(f"The {route.provider} circuit is open, {route.agent} has no alternate route")
+            stats["failovers"] += 1
+            span.set(failed_over=True)
+            start(alternate)
+            alternate = None
+        hedge_at = loop.time() + self._hedge_delay(route) if alternate is not None else None
+
+        errors: List[BaseException] = []
+        winner = None
+        hedged = False
+        try:
+            while True:
+                if not pending:
+                    if alternate is None or not self.breaker(alternate.provider).allow():
+                        raise errors[0]
+                    # Every attempt failed before the hedge, fail over right away
+                    stats["failovers"] += 1
+                    span.set(failed_over=True)
+                    logger.info(f"{route.key} failed ({errors[0]!r}), failing over to {alternate.key}")
+                    start(alternate)
+                    alternate = hedge_at = None
+                now = loop.time()
+                if now >= ends_at:
+                    stats["deadline_exceeded"] += 1
+                    raise DeadlineExceededError(f"{route.agent} got no response within its {deadline}s deadline")
+                wake_at = min(ends_at, hedge_at) if hedge_at is not None else ends_at
+                done, pending = await asyncio.wait(pending, timeout=wake_at - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = attempts[task].route.provider
+                    try:
+                        result = task.result()
+                    except InstructorRetryException as e:
+                        # The provider answered, only the validation failed
+                        self.breaker(provider).record_success()
+                        errors.append(e)
+                    except Exception as e:
+                        self.breaker(provider).record_failure()
+                        errors.append(e)
+                    else:
+                        self.breaker(provider).record_success()
+                        if winner is None:
+                            winner = task
+                if winner is not None:
+                    won = attempts[winner]
+                    if hedged:
+                        stats["hedge_wins"] += won is not chat
+                        span.set(hedge_won=won is not chat)
+                    return won, winner.result()
+                if hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    # Over the hedge budget the alternate is still there to fail over to
+                    if pending and self._may_hedge():
+                        hedged = True
+                        stats["hedged"] += 1
+                        span.set(hedged=True)
+                        logger.debug(f"{route.key} is slow, hedging on {alternate.key}")
+                        start(alternate)
+                        alternate = None
+        finally:
+            for task in attempts:
+                if task is not winner and not task.done():
+                    task.cancel()
+            losers = [task for task in attempts if task is not winner]
+            await asyncio.gather(*losers, return_exceptions=True)
+            if discard is not None:
+                for task in losers:
+                    if not task.cancelled() and task.exception() is None:
+                        await discard(task.result())
+
+    def _run(self, chat, attempt: Callable[[Any], Any], span=None) -> Tuple[Any, Any]:
+        """
+        Blocking counterpart of _race for the sync send paths.
+
+        Same deadline, circuits and failover to the alternate, but no hedging: a blocking
+        call can't be raced, the alternate is only tried once the primary failed.
+        """
+        route = chat.route
+        stats = self._stats_for(route)
+        stats["calls"] += 1
+        with self._lock:
+            self._calls += 1
+        deadline = route.deadline or model_router.policy["deadline"]
+        ends_at = time.monotonic() + deadline
+        alternate = self._alternate(chat)
+        span = span if span is not None else tracer.current()
+
+        target = route
+        if not self.breaker(route.provider).allow():
+            stats["circuit_rejections"] += 1
+            if alternate is None:
+                raise CircuitOpenError(f"The {route.provider} circuit is open, {route.agent} has no alternate route")
+            stats["failovers"] += 1
+            span.set(failed_over=True)
+            target, alternate = alternate, None
+        while True:
+            if target is route:
+                target_chat = chat
+            else:
+                from .structured_chat import provider_variant
+                target_chat = provider_variant(chat, target)
+            try:
+                result = attempt(target_chat)
+            except InstructorRetryException as e:
+                # The provider answered, only the validation failed
+                self.breaker(target.provider).record_success()
+                error = e
+            except Exception as e:
+                self.breaker(target.provider).record_failure()
+                error = e
+            else:
+                self.breaker(target.provider).record_success()
+                return target_chat, result
+            if alternate is None or not self.breaker(alternate.provider).allow():
+                raise error
+            if time.monotonic() >= ends_at:
+                stats["deadline_exceeded"] += 1
+                raise DeadlineExceededError(f"{route.agent} got no response within its {deadline}s deadline") from error
+            stats["failovers"] += 1
+            span.set(failed_over=True)
+            logger.info(f"{route.key} failed ({error!r}), failing over to {alternate.key}")
+            target, alternate = alternate, None
+
+    @staticmethod
+    def _adopt_usage(chat, won) -> None:
+        # The usage of the chat that answered becomes chat's
+        if won is not chat:
+            chat.last_usage = dict(won.last_usage)
+            for key, value in won.usage_totals.items():
+                chat.usage_totals[key] = chat.usage_totals.get(key, 0) + value
+
+    @staticmethod
+    def _max_tokens(chat, attempt_chat, max_tokens: int) -> int:
+        # The caller's limit is meant for its own provider, another provider gets its class default
+        # (the OpenAI structured calls never send theirs, it would truncate Anthropic responses)
+        return max_tokens if attempt_chat.provider == chat.provider else attempt_chat.default_max_tokens
+
+    async def complete(self, chat, max_tokens: int):
+        """chat._acomplete under the guard. The winner's usage becomes chat's."""
+        won, model_response = await self._race(chat, lambda attempt_chat: attempt_chat._acomplete(self._max_tokens(chat, attempt_chat, max_tokens)))
+        self._adopt_usage(chat, won)
+        return model_response
+
+    def complete_sync(self, chat, max_tokens: int):
+        """chat._complete under the guard, see _run."""
+        won, model_response = self._run(chat, lambda attempt_chat: attempt_chat._complete(self._max_tokens(chat, attempt_chat, max_tokens)))
+        self._adopt_usage(chat, won)
+        return model_response
+
+    def stream_sync(self, chat, max_tokens: int, parent=NOOP_SPAN) -> Iterator[Any]:
+        """chat._stream under the guard, failing over up to the first partial response."""
+
+        def first_partial(attempt_chat):
+            partials = attempt_chat._stream(self._max_tokens(chat, attempt_chat, max_tokens), parent)
+            try:
+                return partials, next(partials)
+            except StopIteration:
+                return partials, None
+            except BaseException:
+                partials.close()
+                raise
+
+        _, (partials, partial) = self._run(chat, first_partial, parent)
+        try:
+            if partial is None:
+                return
+            yield partial
+            yield from partials
+        finally:
+            partials.close()
+
+    async def stream(self, chat, max_tokens: int, parent=NOOP_SPAN) -> AsyncIterator[Any]:
+        """chat._astream under the guard, raced up to the first partial response."""
+
+        async def first_partial(attempt_chat):
+            partials = attempt_chat._astream(self._max_tokens(chat, attempt_chat, max_tokens), parent)
+            try:
+                return partials, await partials.__anext__()
+            except StopAsyncIteration:
+                return partials, None
+            except BaseException:
+                await partials.aclose()
+                raise
+
+        async def discard(result):
+            await result[0].aclose()
+
+        loop = asyncio.get_running_loop()
+        ends_at = loop.time() + (chat.route.deadline or model_router.policy["deadline"])
+        _, (partials, partial) = await self._race(chat, first_partial, discard, parent)
+        try:
+            if partial is None:
+                return
+            yield partial
+            while True:
+                try:
+                    async with asyncio.timeout_at(ends_at):
+                        partial = await partials.__anext__()
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self._stats_for(chat.route)["deadline_exceeded"] += 1
+                    raise DeadlineExceededError(f"{chat.route.agent} stream didn't finish within its deadline")
+                yield partial
+        finally:
+            await partials.aclose()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per route hedge and failover counts, plus the state of every provider circuit."""
+        with self._lock:
+            routes = {key: dict(stats) for key, stats in sorted(self._stats.items())}
+            breakers = dict(self._breakers)
+        for stats in routes.values():
+            stats["hedge_win_rate"] = round(stats["hedge_wins"] / stats["hedged"], 3) if stats["hedged"] else 0.0
+        return {"routes": routes, "circuits": {name: breaker.stats() for name, breaker in sorted(breakers.items())}}
+
+
+provider_guard = ProviderGuard()
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of structured LLM responses.
+
+    Keys hash the provider, model, response schema and the normalized history that is
+    sent. A small in-memory LRU sits in front of a SQLite (WAL) tier shared by every
+    process; both tiers expire entries after ttl seconds. alookup/astore read and write the
+    disk tier in a worker thread, so the event loop never waits on SQLite.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 7 * 24 * 60 * 60,
+                 max_memory_entries: int = 256, max_disk_entries: int = 5000, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv("JELOU_RESPONSE_CACHE", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.path = path or os.getenv("JELOU_RESPONSE_CACHE_PATH", os.path.join(os.getcwd(), ".llm_response_cache.db"))
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    # Keys
+
+    @staticmethod
+    def _normalize(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        normalized = []
+        for message in messages:
+            content = message["content"]
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+            # Indentation and runs of spaces (f-string prompts, user typing) don't change the answer
+            content = "\n".join(" ".join(line.split()) for line in content.strip().splitlines())
+            normalized.append({"role": message["role"], "content": content})
+        return normalized
+
+    def key_for(self, chat) -> str:
+        payload = {
+            "provider": chat.provider,
+            "model": chat.model,
+            # Plain chats take their response_format per call, their responses are text
+            "schema": chat.response_format.model_json_schema() if getattr(chat, "response_format", None) else None,
+            "messages": self._normalize(chat._request_messages()),
+        }
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # Lookups
+
+    def lookup(self, chat) -> Optional[BaseModel]:
+        """Cached response for the chat's current history, or None."""
+        if not self.enabled:
+            return None
+        key = self.key_for(chat)
+        now = time.time()
+        model_response = self._memory_get(chat, key, now)
+        if model_response is not None:
+            return model_response
+        return self._disk_lookup(chat.response_format, key, now)
+
+    async def alookup(self, chat) -> Optional[BaseModel]:
+        """Async counterpart of lookup, the disk tier is read in a worker thread."""
+        if not self.enabled:
+            return None
+        key = self.key_for(chat)
+        now = time.time()
+        model_response = self._memory_get(chat, key, now)
+        if model_response is not None:
+            return model_response
+        return await asyncio.to_thread(self._disk_lookup, chat.response_format, key, now)
+
+    def store(self, chat, model_response: BaseModel) -> None:
+        stored = self._prepare_store(chat, model_response)
+        if stored is not None:
+            self._disk_put(*stored)
+
+    async def astore(self, chat, model_response: BaseModel) -> None:
+        """Async counterpart of store, the key is taken right away and the disk write runs in a worker thread."""
+        stored = self._prepare_store(chat, model_response)
+        if stored is not None:
+            await asyncio.to_thread(self._disk_put, *stored)
+
+    def _prepare_store(self, chat, model_response: BaseModel) -> Optional[tuple]:
+        # Keeps the response in memory, returns what the disk tier has to write
+        if not self.enabled:
+            return None
+        key = self.key_for(chat)
+        data = model_response.model_dump_json()
+        expires_at = time.time() + self.ttl
+        self._remember(key, data, expires_at)
+        self._count("stores")
+        return key, data, expires_at
+
+    def _memory_get(self, chat, key: str, now: float) -> Optional[BaseModel]:
+        with self._lock:
+            cached = self._memory.pop(key, None)
+        if cached is None or cached[0] <= now:
+            return None
+        model_response = self._load(chat.response_format, cached[1])
+        if model_response is None:
+            # Left out of memory, the disk tier evicts its copy too
+            return None
+        self._remember(key, cached[1], cached[0])
+        self._count("memory_hits")
+        return model_response
+
+    def _disk_lookup(self, response_format, key: str, now: float) -> Optional[BaseModel]:
+        row = self._disk_get(key, now)
+        model_response = self._load(response_format, row[0]) if row is not None else None
+        if model_response is None:
+            if row is not None:
+                self._disk_delete(key)
+            self._count("misses")
+            return None
+        # The memory copy expires with the disk row it came from
+        self._remember(key, row[0], row[1])
+        self._count("disk_hits")
+        return model_response
+
+    def _load(self, response_format, data: str) -> Optional[BaseModel]:
+        try:
+            return response_format.model_validate_json(data)
+        except ValidationError as e:
+            logger.warning(f"Evicting cached response that no longer matches the schema: {e}")
+            return None
+
+    def _count(self, stat: str) -> None:
+        # Disk lookups count from worker threads
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _remember(self, key: str, data: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    # Disk tier
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        if not self._schema_ready:
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self._schema_ready = True
+        return conn
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return None
+        try:
+            row = conn.execute("SELECT data, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+        finally:
+            conn.close()
+
+    def _disk_delete(self, key: str) -> None:
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return
+        try:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Couldn't evict cached response: {e}")
+        finally:
+            conn.close()
+
+    def _disk_put(self, key: str, data: str, expires_at: float) -> None:
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO responses (key, data, expires_at, last_access) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at, "
+                         "last_access = excluded.last_access", (key, data, expires_at, time.time()))
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_disk_entries:
+                conn.execute("DELETE FROM responses WHERE key IN "
+                             "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)", (count - self.max_disk_entries,))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            logger.warning(f"Couldn't store response in cache: {e}")
+        finally:
+            conn.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {**self.stats, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+response_cache = ResponseCache()
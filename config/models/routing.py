@@ -0,0 +1,259 @@
+import asyncio
+import copy
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The whole policy. JELOU_MODEL_ROUTES points to a YAML file merged over it, e.g.
+#   agents: {QAAgent: {tier: fast}}
+#   tasks: {workflow: {provider: anthropic, latency_budget: 15}}
+DEFAULT_POLICY: Dict[str, Any] = {
+    "default_provider": "anthropic",
+    # Model of every tier on every provider
+    "tiers": {
+        "fast": {"anthropic": "claude-3-5-haiku-20241022", "openai": "gpt-4.1-mini"},
+        "standard": {"anthropic": "claude-3-5-sonnet-20241022", "openai": "gpt-4.1"},
+    },
+    # Tier used instead while a route's recent p95 latency is over its budget
+    "downgrade": {"standard": "fast"},
+    # Seconds a call may take in total, hedges and failovers included
+    "deadline": 60.0,
+    # Where hedged and failover attempts go ("alternate" is the other provider, tier defaults to the route's)
+    "hedge": {"provider": "alternate"},
+    # Hedge delay until a route has enough calls for its own p95
+    "hedge_after": 10.0,
+    # tier, provider, latency_budget (seconds per call), deadline, hedge and hedge_after by task type
+    "tasks": {
+        "classification": {"tier": "fast", "deadline": 20.0, "hedge_after": 4.0},
+        "slot_filling": {"tier": "fast", "deadline": 30.0, "hedge_after": 6.0},
+        "interview": {"tier": "standard", "latency_budget": 10.0, "deadline": 45.0},
+        "workflow": {"tier": "standard", "provider": "openai", "latency_budget": 25.0, "deadline": 120.0, "hedge_after": 30.0},
+        "tool_use": {"tier": "standard", "deadline": 90.0},
+    },
+    # Task of every agent, plus any per agent override of tier, provider, model, latency_budget, deadline or hedge
+    "agents": {
+        "BusinessAgent": {"task": "classification"},
+        "QAAgent": {"task": "interview"},
+        "PackagesPrefillAgent": {"task": "interview"},
+        "PackageFillerAgent": {"task": "slot_filling"},
+        "BusinessFlowAgent": {"task": "workflow", "provider": "anthropic"},
+        "EcommerceFlowAgent": {"task": "workflow"},
+        "SimpleInformativeFlowAgent": {"task": "workflow"},
+        "JelouMCP": {"task": "tool_use"},
+    },
+}
+
+
+class Route():
+    """Provider and model an agent runs on."""
+
+    def __init__(self, agent: str, task: str, tier: str, provider: str, model: str,
+                 latency_budget: Optional[float] = None, downgraded_from: Optional[str] = None,
+                 deadline: Optional[float] = None, hedge_after: Optional[float] = None):
+        self.agent = agent
+        self.task = task
+        self.tier = tier
+        self.provider = provider
+        self.model = model
+        self.latency_budget = latency_budget
+        self.downgraded_from = downgraded_from
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+
+    @property
+    def key(self) -> str:
+        return f"{self.agent}:{self.provider}/{self.model}"
+
+    def __repr__(self) -> str:
+        return f"Route({self.key}, task={self.task}, tier={self.tier})"
+
+
+class _RouteStats():
+    def __init__(self, window: int):
+        # (finished at, seconds) of the last calls, for the percentiles and the latency budget
+        self.latencies: deque = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.routed = 0
+        self.downgraded = 0
+
+
+class ModelRouter():
+    """
+    Picks the provider and model of every agent from one policy (DEFAULT_POLICY).
+
+    An agent maps to a task type, the task to a tier and a provider, and the tier to a model
+    on that provider; agents can override any of them. When a route has a latency budget and
+    the p95 of its calls in the last budget_window seconds is over it, new agents get the
+    downgrade tier until the slow calls age out. Every call is observed per route: latency,
+    errors and instructor retries (validation failures, the quality signal) and tokens.
+    """
+
+    def __init__(self, policy: Optional[Dict[str, Any]] = None, path: Optional[str] = None, window: int = 200,
+                 budget_window: float = 300.0, min_samples: int = 5):
+        self.policy = copy.deepcopy(policy if policy is not None else DEFAULT_POLICY)
+        path = path or os.getenv("JELOU_MODEL_ROUTES")
+        if path:
+            self.policy = _merge(self.policy, _load_policy(path))
+        self.window = window
+        self.budget_window = budget_window
+        self.min_samples = min_samples
+        self._stats: Dict[str, _RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def _agent_spec(self, agent: str) -> Dict[str, Any]:
+        spec = self.policy["agents"].get(agent, {})
+        return {**self.policy["tasks"].get(spec.get("task"), {}), **spec}
+
+    def provider_for(self, agent: str) -> str:
+        return self._agent_spec(agent).get("provider") or self.policy["default_provider"]
+
+    def route(self, agent: str, provider: Optional[str] = None, model: Optional[str] = None) -> Route:
+        """Route for a new agent instance. provider is given by agents bound to one provider's SDK."""
+        spec = self._agent_spec(agent)
+        provider = provider or spec.get("provider") or self.policy["default_provider"]
+        tier = spec.get("tier", "standard")
+        budget = spec.get("latency_budget")
+        # An explicit model (constructor argument or agent override) is kept unless the route is downgraded
+        model = model or spec.get("model")
+        downgraded_from = None
+        while budget and tier in self.policy["downgrade"] and self._over_budget(self._key(agent, provider, model or self._model(tier, provider)), budget):
+            downgraded_from = downgraded_from or tier
+            tier, model = self.policy["downgrade"][tier], None
+        route = Route(agent, spec.get("task", "default"), tier, provider, model or self._model(tier, provider), budget, downgraded_from,
+                      spec.get("deadline", self.policy["deadline"]), spec.get("hedge_after", self.policy["hedge_after"]))
+        with self._lock:
+            stats = self._stats_for(route.key)
+            stats.routed += 1
+            if downgraded_from is not None:
+                stats.downgraded += 1
+        if downgraded_from is not None:
+            logger.info(f"{agent} is over its {budget}s latency budget on {downgraded_from}, routed to {route.key}")
+        return route
+
+    def alternate(self, route: Route) -> Optional[Route]:
+        """Where hedged and failover attempts of route go, None when that's route itself."""
+        hedge = self._agent_spec(route.agent).get("hedge", self.policy["hedge"])
+        provider = hedge.get("provider", "alternate")
+        if provider == "alternate":
+            providers = [name for name in self.policy["tiers"][route.tier] if name != route.provider]
+            provider = providers[0] if providers else route.provider
+        tier = hedge.get("tier", route.tier)
+        model = self._model(tier, provider)
+        if (provider, model) == (route.provider, route.model):
+            return None
+        return Route(route.agent, route.task, tier, provider, model, route.latency_budget, route.downgraded_from,
+                     route.deadline, route.hedge_after)
+
+    def recent_percentile(self, route: Route, p: float) -> Optional[float]:
+        """Latency percentile of route's calls in the last budget_window seconds, None with fewer than min_samples."""
+        return self._recent_percentile(route.key, p)
+
+    def _model(self, tier: str, provider: str) -> str:
+        try:
+            return self.policy["tiers"][tier][provider]
+        except KeyError:
+            raise ValueError(f"Model routing policy has no {provider} model for tier {tier!r}")
+
+    @staticmethod
+    def _key(agent: str, provider: str, model: str) -> str:
+        return f"{agent}:{provider}/{model}"
+
+    def _stats_for(self, key: str) -> _RouteStats:
+        # Called with the lock held
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _RouteStats(self.window)
+        return stats
+
+    def _over_budget(self, key: str, budget: float) -> bool:
+        p95 = self._recent_percentile(key, 0.95)
+        return p95 is not None and p95 > budget
+
+    def _recent_percentile(self, key: str, p: float) -> Optional[float]:
+        since = time.monotonic() - self.budget_window
+        with self._lock:
+            stats = self._stats.get(key)
+            recent = [seconds for finished, seconds in stats.latencies if finished >= since] if stats else []
+        return _percentile(recent, p) if len(recent) >= self.min_samples else None
+
+    @contextmanager
+    def observe(self, route: Route, chat=None, usages: Optional[List[Any]] = None) -> Iterator[None]:
+        """Time the provider call in the block. chat's last_usage tokens are counted when the block sets them, usages give the retries."""
+        started = time.perf_counter()
+        failed = cancelled = False
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            # A hedge race loser or an abandoned stream, its latency says nothing about the route
+            cancelled = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            if not cancelled:
+                self._record(route, seconds, failed, chat, usages)
+
+    def _record(self, route: Route, seconds: float, failed: bool, chat=None, usages: Optional[List[Any]] = None) -> None:
+        with self._lock:
+            stats = self._stats_for(route.key)
+            stats.calls += 1
+            stats.latencies.append((time.monotonic(), seconds))
+            stats.errors += failed
+            if usages:
+                stats.retries += len(usages) - 1
+            if chat is not None and not failed:
+                stats.input_tokens += chat.last_usage.get("input_tokens", 0)
+                stats.output_tokens += chat.last_usage.get("output_tokens", 0)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per route call counts, latency percentiles, error and retry rates and tokens."""
+        with self._lock:
+            items = [(key, stats, [seconds for _, seconds in stats.latencies]) for key, stats in sorted(self._stats.items())]
+        return {key: {
+            "routed": stats.routed,
+            "downgraded": stats.downgraded,
+            "calls": stats.calls,
+            "p50": round(_percentile(latencies, 0.5), 3),
+            "p95": round(_percentile(latencies, 0.95), 3),
+            "error_rate": round(stats.errors / stats.calls, 3) if stats.calls else 0.0,
+            "retry_rate": round(stats.retries / stats.calls, 3) if stats.calls else 0.0,
+            "input_tokens": stats.input_tokens,
+            "output_tokens": stats.output_tokens,
+        } for key, stats, latencies in items}
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest rank
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+def _load_policy(path: str) -> Dict[str, Any]:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(base)
+    for key, value in override.items():
+        merged[key] = _merge(base[key], value) if isinstance(value, dict) and isinstance(base.get(key), dict) else value
+    return merged
+
+
+model_router = ModelRouter()
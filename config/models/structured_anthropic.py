@@ -1,42 +1,25 @@
-from abc import ABC, abstractmethod
-import json
-from typing import Type, TypeVar, Optional
-from pydantic import BaseModel, ValidationError
+from abc import ABC
+from typing import Any, Dict, TypeVar
+from pydantic import BaseModel
 from .anthropic import AnthropicChat
-import instructor
+from .client_registry import client_registry
+from .structured_base import StructuredChatMixin
 
 T = TypeVar('T', bound=BaseModel)
 
 
-class StructuredAnthropicChat(AnthropicChat,ABC):
+class StructuredAnthropicChat(StructuredChatMixin, AnthropicChat, ABC):
     """
     A chat class that extends AnthropicChat to provide structured responses using Pydantic models.
     """
+
+    default_max_tokens = 8000
     
     def __init__(self):
         super().__init__()
-        self.client = instructor.from_anthropic(client=self.client)
-        self.response_format=None
-
-    def send_message(self, content: str, max_tokens: int = 8000) -> str:
-        # Add user message
-        self.add_user_message(content)
+        # Instructor-wrapped clients are shared through the registry too
+        self.client = client_registry.get("anthropic", self.model, structured=True)
+        self.async_client = client_registry.get("anthropic", self.model, use_async=True, structured=True)
 
-        # Prepare the request parameters
-        request_params = {
-            "model": self.model,
-            "max_tokens": max_tokens,
-            "messages": self.messages,
-            "response_model":self.response_format
-        }
-
-        response = self.client.chat.completions.create_with_completion(model=self.model,max_tokens=max_tokens, messages=self.messages,response_model=self.response_format)
-        model_response = response[0]                
-        # Add assistant response to history
-        self.add_assistant_message(self.get_model_assistant_message(model_response))
-        
-        return model_response    
-    
-    @abstractmethod
-    def get_model_assistant_message(self, model_response: BaseModel) -> str:
-        pass
+    def _structured_request(self, max_tokens: int) -> Dict[str, Any]:
+        return self._build_request(max_tokens)
@@ -0,0 +1,227 @@
+from abc import abstractmethod
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+from pydantic import BaseModel
+from .client_registry import capture_usage
+from .recorder import traffic_recorder
+from .resilience import provider_guard
+from .response_cache import response_cache
+from .routing import model_router
+from ..tracing import AGENT, LLM, NOOP_SPAN, tracer
+
+
+class StructuredChatMixin():
+    """
+    Provider-agnostic half of the structured chats: response cache, record/replay, history
+    and state. Mixed in before AnthropicChat/OpenAIChat, which provide the messages, and
+    the provider class only builds the instructor request (_structured_request).
+
+    Sync and async calls both go through provider_guard (deadlines, circuits, failover,
+    hedging on the async path only).
+    """
+
+    # Agents whose answer only depends on the request may reuse cached responses
+    cacheable = False
+    # max_tokens of calls made without one, e.g. hedged from another provider
+    default_max_tokens = 1000
+
+    def __init__(self):
+        super().__init__()
+        self.response_format = None
+        self.last_response = None
+
+    @abstractmethod
+    def _structured_request(self, max_tokens: int) -> Dict[str, Any]:
+        """Keyword arguments of the instructor call for the pending request."""
+
+    @abstractmethod
+    def get_model_assistant_message(self, model_response: BaseModel) -> str:
+        pass
+
+    # Turns
+
+    def send_message(self, content: str, max_tokens: Optional[int] = None, use_cache: Optional[bool] = None):
+        with tracer.span(type(self).__name__, AGENT) as turn:
+            self.add_user_message(content)
+
+            cached = self._cached_response(use_cache, turn)
+            if cached is not None:
+                return cached
+            replayed = self._replayed_response(traffic_recorder.replay_chat(self), turn)
+            if replayed is not None:
+                return replayed
+            started = time.perf_counter()
+            # Deadline, circuit breaking and failover to the alternate provider, see ProviderGuard
+            model_response = provider_guard.complete_sync(self, max_tokens or self.default_max_tokens)
+            traffic_recorder.record_chat(self, model_response, time.perf_counter() - started, self.last_usage)
+            self._accept_response(model_response, use_cache)
+            return model_response
+
+    async def asend_message(self, content: str, max_tokens: Optional[int] = None, use_cache: Optional[bool] = None):
+        """Async counterpart of send_message, doesn't block the event loop."""
+        with tracer.span(type(self).__name__, AGENT) as turn:
+            self.add_user_message(content)
+
+            cached = await self._acached_response(use_cache, turn)
+            if cached is not None:
+                return cached
+            replayed = self._replayed_response(await traffic_recorder.areplay_chat(self), turn)
+            if replayed is not None:
+                return replayed
+            started = time.perf_counter()
+            # Deadline, hedging and failover to the alternate provider, see ProviderGuard
+            model_response = await provider_guard.complete(self, max_tokens or self.default_max_tokens)
+            traffic_recorder.record_chat(self, model_response, time.perf_counter() - started, self.last_usage)
+            await self._aaccept_response(model_response, use_cache)
+            return model_response
+
+    def stream_message(self, content: str, max_tokens: Optional[int] = None, use_cache: Optional[bool] = None) -> Iterator[BaseModel]:
+        """Yield partial response models while they are generated.
+
+        The validated final model is added to the history and left in last_response.
+        A cache hit yields the full response once.
+        """
+        # Generators resume in their consumer's context, their spans are never made current
+        with tracer.span(type(self).__name__, AGENT, activate=False, stream=True) as turn:
+            self.add_user_message(content)
+
+            cached = self._cached_response(use_cache, turn)
+            if cached is not None:
+                yield cached
+                return
+            replayed = self._replayed_response(traffic_recorder.replay_chat(self), turn)
+            if replayed is not None:
+                yield replayed
+                return
+            started = time.perf_counter()
+            partial = None
+            for partial in provider_guard.stream_sync(self, max_tokens or self.default_max_tokens, turn):
+                yield partial
+            self._accept_response(self._stream_result(partial, started), use_cache)
+
+    async def astream_message(self, content: str, max_tokens: Optional[int] = None, use_cache: Optional[bool] = None) -> AsyncIterator[BaseModel]:
+        """Async counterpart of stream_message."""
+        with tracer.span(type(self).__name__, AGENT, activate=False, stream=True) as turn:
+            self.add_user_message(content)
+
+            cached = await self._acached_response(use_cache, turn)
+            if cached is not None:
+                yield cached
+                return
+            replayed = self._replayed_response(await traffic_recorder.areplay_chat(self), turn)
+            if replayed is not None:
+                yield replayed
+                return
+            started = time.perf_counter()
+            partial = None
+            async for partial in provider_guard.stream(self, max_tokens or self.default_max_tokens, turn):
+                yield partial
+            await self._aaccept_response(self._stream_result(partial, started), use_cache)
+
+    # One provider call for the pending request, the history is left untouched (ProviderGuard runs them)
+
+    def _complete(self, max_tokens: int) -> BaseModel:
+        with tracer.span(f"{self.provider}.structured", LLM, model=self.model), capture_usage() as usages, model_router.observe(self.route, self, usages):
+            response = self.client.chat.completions.create_with_completion(response_model=self.response_format, **self._structured_request(max_tokens))
+            self._record_usage(usages)
+        return response[0]
+
+    async def _acomplete(self, max_tokens: int) -> BaseModel:
+        with tracer.span(f"{self.provider}.structured", LLM, model=self.model), capture_usage() as usages, model_router.observe(self.route, self, usages):
+            response = await self.async_client.chat.completions.create_with_completion(response_model=self.response_format, **self._structured_request(max_tokens))
+            self._record_usage(usages)
+        return response[0]
+
+    def _stream(self, max_tokens: int, parent=NOOP_SPAN) -> Iterator[BaseModel]:
+        started = time.perf_counter()
+        with tracer.span(f"{self.provider}.structured", LLM, activate=False, parent=parent, model=self.model, stream=True) as call, model_router.observe(self.route):
+            for partial in self.client.chat.completions.create_partial(response_model=self.response_format, **self._structured_request(max_tokens)):
+                if "first_partial_seconds" not in call.attributes:
+                    call.set(first_partial_seconds=time.perf_counter() - started)
+                yield partial
+
+    async def _astream(self, max_tokens: int, parent=NOOP_SPAN) -> AsyncIterator[BaseModel]:
+        started = time.perf_counter()
+        with tracer.span(f"{self.provider}.structured", LLM, activate=False, parent=parent, model=self.model, stream=True) as call, model_router.observe(self.route):
+            async for partial in self.async_client.chat.completions.create_partial(response_model=self.response_format, **self._structured_request(max_tokens)):
+                if "first_partial_seconds" not in call.attributes:
+                    call.set(first_partial_seconds=time.perf_counter() - started)
+                yield partial
+
+    # Responses
+
+    def _stream_result(self, partial: Optional[BaseModel], started: float) -> BaseModel:
+        if partial is None:
+            raise ValueError("The model returned an empty stream")
+        # The last partial has every field, validate it against the full schema
+        model_response = self.response_format.model_validate(partial.model_dump())
+        # Partial streams don't report usage
+        traffic_recorder.record_chat(self, model_response, time.perf_counter() - started)
+        return model_response
+
+    def _should_cache(self, use_cache: Optional[bool]) -> bool:
+        if traffic_recorder.active:
+            # Recordings must hold every call, and replays can't depend on what the cache has
+            return False
+        return self.cacheable if use_cache is None else use_cache
+
+    def _cached_response(self, use_cache: Optional[bool], span=NOOP_SPAN) -> Optional[BaseModel]:
+        """Cached response for the pending request, added to the history as if it was generated."""
+        if not self._should_cache(use_cache):
+            return None
+        return self._serve_cached(response_cache.lookup(self), span)
+
+    async def _acached_response(self, use_cache: Optional[bool], span=NOOP_SPAN) -> Optional[BaseModel]:
+        if not self._should_cache(use_cache):
+            return None
+        return self._serve_cached(await response_cache.alookup(self), span)
+
+    def _serve_cached(self, model_response: Optional[BaseModel], span) -> Optional[BaseModel]:
+        span.set(cached=model_response is not None)
+        if model_response is not None:
+            self.last_usage = {}
+            self.last_response = model_response
+            self.add_assistant_message(self.get_model_assistant_message(model_response))
+        return model_response
+
+    def _replayed_response(self, entry, span=NOOP_SPAN) -> Optional[BaseModel]:
+        """Recorded response served in replay mode, added to the history as if it was generated."""
+        if entry is None:
+            return None
+        span.set(replayed=True)
+        model_response = self.response_format.model_validate(entry["response"])
+        self.last_usage = dict(entry["usage"])
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] = self.usage_totals.get(key, 0) + value
+        self.last_response = model_response
+        self.add_assistant_message(self.get_model_assistant_message(model_response))
+        return model_response
+
+    def _accept_response(self, model_response: BaseModel, use_cache: Optional[bool]) -> None:
+        # Stored before the assistant message is appended, the key is the request that produced it
+        if self._should_cache(use_cache):
+            response_cache.store(self, model_response)
+        self.last_response = model_response
+        self.add_assistant_message(self.get_model_assistant_message(model_response))
+
+    async def _aaccept_response(self, model_response: BaseModel, use_cache: Optional[bool]) -> None:
+        if self._should_cache(use_cache):
+            await response_cache.astore(self, model_response)
+        self.last_response = model_response
+        self.add_assistant_message(self.get_model_assistant_message(model_response))
+
+    # State
+
+    def get_state(self):
+        state = super().get_state()
+        state["last_response"] = self.last_response.model_dump(mode="json") if self.last_response is not None else None
+        return state
+
+    def load_state(self, state):
+        super().load_state(state)
+        last_response = state.get("last_response")
+        self.last_response = self.response_format.model_validate(last_response) if last_response is not None else None
+
+    def get_history_anchor(self):
+        """The slots collected so far are resent verbatim once the history is folded."""
+        return getattr(self.last_response, "updated_slots", None)
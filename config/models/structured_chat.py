@@ -0,0 +1,60 @@
+from abc import ABC, ABCMeta
+from typing import Dict, Tuple
+
+from .client_registry import client_registry
+from .routing import Route, model_router
+from .structured_anthropic import StructuredAnthropicChat
+from .structured_openai import StructuredOpenAIChat
+
+PROVIDER_CHATS = {"anthropic": StructuredAnthropicChat, "openai": StructuredOpenAIChat}
+
+
+class StructuredChat(ABC):
+    """
+    Structured agent whose provider comes from the routing policy instead of its base class.
+
+    Subclass it like StructuredAnthropicChat/StructuredOpenAIChat. Every instance is built on
+    the structured chat of the provider model_router picks for the agent, as a subclass with
+    the agent's own name (cache keys, recordings and spans keep using it).
+    """
+
+    _provider_classes: Dict[Tuple[type, str], type] = {}
+
+    def __new__(cls, *args, **kwargs):
+        return super().__new__(StructuredChat._concrete(cls, model_router.provider_for(cls.__name__)))
+
+    @staticmethod
+    def _concrete(cls: type, provider: str) -> type:
+        concrete = StructuredChat._provider_classes.get((cls, provider))
+        if concrete is None:
+            if provider not in PROVIDER_CHATS:
+                raise ValueError(f"Unknown provider {provider!r} routed for {cls.__name__}")
+            concrete = ABCMeta(cls.__name__, (cls, PROVIDER_CHATS[provider]),
+                               {"__module__": cls.__module__, "__qualname__": cls.__qualname__})
+            StructuredChat._provider_classes[(cls, provider)] = concrete
+        return concrete
+
+
+def provider_variant(chat, route: Route):
+    """
+    Copy of a structured agent that sends its pending request over another route.
+
+    The copy shares the agent's history and keeps its own usage, it's used for hedged and
+    failover calls. Only StructuredChat agents can move to another provider.
+    """
+    if route.provider == chat.provider:
+        variant_cls = type(chat)
+    elif isinstance(chat, StructuredChat):
+        # type(chat) is the concrete class, its first base the agent itself
+        variant_cls = StructuredChat._concrete(type(chat).__bases__[0], route.provider)
+    else:
+        raise ValueError(f"{type(chat).__name__} is bound to {chat.provider}, it can't run on {route.key}")
+    variant = object.__new__(variant_cls)
+    variant.__dict__.update(chat.__dict__)
+    variant.route = route
+    variant.model = route.model
+    variant.client = client_registry.get(route.provider, route.model, structured=True)
+    variant.async_client = client_registry.get(route.provider, route.model, use_async=True, structured=True)
+    variant.last_usage = {}
+    variant.usage_totals = {}
+    return variant
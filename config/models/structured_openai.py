@@ -1,42 +1,31 @@
-from abc import ABC, abstractmethod
-from typing import TypeVar
+from abc import ABC
+from typing import Any, Dict, TypeVar
 from pydantic import BaseModel
 from .openai import OpenAIChat
-import instructor
+from .client_registry import client_registry
+from .structured_base import StructuredChatMixin
 
 T = TypeVar('T', bound=BaseModel)
 
 
-class StructuredOpenAIChat(OpenAIChat, ABC):
+class StructuredOpenAIChat(StructuredChatMixin, OpenAIChat, ABC):
     """
     A chat class that extends OpenAIChat to provide structured responses using Pydantic models.
     """
 
+    default_max_tokens = 1000
+
     def __init__(self):
         super().__init__()
-        # Wrap OpenAI client for structured outputs
-        self.client = instructor.from_openai(client=self.client)
-        self.response_format = None
-
-    def send_message(self, content: str, max_tokens: int = 1000):
-        # Add user message
-        self.add_user_message(content)
-
-        # Use instructor to parse into the provided Pydantic model
-        response = self.client.chat.completions.create_with_completion(
-            model=self.model,
-            messages=self.messages,
-            response_model=self.response_format,
-        )
-        model_response = response[0]
-        # Store assistant-friendly message
-        self.add_assistant_message(self.get_model_assistant_message(model_response))
-        return model_response
-
-    @abstractmethod
-    def get_model_assistant_message(self, model_response: BaseModel) -> str:
-        pass
-
-
-
-
+        # Shared instructor-wrapped clients for structured outputs
+        self.client = client_registry.get("openai", self.model, structured=True)
+        self.async_client = client_registry.get("openai", self.model, use_async=True, structured=True)
+
+    def _structured_request(self, max_tokens: int) -> Dict[str, Any]:
+        # Sent without max_tokens, the model's own output limit applies
+        return {
+            "model": self.model,
+            "messages": self._request_messages(),
+            "extra_body": {"prompt_cache_key": self._prompt_cache_key()},
+            "timeout": self.route.deadline,
+        }
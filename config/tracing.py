@@ -0,0 +1,234 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Span kinds, from the outside in
+PHASE, AGENT, LLM, MCP = "phase", "agent", "llm", "mcp"
+
+
+class Span():
+    """One timed operation. Attributes are free-form: model, token counts, attempts, wait_seconds..."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "end", "status", "_perf_start", "duration")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.status = "ok"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, value: float) -> None:
+        """Accumulate a numeric attribute, e.g. wait time over several requests."""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.duration = time.perf_counter() - self._perf_start
+        self.end = self.start + self.duration
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "name": self.name, "kind": self.kind, "start": self.start, "duration": self.duration,
+                "status": self.status, "attributes": self.attributes}
+
+
+class _NoopSpan():
+    # Handed out while tracing is off, so call sites don't need to check
+    attributes = MappingProxyType({})
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer():
+    """
+    Nested spans for wizard phases, agent turns, LLM calls and MCP lookups.
+
+    The active span lives in a context variable, so spans opened in an asyncio task nest
+    under the span that was active when the task was created. Finished spans are kept in
+    memory (the last max_spans) for summary()/report(), appended to JELOU_TRACE_PATH as
+    JSONL when set, and export_otlp() writes them as OTLP/JSON for any OpenTelemetry
+    backend (done by close() when JELOU_TRACE_OTLP_PATH is set). JELOU_TRACE=1 to enable.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, path: Optional[str] = None, otlp_path: Optional[str] = None,
+                 max_spans: int = 50000, service_name: str = "jelou-wizard"):
+        if enabled is None:
+            enabled = os.getenv("JELOU_TRACE", "0").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.path = path or os.getenv("JELOU_TRACE_PATH")
+        self.otlp_path = otlp_path or os.getenv("JELOU_TRACE_OTLP_PATH")
+        self.service_name = service_name
+        self._spans: deque = deque(maxlen=max_spans)
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The active span, or a no-op one."""
+        return self._current.get() or NOOP_SPAN
+
+    @contextmanager
+    def span(self, name: str, kind: str, activate: bool = True, parent: Optional[Span] = None, **attributes: Any) -> Iterator[Any]:
+        """Time the block. activate=False keeps it out of the context (generators, which resume in other contexts)."""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = Span(name, kind, parent or self._current.get(), attributes)
+        token = self._current.set(span) if activate else None
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(e)
+            raise
+        else:
+            span.finish()
+        finally:
+            if token is not None:
+                self._current.reset(token)
+            self._finished(span)
+
+    def _finished(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                except OSError as e:
+                    logger.warning(f"Couldn't write span to {self.path}: {e}")
+
+    def clear(self) -> None:
+        """Drop the finished spans, e.g. between benchmark scenarios."""
+        with self._lock:
+            self._spans.clear()
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    # Export
+
+    def export_jsonl(self, path: str) -> int:
+        spans = self.spans()
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+        return len(spans)
+
+    def export_otlp(self, path: str) -> int:
+        """Write the spans as an OTLP/JSON ExportTraceServiceRequest."""
+        spans = self.spans()
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [_otlp_span(span) for span in spans]}],
+        }]}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        return len(spans)
+
+    # Reports
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles per span kind and per kind/name."""
+        groups: Dict[str, List[float]] = {}
+        for span in self.spans():
+            groups.setdefault(span.kind, []).append(span.duration)
+            groups.setdefault(f"{span.kind}:{span.name}", []).append(span.duration)
+        return {key: _percentiles(durations) for key, durations in sorted(groups.items())}
+
+    def report(self) -> str:
+        lines = [f"{'span':<48} {'count':>6} {'p50 s':>9} {'p95 s':>9} {'max s':>9} {'total s':>9}"]
+        for key, stats in self.summary().items():
+            lines.append(f"{key[:48]:<48} {stats['count']:>6} {stats['p50']:>9.3f} {stats['p95']:>9.3f} "
+                         f"{stats['max']:>9.3f} {stats['total']:>9.3f}")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        """End of run: log the latency report and write the OTLP export if configured."""
+        if not self.enabled or not self._spans:
+            return
+        logger.info("Latency by span:\n" + self.report())
+        if self.otlp_path:
+            count = self.export_otlp(self.otlp_path)
+            logger.info(f"Exported {count} spans to {self.otlp_path}")
+
+
+def traced(name: str, kind: str):
+    """Decorator timing every call of a coroutine function as a span of the module tracer."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name, kind):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentiles(durations: List[float]) -> Dict[str, Any]:
+    ordered = sorted(durations)
+
+    def percentile(p: float) -> float:
+        # Nearest rank
+        return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+    return {"count": len(ordered), "p50": percentile(0.5), "p95": percentile(0.95), "max": ordered[-1], "total": sum(ordered)}
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": value if isinstance(value, str) else json.dumps(value, default=str)}}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        # SPAN_KIND_CLIENT for calls out of the process, SPAN_KIND_INTERNAL otherwise
+        "kind": 3 if span.kind in (LLM, MCP) else 1,
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int(span.end * 1e9)),
+        "attributes": [_otlp_attribute("jelou.span_kind", span.kind)]
+                      + [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+        "status": {"code": 2 if span.status == "error" else 1},
+    }
+    if span.parent_id is not None:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+tracer = Tracer()
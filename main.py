@@ -1,70 +1,80 @@
 from __future__ import annotations
 import asyncio
+import os
+import sys
+import time
 import httpx
 from wizard import JelouWizard
+from typing import Optional
+from wizard_io import ConsoleIO, WizardIO
+from ai.agents.jelouai.jelou_mcp import JelouMCP
+from config.models.client_registry import client_registry
+from config.models.recorder import traffic_recorder
+from config.models.resilience import provider_guard
+from config.models.response_cache import response_cache
+from config.models.routing import model_router
+from config.tracing import LLM, tracer
 import logging
 from opencode_ai import Opencode
+from opencode_ai.types import AssistantMessage, Session
 logging.getLogger("mcp_use").setLevel(logging.CRITICAL)
 
-async def main() -> None:
+# Workflow generation can take minutes, but a hung opencode server shouldn't hang the wizard
+OPENCODE_TIMEOUT = httpx.Timeout(float(os.getenv("OPENCODE_TIMEOUT", "300")), connect=10.0)
+
+async def main(io: Optional[WizardIO] = None) -> None:
     # Initialize Jelou Wizard to get business context
-    jelou_wizard = JelouWizard()
-    print("Loading Packages...")
+    io = io or ConsoleIO()
+    # python main.py --resume <session id> continues an interrupted wizard
+    session_id = sys.argv[sys.argv.index("--resume") + 1] if "--resume" in sys.argv[:-1] else os.getenv("JELOU_SESSION_ID")
+    jelou_wizard = JelouWizard(io=io, session_id=session_id)
+    if jelou_wizard.checkpointer is not None:
+        io.write(f"Wizard session: {jelou_wizard.session_id} (resume with: python main.py --resume {jelou_wizard.session_id})")
+    io.write("Loading Packages...")
     await jelou_wizard.init_packages()
-    print("Packages loaded ✓")
+    io.write("Packages loaded ✓")
     
     business_context = await jelou_wizard.start_wizard()
-    print(f"Business context ready ✓")
+    io.write(f"Business context ready ✓")
     
     # Initialize opencode client and session
-    client = Opencode(base_url="http://127.0.0.1:5000", timeout=httpx.Timeout(60000.0))
-    session = client.session.create(extra_body={"title": "Workflow Builder Session"})
+    client = Opencode(base_url=os.getenv("OPENCODE_BASE_URL", "http://127.0.0.1:5000"), timeout=OPENCODE_TIMEOUT)
+    # The opencode SDK is sync, its calls run in worker threads so the event loop keeps running
+    session = await opencode_session(client)
     
-    print(f"Created session: {session.id}")
-    print("=" * 60)
+    io.write(f"Created session: {session.id}")
+    io.write("=" * 60)
     
     # Send initial workflow creation request
-    print("🚀 Creating initial workflow from business context...")
+    io.write("🚀 Creating initial workflow from business context...")
     initial_prompt = f"""Create a workflow in DSL format based on this business information:
 
 {business_context}
 
 Please create a complete workflow that follows the business flow and requirements specified above. The workflow should be in proper DSL format."""
 
-    workflow_response = client.session.chat(
-        id=session.id,
-        model_id="claude-sonnet-4-5-20250929",
-        provider_id="anthropic",
-        parts=[{"type": "text", "text": initial_prompt}],
-        timeout=httpx.Timeout(60000.0)
-    )
+    workflow_response = await opencode_chat(client, session.id, initial_prompt)
     
     # Display the created workflow
-    print("\n📋 Initial Workflow Created:")
+    io.write("\n📋 Initial Workflow Created:")
     
-    show_workflow_response = client.session.chat(
-        id=session.id,
-        model_id="claude-sonnet-4-5-20250929",
-        provider_id="anthropic",
-        parts=[{"type": "text", "text": "Show me the workflow now, and when I modified the workflow I want you to show me the current workflow"}],
-        timeout=httpx.Timeout(60000.0)
-    )
-    show_opencode_response(show_workflow_response)
+    show_workflow_response = await opencode_chat(client, session.id, "Show me the workflow now, and when I modified the workflow I want you to show me the current workflow")
+    show_opencode_response(io, show_workflow_response)
 
     
-    print("\n" + "=" * 60)
-    print("💬 Interactive Workflow Editor")
-    print("You can now modify the workflow by describing changes.")
-    print("Commands: 'show' (display current workflow), 'quit' (exit)")
-    print("-" * 60)
+    io.write("\n" + "=" * 60)
+    io.write("💬 Interactive Workflow Editor")
+    io.write("You can now modify the workflow by describing changes.")
+    io.write("Commands: 'show' (display current workflow), 'quit' (exit)")
+    io.write("-" * 60)
     
     # Interactive modification loop
     while True:
         try:
-            user_input = input("\n🔧 Your modification request: ").strip()
+            user_input = (await io.read("\n🔧 Your modification request: ")).strip()
             
             if user_input.lower() in ['quit', 'exit', 'salir']:
-                print("👋 Workflow editing session ended!")
+                io.write("👋 Workflow editing session ended!")
                 break
             
                 
@@ -72,31 +82,55 @@ Please create a complete workflow that follows the business flow and requirement
                 continue
             
             # Send modification request
-            print("⚙️  Processing modification...")
+            io.write("⚙️  Processing modification...")
             
-            modification_response = client.session.chat(
-                id=session.id,
-                model_id="claude-sonnet-4-5-20250929",
-                provider_id="anthropic",
-                parts=[{"type": "text", "text": user_input}],
-                timeout=httpx.Timeout(60000.0)
-            )
-            show_opencode_response(modification_response)
+            modification_response = await opencode_chat(client, session.id, user_input)
+            show_opencode_response(io, modification_response)
             
-                
-        except KeyboardInterrupt:
-            print("\n👋 Workflow editing session ended!")
-            break
+        # Ctrl-C cancels the whole run, it's handled where asyncio.run is called
         except Exception as e:
-            print(f"❌ Error: {e}")
-            print("Please try again...")
+            io.write(f"❌ Error: {e}")
+            io.write("Please try again...")
     
-    print(f"\n📝 Final workflow session completed for session: {session.id}")
+    io.write(f"\n📝 Final workflow session completed for session: {session.id}")
+
+async def opencode_session(client):
+    replayed = await traffic_recorder.areplay("opencode.session", "Workflow Builder Session")
+    if replayed is not None:
+        return Session.construct(**replayed["response"])
+    started = time.perf_counter()
+    session = await asyncio.to_thread(client.session.create, extra_body={"title": "Workflow Builder Session"})
+    traffic_recorder.record("opencode.session", "Workflow Builder Session", session.model_dump(mode="json"), time.perf_counter() - started)
+    return session
 
-def show_opencode_response(response):
+async def opencode_chat(client, session_id, text):
+    # Recorded/replayed with the rest of the LLM traffic, the session id is left out of the fingerprint
+    request = {"model_id": "claude-sonnet-4-5-20250929", "provider_id": "anthropic", "text": text}
+    with tracer.span("opencode.chat", LLM, model=request["model_id"]) as span:
+        replayed = await traffic_recorder.areplay("opencode.chat", request)
+        if replayed is not None:
+            span.set(replayed=True)
+            return AssistantMessage.construct(**replayed["response"])
+        started = time.perf_counter()
+        response = await asyncio.to_thread(
+            client.session.chat,
+            id=session_id,
+            model_id=request["model_id"],
+            provider_id=request["provider_id"],
+            parts=[{"type": "text", "text": text}],
+            timeout=OPENCODE_TIMEOUT
+        )
+        tokens = getattr(response, "tokens", None)
+        if tokens is not None:
+            span.set(input_tokens=tokens.input, output_tokens=tokens.output,
+                     cache_read_input_tokens=tokens.cache.read, cache_creation_input_tokens=tokens.cache.write)
+        traffic_recorder.record("opencode.chat", request, response.model_dump(mode="json"), time.perf_counter() - started)
+        return response
+
+def show_opencode_response(io, response):
             # Display the response/updated workflow
-            print("\n✅ Response:")
-            print("-" * 40)
+            io.write("\n✅ Response:")
+            io.write("-" * 40)
             if hasattr(response, 'parts') and response.parts:
                 response_text = ""
                 for part in response.parts:
@@ -105,13 +139,30 @@ def show_opencode_response(response):
                     elif isinstance(part, dict) and 'text' in part:
                         response_text += part['text']
                 
-                print(response_text)
+                io.write(response_text)
                 
                 # Update current workflow if it seems like a new workflow was provided
                 if "workflow" in response_text.lower() and ("dsl" in response_text.lower() or "```" in response_text):
                     current_workflow = response_text
-                    print("\n🔄 Workflow updated!")
+                    io.write("\n🔄 Workflow updated!")
             else:
-                print("No response received from server")
+                io.write("No response received from server")
+async def run() -> None:
+    try:
+        await main()
+    finally:
+        # Pooled MCP sessions live for the whole process, close them on the way out
+        await JelouMCP.close_pool()
+        await client_registry.aclose()
+        logging.getLogger(__name__).info(f"LLM response cache: {response_cache.metrics()}")
+        logging.getLogger(__name__).info(f"Traffic recorder: {traffic_recorder.metrics()}")
+        logging.getLogger(__name__).info(f"Model routes: {model_router.metrics()}")
+        logging.getLogger(__name__).info(f"Provider guard: {provider_guard.metrics()}")
+        tracer.close()
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        # Ctrl-C reaches the running task as CancelledError, asyncio.run re-raises it here once run() cleaned up
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n👋 Workflow editing session ended!")
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Server mode: many wizard sessions in one process behind a small ASGI app.
+
+    POST   /sessions                      start a session -> {"session_id": ...}
+                                          {"session_id": ...} resumes a checkpointed one
+    POST   /sessions/{id}/messages        {"message": "..."}, 429 while too many are unread
+    GET    /sessions/{id}/events?wait=25  long poll for output/prompt/result/error events
+    DELETE /sessions/{id}                 close a session
+    WS     /sessions/{id}/ws              text frames in, JSON events out
+    GET    /health                        session, cache, routing and provider guard metrics
+
+Run with: python server.py (JELOU_HOST, JELOU_PORT) or uvicorn server:app
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+from ai.agents.jelouai.jelou_mcp import JelouMCP
+from config.models.client_registry import client_registry
+from config.models.resilience import provider_guard
+from config.models.response_cache import response_cache
+from config.models.routing import model_router
+from config.tracing import tracer
+from wizard import JelouWizard
+from wizard_io import QueueIO
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class WizardSession():
+    def __init__(self, session_id: str, max_pending_messages: int):
+        self.id = session_id
+        self.io = QueueIO(max_pending_messages=max_pending_messages)
+        # Built in run(), off the event loop
+        self.wizard: Optional[JelouWizard] = None
+        self.task: Optional[asyncio.Task] = None
+        # running, finished, failed
+        self.status = "running"
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    async def run(self) -> None:
+        try:
+            # The constructor opens the SQLite package cache and checkpointer, other sessions keep running meanwhile
+            self.wizard = await asyncio.to_thread(JelouWizard, io=self.io, session_id=self.id)
+            await self.wizard.init_packages()
+            result = await self.wizard.start_wizard()
+            self.status = "finished"
+            self.io.emit({"type": "result", "text": result})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Wizard session {self.id} failed")
+            self.status = "failed"
+            self.io.emit({"type": "error", "text": str(e)})
+
+
+class SessionStore():
+    """
+    Wizard sessions of this process.
+
+    Sessions without client activity for idle_timeout seconds are evicted by a periodic
+    sweep, and at most max_sessions run at once.
+    """
+
+    def __init__(self, max_sessions: int = 500, idle_timeout: float = 15 * 60, sweep_interval: float = 30.0,
+                 max_pending_messages: int = 4):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.max_pending_messages = max_pending_messages
+        self._sessions: Dict[str, WizardSession] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"created": 0, "evicted": 0, "rejected": 0, "closed": 0}
+
+    def create(self, session_id: Optional[str] = None) -> Optional[WizardSession]:
+        """Start a session (resumed from its checkpoints if session_id is given), None when the store is full."""
+        if session_id is not None and session_id in self._sessions:
+            return self.get(session_id)
+        if len(self._sessions) >= self.max_sessions:
+            self.stats["rejected"] += 1
+            return None
+        session = WizardSession(session_id or uuid.uuid4().hex, self.max_pending_messages)
+        session.task = asyncio.create_task(session.run())
+        self._sessions[session.id] = session
+        self.stats["created"] += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[WizardSession]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    async def close(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.task.cancel()
+        await asyncio.gather(session.task, return_exceptions=True)
+        self.stats["closed"] += 1
+        return True
+
+    async def sweep(self) -> int:
+        """Evict idle sessions, returns how many were evicted."""
+        now = time.monotonic()
+        idle = [session_id for session_id, session in self._sessions.items()
+                if now - session.last_active > self.idle_timeout]
+        for session_id in idle:
+            await self.close(session_id)
+        self.stats["evicted"] += len(idle)
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle wizard sessions")
+        return len(idle)
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Idle session sweep failed")
+
+    def start(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for session_id in list(self._sessions):
+            await self.close(session_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        sessions = list(self._sessions.values())
+        return {
+            **self.stats,
+            "sessions": len(sessions),
+            "waiting_for_input": sum(1 for session in sessions if session.io.waiting_for_input),
+            "running": sum(1 for session in sessions if session.status == "running"),
+        }
+
+
+class WizardServer():
+    """Raw ASGI app routing the HTTP and WebSocket endpoints to the session store."""
+
+    def __init__(self, store: Optional[SessionStore] = None, max_body_bytes: int = 64 * 1024,
+                 max_poll_seconds: float = 30.0):
+        self.store = store or SessionStore(
+            max_sessions=int(os.getenv("JELOU_MAX_SESSIONS", "500")),
+            idle_timeout=float(os.getenv("JELOU_SESSION_IDLE_TIMEOUT", str(15 * 60))),
+        )
+        self.max_body_bytes = max_body_bytes
+        self.max_poll_seconds = max_poll_seconds
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.store.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.store.stop()
+                await JelouMCP.close_pool()
+                await client_registry.aclose()
+                tracer.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # HTTP
+
+    async def _http(self, scope, receive, send) -> None:
+        method, parts = scope["method"], [part for part in scope["path"].split("/") if part]
+        query = parse_qs(scope.get("query_string", b"").decode())
+        try:
+            if parts == ["health"] and method == "GET":
+                status, body = 200, {"sessions": self.store.metrics(), "mcp_pool": JelouMCP.pool_metrics(),
+                                     "clients": client_registry.stats(), "response_cache": response_cache.metrics(),
+                                     "model_routes": model_router.metrics(), "provider_guard": provider_guard.metrics(),
+                                     "latency": tracer.summary() if tracer.enabled else {}}
+            elif parts == ["sessions"] and method == "POST":
+                session_id = (await self._read_json(receive)).get("session_id")
+                if session_id is not None and not (isinstance(session_id, str) and session_id.isalnum()):
+                    raise ValueError("'session_id' must be alphanumeric")
+                session = self.store.create(session_id)
+                status, body = (201, {"session_id": session.id}) if session else (503, {"error": "Too many sessions"})
+            elif len(parts) >= 2 and parts[0] == "sessions":
+                status, body = await self._session_request(method, parts[1], parts[2:], query, receive)
+            else:
+                status, body = 404, {"error": "Not found"}
+        except ValueError as e:
+            status, body = 400, {"error": str(e)}
+        await self._respond(send, status, body)
+
+    async def _session_request(self, method, session_id, rest, query, receive):
+        session = self.store.get(session_id)
+        if session is None:
+            return 404, {"error": "Unknown session"}
+        if rest == [] and method == "DELETE":
+            await self.store.close(session_id)
+            return 204, None
+        if rest == ["messages"] and method == "POST":
+            message = (await self._read_json(receive)).get("message")
+            if not isinstance(message, str):
+                raise ValueError("'message' must be a string")
+            if session.status != "running":
+                return 409, {"error": f"Session {session.status}"}
+            if not session.io.feed(message):
+                return 429, {"error": "Too many unread messages"}
+            return 202, {"pending_messages": session.io.pending_messages()}
+        if rest == ["events"] and method == "GET":
+            wait = min(float(query.get("wait", ["25"])[0]), self.max_poll_seconds)
+            events = await session.io.next_events(wait)
+            session.touch()
+            return 200, {"status": session.status, "events": events}
+        return 404, {"error": "Not found"}
+
+    async def _read_body(self, receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > self.max_body_bytes:
+                raise ValueError("Request body too large")
+            if not message.get("more_body"):
+                return body
+
+    async def _read_json(self, receive) -> Dict[str, Any]:
+        # Malformed JSON is a ValueError already, so is anything but an object
+        payload = json.loads(await self._read_body(receive) or b"{}")
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    async def _respond(self, send, status: int, body: Optional[Dict[str, Any]]) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
+
+    # WebSocket
+
+    async def _websocket(self, scope, receive, send) -> None:
+        parts = [part for part in scope["path"].split("/") if part]
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        session = self.store.get(parts[1]) if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "ws" else None
+        if session is None:
+            await send({"type": "websocket.close", "code": 4404})
+            return
+        await send({"type": "websocket.accept"})
+        pusher = asyncio.create_task(self._push_events(session, send))
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                session.touch()
+                text = message.get("text")
+                if text is None:
+                    continue
+                if not session.io.feed(text):
+                    await send({"type": "websocket.send", "text": json.dumps({"type": "busy", "text": "Too many unread messages"})})
+        finally:
+            pusher.cancel()
+            await asyncio.gather(pusher, return_exceptions=True)
+
+    async def _push_events(self, session: WizardSession, send) -> None:
+        while True:
+            for event in await session.io.next_events(self.max_poll_seconds):
+                await send({"type": "websocket.send", "text": json.dumps(event, ensure_ascii=False)})
+            session.touch()
+            if session.status != "running" and session.task.done():
+                for event in await session.io.next_events():
+                    await send({"type": "websocket.send", "text": json.dumps(event, ensure_ascii=False)})
+                await send({"type": "websocket.close", "code": 1000})
+                return
+
+
+app = WizardServer()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    logging.getLogger("mcp_use").setLevel(logging.CRITICAL)
+    uvicorn.run(app, host=os.getenv("JELOU_HOST", "127.0.0.1"), port=int(os.getenv("JELOU_PORT", "8000")))
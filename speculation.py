@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeScheduler():
+    """
+    Runs work whose inputs are already known in the background, before it's needed.
+
+    Every task is registered under a name with a fingerprint of its inputs. take() only
+    hands the result over when the caller's fingerprint matches, otherwise the task is
+    cancelled and the caller does the work itself.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._tasks: Dict[str, Tuple[str, asyncio.Task]] = {}
+        # used: result handed over, discarded: inputs changed or the task failed
+        self.stats = {"started": 0, "used": 0, "discarded": 0}
+
+    @staticmethod
+    def fingerprint(*inputs: Any) -> str:
+        payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def start(self, name: str, fingerprint: str, factory: Callable[[], Awaitable[Any]]) -> None:
+        """Start factory() in the background unless the same work is already running."""
+        if not self.enabled:
+            return
+        current = self._tasks.get(name)
+        if current is not None:
+            if current[0] == fingerprint:
+                return
+            self.discard(name)
+        self._tasks[name] = (fingerprint, asyncio.create_task(factory()))
+        self.stats["started"] += 1
+
+    async def take(self, name: str, fingerprint: str) -> Optional[Any]:
+        """Result of the speculative task for these inputs, or None if there isn't a usable one."""
+        current = self._tasks.pop(name, None)
+        if current is None:
+            return None
+        expected, task = current
+        if expected != fingerprint:
+            task.cancel()
+            self.stats["discarded"] += 1
+            logger.info(f"Discarded speculative {name}: its inputs changed")
+            return None
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["discarded"] += 1
+            logger.warning(f"Speculative {name} failed, running it again: {e}")
+            return None
+        self.stats["used"] += 1
+        return result
+
+    def discard(self, name: str) -> None:
+        current = self._tasks.pop(name, None)
+        if current is not None:
+            current[1].cancel()
+            self.stats["discarded"] += 1
+
+    async def cancel_all(self) -> None:
+        """Cancel the speculative work nobody took."""
+        tasks = [task for _, task in self._tasks.values()]
+        for name in list(self._tasks):
+            self.discard(name)
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,12 +1,14 @@
 from __future__ import annotations
 import asyncio
+import os
 import httpx
 import logging
 from opencode_ai import Opencode
 logging.getLogger("mcp_use").setLevel(logging.CRITICAL)
+OPENCODE_TIMEOUT = httpx.Timeout(float(os.getenv("OPENCODE_TIMEOUT", "300")), connect=10.0)
 def test() -> None:
 
-    client = Opencode(base_url="http://127.0.0.1:5000", timeout=httpx.Timeout(60000.0))
+    client = Opencode(base_url=os.getenv("OPENCODE_BASE_URL", "http://127.0.0.1:5000"), timeout=OPENCODE_TIMEOUT)
     session = client.session.create(extra_body={"title": "Workflow Builder Session"})
     
     
@@ -15,7 +17,7 @@ def test() -> None:
         model_id="claude-sonnet-4-5-20250929",
         provider_id="anthropic",
         parts=[{"type": "text", "text": "Show me zabyca .wf file content(not text or summaries, I need code),also show me the .wf after every modification."}],
-        timeout=httpx.Timeout(60000.0)
+        timeout=OPENCODE_TIMEOUT
     )
     show_opencode_response(show_workflow_response)
 
@@ -47,7 +49,7 @@ def test() -> None:
                 model_id="claude-sonnet-4-5-20250929",
                 provider_id="anthropic",
                 parts=[{"type": "text", "text": user_input}],
-                timeout=httpx.Timeout(60000.0)
+                timeout=OPENCODE_TIMEOUT
             )
             show_opencode_response(modification_response)
             
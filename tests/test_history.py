@@ -0,0 +1,58 @@
+import json
+
+from config.models.anthropic import AnthropicChat
+from config.models.history import HistoryManager
+
+
+class SlotsChat(AnthropicChat):
+    """AnthropicChat whose anchor changes every turn, like the slot filling agents."""
+
+    def __init__(self):
+        super().__init__()
+        self.history = HistoryManager(token_budget=400, keep_last_turns=2)
+        self.slots = {}
+
+    def get_history_anchor(self):
+        return self.slots
+
+
+def marked_prefixes(chat):
+    """The prompt prefix up to every message breakpoint, without the markers (they aren't part of the cache key)."""
+    system, messages = chat._cache_marked_messages()
+    blocks = [("system", block) for block in system]
+    for message in messages:
+        content = message["content"]
+        blocks += [(message["role"], block) for block in (content if isinstance(content, list) else [{"type": "text", "text": content}])]
+    prefixes = []
+    for i, (_, block) in enumerate(blocks):
+        if "cache_control" in block and i >= len(system):
+            prefixes.append(json.dumps([(role, {k: v for k, v in b.items() if k != "cache_control"}) for role, b in blocks[:i + 1]]))
+    return prefixes
+
+
+def test_marked_prefix_is_stable_between_folds(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    chat = SlotsChat()
+    chat.add_system_message("Eres un asistente que recoge los datos del negocio.")
+    turn = 0
+    while not chat.history.folded:
+        turn += 1
+        chat.slots = {"turn": turn}
+        chat.add_user_message(f"Respuesta {turn}: " + "datos del negocio " * 20)
+        chat.add_assistant_message(f"Pregunta {turn}: " + "siguiente dato " * 20)
+
+    # Next turn after the fold: it writes the prefix up to its newest user turn
+    chat.slots = {"turn": turn + 1}
+    chat.add_user_message("Respuesta corta")
+    folded, written = chat.history.folded, marked_prefixes(chat)[-1]
+    chat.add_assistant_message("Pregunta corta")
+
+    # The following turn reads it back through its previous user turn, whatever the anchor says now
+    chat.slots = {"turn": turn + 2}
+    chat.add_user_message("Otra respuesta corta")
+    assert chat.history.folded == folded
+    assert marked_prefixes(chat)[0] == written
+    # The anchor is only sent in the unmarked block after the last breakpoint
+    _, messages = chat._cache_marked_messages()
+    context = messages[-1]["content"][-1]
+    assert "cache_control" not in context and '"turn": %d' % (turn + 2) in context["text"]
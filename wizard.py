@@ -1,140 +1,382 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, TypedDict
+import asyncio
 import datetime
-import os
 import json
-from types import SimpleNamespace
+import logging
+import os
+import random
+import uuid
+
+from langgraph.graph import END, StateGraph
 
 from ai.agents.Business.business_agent import BusinessAgent
+from ai.agents.Business.business_classifier import shared_classifier
 from ai.agents.Business.business_type import BusinessType
 from ai.agents.Business.flow.business_flow_agent import BusinessFlowAgent
+from ai.agents.Business.flow.ebusiness_workflow_structure import EBusinessWorkflowStructure
 from ai.agents.Business.flow.ecommerce_flow_agent import EcommerceFlowAgent
 from ai.agents.Business.flow.simple_informative_flow_agent import SimpleInformativeFlowAgent
+from ai.agents.Business.flow.workflow_steps import WorkflowSteps
 from ai.agents.QA.QAAgent import QAAgent
+from ai.agents.QA.slot_store import SlotStore
 from ai.agents.jelou_package.package_filler_agent import PackageFillerAgent
 from ai.agents.jelou_package.package_inputs import PackageInputsStructure
+from ai.agents.jelou_package.packages_prefill_agent import PackagesPrefillAgent
 from ai.agents.jelouai.jelou_mcp import JelouMCP
+from ai.agents.jelouai.package_cache import PackageCacheStore
+from config.tracing import PHASE, traced
+from speculation import SpeculativeScheduler
+from wizard_checkpoint import SqliteCheckpointer
+from wizard_io import ConsoleIO
+
+logger = logging.getLogger(__name__)
+
+
+class WizardState(TypedDict, total=False):
+    """What start_wizard's phases hand to each other, checkpointed after every phase."""
+    session_id: str
+    business_info_dict: Dict[str, str]
+    workflow_info_dict: Dict[str, str]
+    business_type: str
+    ebusiness_personality: str
+    result: str
+
+
 
+# Packages of the non e-commerce branch
+NO_PACKAGES = "No packages"
+
+#Quite pregunta de ubicación puede ir en knowledge/mcp
+BASIC_QUESTIONS = [{"question":"Me podrias describir tu negocio?","required":True},
+    {"question":"Que vendes? Como lo vendes?"},
+    {"question":"Qué es lo que hace tu negocio diferente?"},
+    {"question":"¿Con que frases saludas a tus clientes? ¿Cómo quieres que se presente el Agente IA a tus clientes?"},
+    {"question":"¿Con que frases te despides a tus clientes?"}, 
+    {"question":"¿Cual quieres que sea el tono de conversación?"},
+    ]
+
+WORKFLOW_QUESTIONS = [{"question":"¿Cual sera el flujo de trabajo propuesto?"},
+    {"question:":"¿Tienes algun mcp con información del negocio(Brinda el link)?"}    ]
+
+PERSONALITY_QUESTIONS = [{"question":"Quieres que tu ia tenga una identidad en particular?","required":True},
+    {"question":"Tienes algun cuerpo de respuesta que quieras usar?","required":True}]
+
+TONE_QUESTION = "¿Cual quieres que sea el tono de conversación?"
 
 
 class JelouWizard():
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 4, lookup_timeout: float = 60.0, stream: bool = None, io=None,
+                 session_id: Optional[str] = None, checkpointer=None, shared_packages: Optional["JelouWizard"] = None):
+        # Terminal by default, server sessions pass a QueueIO
+        self.io = io if io is not None else ConsoleIO()
+        # Phases and agent turns are checkpointed per session, start_wizard resumes an existing session_id.
+        # Only sessions started with a session_id (resumes, server sessions) are checkpointed by default,
+        # JELOU_CHECKPOINTS=1 checkpoints every session and JELOU_CHECKPOINTS=0 (or checkpointer=False) none
+        checkpoints = os.getenv("JELOU_CHECKPOINTS", "").lower()
+        if checkpointer is None and (checkpoints in ("1", "true", "yes") or (session_id and checkpoints not in ("0", "false", "no"))):
+            checkpointer = SqliteCheckpointer(os.path.join(os.getcwd(), ".wizard_sessions.db"))
+        self.session_id = session_id or uuid.uuid4().hex
+        self.checkpointer = checkpointer or None
+        # Print bot responses while they are generated (JELOU_STREAM=0 to disable)
+        if stream is None:
+            stream = os.getenv("JELOU_STREAM", "1").lower() not in ("0", "false", "no")
+        self.stream = stream
+        # Slots are merged locally from per-turn deltas (JELOU_INCREMENTAL_SLOTS=0 to disable)
+        self.incremental_slots = os.getenv("JELOU_INCREMENTAL_SLOTS", "1").lower() not in ("0", "false", "no")
+        # Workflow edited with step-level patches (JELOU_PATCH_WORKFLOW=0 to disable)
+        self.patch_workflow = os.getenv("JELOU_PATCH_WORKFLOW", "1").lower() not in ("0", "false", "no")
+        # Package inputs prefilled from the interview, one conversation for all packages (JELOU_BATCH_PREFILL=0 to disable)
+        self.batch_prefill = os.getenv("JELOU_BATCH_PREFILL", "1").lower() not in ("0", "false", "no")
+        # Confident business types are answered locally, the others are guessed to speculate on (JELOU_LOCAL_CLASSIFIER=0 to always ask the LLM)
+        self.business_classifier = None
+        if os.getenv("JELOU_LOCAL_CLASSIFIER", "1").lower() not in ("0", "false", "no"):
+            # One per process, shared by every session (server and batch mode run many)
+            self.business_classifier = shared_classifier(os.path.join(os.getcwd(), ".business_classifier.json"))
+        # LLM steps whose inputs are known run while the user is still answering (JELOU_SPECULATE=0 to disable)
+        self._speculation = SpeculativeScheduler(enabled=os.getenv("JELOU_SPECULATE", "1").lower() not in ("0", "false", "no"))
+        # Limits for the concurrent package prefetch in init_packages
+        self.max_concurrency = max_concurrency
+        self.lookup_timeout = lookup_timeout
+        self.package_ttl = datetime.timedelta(days=1)
+        # Background refresh of stale packages
+        self.refresh_jitter = 5.0
+        self.refresh_retries = 3
+        self.refresh_backoff = 1.0
+        self._refresh_tasks = {}
+        self._refresh_semaphore = None
+        # hit: fresh entry, stale: served while refreshing, miss: fetched before continuing
+        self.cache_stats = {"hit": 0, "stale": 0, "miss": 0}
         self._package_cache = {}
-        self._cache_path = os.path.join(os.getcwd(), ".package_cache.json")
-        self._load_cache_from_disk()
+        if shared_packages is not None:
+            # Sessions of one process (batch records) share a wizard's loaded packages instead of reopening the store
+            self._cache_store = shared_packages._cache_store
+            self._package_cache = shared_packages._package_cache
+        else:
+            self._cache_store = PackageCacheStore(os.path.join(os.getcwd(), ".package_cache.db"),
+                                                  default_ttl=self.package_ttl.total_seconds(),
+                                                  legacy_json_path=os.path.join(os.getcwd(), ".package_cache.json"))
+            self._load_cache_from_disk()
 
     def _load_cache_from_disk(self):
-        if os.path.exists(self._cache_path):
-            try:
-                with open(self._cache_path, "r", encoding="utf-8") as f:
-                    raw = json.load(f)
-                self._package_cache = {}
-                for query, rec in raw.items():
-                    ts = datetime.datetime.fromisoformat(rec.get("ts"))
-                    data_dict = rec.get("data", {})
-                    pkg = SimpleNamespace(**data_dict)
-                    self._package_cache[query] = (ts, pkg)
-            except Exception:
-                self._package_cache = {}
-
-    def _save_cache_to_disk(self):
-        serializable = {}
-        for query, (ts, pkg) in self._package_cache.items():
-            if isinstance(pkg, SimpleNamespace):
-                data_dict = dict(pkg.__dict__)
-            elif isinstance(pkg, dict):
-                data_dict = dict(pkg)
-            else:
-                data_dict = getattr(pkg, "__dict__", {}) if hasattr(pkg, "__dict__") else {"name": getattr(pkg, "name", None)}
-            # ensure JSON-serializable values
-            for k, v in list(data_dict.items()):
-                try:
-                    json.dumps(v)
-                except TypeError:
-                    data_dict[k] = str(v)
-            serializable[query] = {"ts": ts.isoformat(), "data": data_dict}
-        with open(self._cache_path, "w", encoding="utf-8") as f:
-            json.dump(serializable, f)
+        self._package_cache = {}
+        for query, entry in self._cache_store.items().items():
+            self._package_cache[query] = (entry.ts, entry.package)
+
+    def _save_cache_to_disk(self, queries):
+        # Per-key upserts, other workers' entries are left untouched
+        self._cache_store.put_many([(query, self._package_cache[query][1]) for query in queries],
+                                   ttl=self.package_ttl.total_seconds())
 
+    @traced("init_packages", PHASE)
     async def init_packages(self):
-        # In-memory and disk-backed cache for package lookups with 24h freshness
-        now = datetime.datetime.utcnow()
-        one_day = datetime.timedelta(days=1)
+        # In-memory and disk-backed cache for package lookups with 24h freshness.
+        # Only packages with no cached copy at all are awaited here.
+        now = datetime.datetime.now(datetime.timezone.utc)
 
         cache_map = [
             ("package-conversational-eco", "package-conversational-eco"),
             ("payment_method", "payment_method_package"),
         ]
+        misses = []
         for query, attr in cache_map:
-            cached = self._package_cache.get(query)
-            if cached:
-                ts, data = cached
+            # Read through to the store, another worker may have refreshed the entry
+            entry = self._cache_store.get(query, include_expired=True)
+            if entry:
+                self._package_cache[query] = (entry.ts, entry.package)
+                setattr(self, attr, entry.package)
+                if not entry.expired:
+                    self.cache_stats["hit"] += 1
+                else:
+                    # Stale-while-revalidate: serve the old copy now, refresh it in the background
+                    self.cache_stats["stale"] += 1
+                    self._schedule_refresh(query, attr)
+                continue
+            self.cache_stats["miss"] += 1
+            misses.append((query, attr))
+
+        if not misses:
+            return
+
+        # Fetch every miss concurrently; a failed or slow lookup keeps its previous
+        # cached copy (if any) and doesn't discard the results of the others.
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(self._fetch_package(query, semaphore) for query, _ in misses),
+            return_exceptions=True,
+        )
+        fetched = []
+        for (query, attr), result in zip(misses, results):
+            if isinstance(result, BaseException):
+                self.io.write(f"Package lookup for '{query}' failed: {result!r}")
+                cached = self._package_cache.get(query)
+                if cached:
+                    setattr(self, attr, cached[1])
+                continue
+            setattr(self, attr, result)
+            self._package_cache[query] = (now, result)
+            fetched.append(query)
+        self._save_cache_to_disk(fetched)
+
+    async def _fetch_package(self, query, semaphore):
+        async with semaphore:
+            return await asyncio.wait_for(self.search_package(query), timeout=self.lookup_timeout)
+
+    def _schedule_refresh(self, query, attr):
+        if query in self._refresh_tasks:
+            return
+        if self._refresh_semaphore is None:
+            self._refresh_semaphore = asyncio.Semaphore(self.max_concurrency)
+        task = asyncio.create_task(self._refresh_package(query, attr))
+        self._refresh_tasks[query] = task
+        task.add_done_callback(lambda _: self._refresh_tasks.pop(query, None))
+
+    async def _refresh_package(self, query, attr):
+        # Jitter so workers that started together don't all refresh the same entry at once
+        await asyncio.sleep(random.uniform(0, self.refresh_jitter))
+        delay = self.refresh_backoff
+        for attempt in range(self.refresh_retries + 1):
+            entry = self._cache_store.get(query)
+            if entry is None:
                 try:
-                    if now - ts < one_day:
-                        setattr(self, attr, data)
-                        continue
-                except Exception:
-                    pass
-            data = await self.search_package(query)
+                    data = await self._fetch_package(query, self._refresh_semaphore)
+                except Exception as e:
+                    if attempt == self.refresh_retries:
+                        self.io.write(f"Package refresh for '{query}' failed: {e!r}")
+                        return
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+                    delay *= 2
+                    continue
+                self._cache_store.put(query, data, ttl=self.package_ttl.total_seconds())
+                ts = datetime.datetime.now(datetime.timezone.utc)
+            else:
+                # Another worker already refreshed it
+                data, ts = entry.package, entry.ts
+            self._package_cache[query] = (ts, data)
             setattr(self, attr, data)
-            self._package_cache[query] = (now, data)
-        self._save_cache_to_disk()
+            return
 
+    async def wait_for_refreshes(self):
+        """Wait for the background package refreshes started by init_packages."""
+        if self._refresh_tasks:
+            await asyncio.gather(*list(self._refresh_tasks.values()), return_exceptions=True)
+
+    @traced("wizard", PHASE)
     async def start_wizard(self):
         try:
-            formatted = "No packages"
-            business_info_dict = self.basic_business_info()
-            business_info = self._format_answers(business_info_dict)
-            workflow_info_dict = self.workflow_business_info()
-            workflow_info = self._format_answers(workflow_info_dict)
-            business_info += "\n"+ workflow_info
-            business_type = self.check_business_info(business_info=workflow_info)
-            if business_type == BusinessType.e_commerce:
-                ebusiness_personality = self.ecommerce_personality(ai_tone=business_info_dict.get("¿Cual quieres que sea el tono de conversación?"))
-                ebusiness_context = f"Context: \"{workflow_info}"
-                packages = self.fill_packages_inputs([{"info":self._package_cache["package-conversational-eco"][1],"ignore_inputs":"personality, context"}, {"info":self._package_cache["payment_method"][1]}])
-                packages[0]["info"].updated_slots["personality"] = ebusiness_personality
-                packages[0]["info"].updated_slots["context"] = ebusiness_context
-                formatted_packages = self.format_packages_as_calls(packages)
-                formatted_packages.insert(0,formatted)
-                return self.create_ecommerce_workflow(formatted_packages)
-
-            business_info = self._format_answers(business_info_dict)+ "\n"+ workflow_info
-
-            workflow  = self.create_ebusiness_workflow(business_info, formatted,business_type)
-            return f"Business INFO:{business_info}\nFlujo:{workflow.business_workflow}"
+            graph = self._build_graph()
+            config = {"configurable": {"thread_id": self.session_id}}
+            resume = False
+            if self.checkpointer is not None:
+                snapshot = await graph.aget_state(config)
+                if snapshot.values.get("result") and not snapshot.next:
+                    return snapshot.values["result"]
+                resume = bool(snapshot.values)
+            state = await graph.ainvoke(None if resume else {"session_id": self.session_id}, config)
+            if self.checkpointer is not None:
+                self.checkpointer.clear_turns(self.session_id)
+            return state["result"]
 
         except Exception as e:
-            print(f"Error in start_wizard: {e}")
+            self.io.write(f"Error in start_wizard: {e}")
             raise 
-
-    def basic_business_info(self):
-        #Quite pregunta de ubicación puede ir en knowledge/mcp
-        questions = [{"question":"Me podrias describir tu negocio?","required":True},
-        {"question":"Que vendes? Como lo vendes?"},
-        {"question":"Qué es lo que hace tu negocio diferente?"},
-        {"question":"¿Con que frases saludas a tus clientes? ¿Cómo quieres que se presente el Agente IA a tus clientes?"},
-        {"question":"¿Con que frases te despides a tus clientes?"}, 
-        {"question":"¿Cual quieres que sea el tono de conversación?"},
-        
-        ]
-
-        answers = self.ask_questions(questions=questions,first_interaction=True)
+        finally:
+            await self._speculation.cancel_all()
+            logger.info(f"Speculative work: {self._speculation.stats}")
+
+    def _build_graph(self):
+        graph = StateGraph(WizardState)
+        graph.add_node("basic_info", traced("basic_info", PHASE)(self._basic_info_phase))
+        graph.add_node("workflow_info", traced("workflow_info", PHASE)(self._workflow_info_phase))
+        graph.add_node("classification", traced("classification", PHASE)(self._classification_phase))
+        graph.add_node("personality", traced("personality", PHASE)(self._personality_phase))
+        graph.add_node("package_filling", traced("package_filling", PHASE)(self._package_filling_phase))
+        graph.add_node("workflow_generation", traced("workflow_generation", PHASE)(self._workflow_generation_phase))
+        graph.set_entry_point("basic_info")
+        graph.add_edge("basic_info", "workflow_info")
+        graph.add_edge("workflow_info", "classification")
+        graph.add_conditional_edges("classification",
+                                    lambda state: "personality" if state["business_type"] == BusinessType.e_commerce.value else "workflow_generation",
+                                    ["personality", "workflow_generation"])
+        graph.add_edge("personality", "package_filling")
+        graph.add_edge("package_filling", END)
+        graph.add_edge("workflow_generation", END)
+        return graph.compile(checkpointer=self.checkpointer)
+
+    def _phase_inputs(self, state: WizardState):
+        business_info = self._format_answers(state["business_info_dict"])
+        workflow_info = self._format_answers(state["workflow_info_dict"])
+        collected_answers = {**state["business_info_dict"], **state["workflow_info_dict"]}
+        return business_info + "\n" + workflow_info, workflow_info, collected_answers
+
+    async def _basic_info_phase(self, state: WizardState):
+        return {"business_info_dict": await self.basic_business_info()}
+
+    async def _workflow_info_phase(self, state: WizardState):
+        return {"workflow_info_dict": await self.workflow_business_info()}
+
+    async def _classification_phase(self, state: WizardState):
+        business_info, workflow_info, collected_answers = self._phase_inputs(state)
+        # The local classifier's guess starts its branch while the LLM confirms the type. Without the classifier
+        # (JELOU_LOCAL_CLASSIFIER=0) there is no guess, and the branch only starts once the type is known
+        guess = self._guess_business_type(workflow_info)
+        self._speculate(guess, business_info, NO_PACKAGES, collected_answers)
+        business_type = await self.check_business_info(business_info=workflow_info)
+        if guess != business_type:
+            # Wrong branch, drop its work and start the right one
+            await self._speculation.cancel_all()
+            self._speculate(business_type, business_info, NO_PACKAGES, collected_answers)
+        return {"business_type": business_type.value}
+
+    async def _personality_phase(self, state: WizardState):
+        ai_tone = state["business_info_dict"].get(TONE_QUESTION)
+        return {"ebusiness_personality": await self.ecommerce_personality(ai_tone=ai_tone)}
+
+    async def _package_filling_phase(self, state: WizardState):
+        _, workflow_info, collected_answers = self._phase_inputs(state)
+        ebusiness_context = f"Context: \"{workflow_info}"
+        packages = await self.fill_packages_inputs(self._ecommerce_packages(), collected_answers)
+        packages[0]["info"].updated_slots["personality"] = state["ebusiness_personality"]
+        packages[0]["info"].updated_slots["context"] = ebusiness_context
+        formatted_packages = self.format_packages_as_calls(packages)
+        formatted_packages.insert(0,NO_PACKAGES)
+        return {"result": self.create_ecommerce_workflow(formatted_packages)}
+
+    async def _workflow_generation_phase(self, state: WizardState):
+        business_info, _, _ = self._phase_inputs(state)
+        workflow  = await self.create_ebusiness_workflow(business_info, NO_PACKAGES, BusinessType(state["business_type"]))
+        return {"result": f"Business INFO:{business_info}\nFlujo:{workflow.business_workflow}"}
+
+    @traced("wizard_headless", PHASE)
+    async def run_headless(self, business_info_dict, workflow_info_dict, personality_answers=None):
+        """Run the wizard without a user (batch mode): one pass per phase, no confirmation turns.
+
+        Package inputs that the answers don't cover are reported in missing_inputs instead of asked.
+        """
+        business_info = self._format_answers(business_info_dict) + "\n" + self._format_answers(workflow_info_dict)
+        workflow_info = self._format_answers(workflow_info_dict)
+        business_type = await self.check_business_info(business_info=workflow_info)
+        result = {"business_type": business_type.value}
+        if business_type == BusinessType.e_commerce:
+            packages_info = self._ecommerce_packages()
+            _, slot_stores, response = await self._open_packages_prefill(packages_info, {**business_info_dict, **workflow_info_dict})
+            packages = [{"usage": package["info"].usage,
+                         "info": self._package_inputs_from_slots(package["info"], response, slot_stores[package["info"].name])}
+                        for package in packages_info]
+            packages[0]["info"].updated_slots["personality"] = self._personality_prompt(business_info_dict.get(TONE_QUESTION), personality_answers or {})
+            packages[0]["info"].updated_slots["context"] = f"Context: \"{workflow_info}"
+            formatted_packages = self.format_packages_as_calls(packages)
+            formatted_packages.insert(0,NO_PACKAGES)
+            result["result"] = self.create_ecommerce_workflow(formatted_packages)
+            result["package_inputs"] = {name: slots.as_dict() for name, slots in slot_stores.items()}
+            if not response.all_inputs_filled:
+                result["missing_inputs"] = response.bot_response
+        else:
+            _, steps, response = await self._open_workflow_agent(business_info, NO_PACKAGES, business_type)
+            workflow = steps.render() if steps is not None else response.business_workflow
+            result["result"] = f"Business INFO:{business_info}\nFlujo:{workflow}"
+        return result
+
+    def _ecommerce_packages(self):
+        return [{"info":self._package_cache["package-conversational-eco"][1],"ignore_inputs":"personality, context"}, {"info":self._package_cache["payment_method"][1]}]
+
+    def _guess_business_type(self, workflow_info):
+        # Best local guess while the real classification runs, None if there is no local classifier
+        if self.business_classifier is None:
+            return None
+        return self.business_classifier.predict(workflow_info)[0]
+
+    def _speculate(self, business_type, business_info, packages_info, collected_answers):
+        """Start the first LLM turns of the branch for business_type in the background."""
+        if business_type == BusinessType.e_commerce and self.batch_prefill:
+            # The prefill only needs the interview answers, it's ready by the end of the personality questions
+            packages = self._ecommerce_packages()
+            name, fingerprint = self._prefill_key(packages, collected_answers)
+            self._speculation.start(name, fingerprint, lambda: self._open_packages_prefill(packages, collected_answers))
+        elif business_type == BusinessType.e_commerce:
+            # Package openers don't depend on the answers, they are ready by the end of the personality questions
+            for package in self._ecommerce_packages():
+                info, ignore_inputs = package["info"], package.get("ignore_inputs")
+                name, fingerprint = self._package_opener_key(info, ignore_inputs)
+                self._speculation.start(name, fingerprint, lambda info=info, ignore_inputs=ignore_inputs: self._open_package_filler(info, ignore_inputs))
+        elif business_type is not None:
+            name, fingerprint = self._workflow_draft_key(business_info, packages_info, business_type)
+            self._speculation.start(name, fingerprint, lambda: self._open_workflow_agent(business_info, packages_info, business_type))
+
+    async def basic_business_info(self):
+        answers = await self.ask_questions(questions=BASIC_QUESTIONS,first_interaction=True,checkpoint_key="basic_info")
         return answers
     
-    def workflow_business_info(self):
-        questions = [{"question":"¿Cual sera el flujo de trabajo propuesto?"},
-        {"question:":"¿Tienes algun mcp con información del negocio(Brinda el link)?"}    ]
-        answers = self.ask_questions(questions=questions)
+    async def workflow_business_info(self):
+        answers = await self.ask_questions(questions=WORKFLOW_QUESTIONS,checkpoint_key="workflow_info")
         return answers
 
 
-    def ecommerce_personality(self,ai_tone):
-        questions = [{"question":"Quieres que tu ia tenga una identidad en particular?","required":True},
-
-        {"question":"Tienes algun cuerpo de respuesta que quieras usar?","required":True}]
+    async def ecommerce_personality(self,ai_tone):
+        answers = await self.ask_questions(questions=PERSONALITY_QUESTIONS,checkpoint_key="personality")
+        return self._personality_prompt(ai_tone, answers)
 
-        answers = self.ask_questions(questions=questions)
-        answers = self._format_answers(answers)
+    def _personality_prompt(self, ai_tone, personality_answers):
+        answers = self._format_answers(personality_answers)
         answers = f"""Package Personality:\"
         {ai_tone}
         # Reglas Críticas
@@ -161,91 +403,235 @@ class JelouWizard():
         response = await jelou_mcp.get_package_info(prompt)
         return response
         
-    def check_business_info(self,business_info):
+    async def check_business_info(self,business_info):
+        if self.business_classifier is not None:
+            business_type = self.business_classifier.classify(business_info)
+            if business_type is not None:
+                return business_type
         business_agent = BusinessAgent()
-        response = business_agent.send_message(business_info)
+        response = await business_agent.asend_message(business_info)
+        if self.business_classifier is not None:
+            self.business_classifier.learn(business_info, response.business_type)
         return response.business_type
 
-    def ask_questions(self, questions: List[dict],answered_questions="",first_interaction=False):
-        qa_agent = QAAgent(question=questions,answered_questions=answered_questions)
-        if first_interaction:
-            response = qa_agent.send_message("Start asking me the questions as you were a Q&A Agent called Jelou Wizard.")
+    async def ask_questions(self, questions: List[dict],answered_questions="",first_interaction=False,checkpoint_key=None):
+        # Incremental mode: the model only returns changed slots, merged here
+        slots = SlotStore() if self.incremental_slots else None
+        qa_agent = QAAgent(question=questions,answered_questions=answered_questions,slot_store=slots)
+        response = self._restore_turn(checkpoint_key, qa_agent, slots)
+        if response is not None:
+            self._print_prepared(response)
         else:
-            response = qa_agent.send_message("Start asking me the questions as you were a Q&A Agent called Jelou Wizard.Don't introduce yourself, just start asking.")
-
-        print(response.bot_response)
+            if first_interaction:
+                response = await self._send(qa_agent, "Start asking me the questions as you were a Q&A Agent called Jelou Wizard.")
+            else:
+                response = await self._send(qa_agent, "Start asking me the questions as you were a Q&A Agent called Jelou Wizard.Don't introduce yourself, just start asking.")
+            self._merge_slots(slots, response)
+            self._save_turn(checkpoint_key, qa_agent, slots)
+        self._print_bot_response(response)
         user_answer = None
         
 
         while True:
-            user_message = input(">>> ")
+            user_message = await self._read_input(">>> ")
             if not user_message:
                 continue
-            print("")
-            response = qa_agent.send_message(user_message)
+            self.io.write("")
+            response = await self._send(qa_agent, user_message)
+            self._merge_slots(slots, response)
+            self._save_turn(checkpoint_key, qa_agent, slots)
 
-            user_answer = response.user_description
-            if response.all_questions_answered:
-                print(user_answer)
-                print(response.bot_response+"\n")
+            if slots is not None:
+                user_answer = slots.render()
             else:
-                print(response.bot_response+"\n")
+                user_answer = response.user_description
+            if response.all_questions_answered:
+                self.io.write(user_answer)
+            self._print_bot_response(response, "\n")
             if response.finished:  # ya validó la respuesta
-                return response.updated_slots
+                return slots.as_dict() if slots is not None else response.updated_slots
 
-    def fill_package_inputs(self,package_info,ignore_inputs=None):
+    async def fill_package_inputs(self,package_info,ignore_inputs=None):
             still_responding = True
-            pf_agent = PackageFillerAgent(package_info)
-            if not ignore_inputs:
-                response = pf_agent.send_message("Ask about the package inputs")
+            checkpoint_key = f"package:{package_info.name}"
+            pf_agent, slots = self._package_filler(package_info)
+            response = self._restore_turn(checkpoint_key, pf_agent, slots)
+            if response is not None:
+                self._print_prepared(response)
             else:
-                response = pf_agent.send_message("Ask about the package inputs, but ignore this(don't mention them either):"+ignore_inputs)
+                prepared = await self._speculation.take(*self._package_opener_key(package_info, ignore_inputs))
+                if prepared is not None:
+                    pf_agent, slots, response = prepared
+                    self._print_prepared(response)
+                else:
+                    pf_agent, slots, response = await self._open_package_filler(package_info, ignore_inputs, stream=self.stream)
+                self._save_turn(checkpoint_key, pf_agent, slots)
             while(still_responding):
-                print(getattr(response, "bot_response", ""))
-                user_message = input(">>>")
-                response = pf_agent.send_message(user_message)
+                self._print_bot_response(response)
+                user_message = await self._read_input(">>>")
+                response = await self._send(pf_agent, user_message)
+                self._merge_slots(slots, response)
+                self._save_turn(checkpoint_key, pf_agent, slots)
                 all_filled = bool(getattr(response, "all_inputs_filled", False))
                 user_confirmed = bool(getattr(response, "user_confirmed", False))
                 if all_filled and user_confirmed:
-                    print(getattr(response, "bot_response", "")+"\n")
+                    self._print_bot_response(response, "\n")
+                    if slots is not None:
+                        return self._package_inputs_from_slots(package_info, response, slots)
                     return response
-    def create_ebusiness_workflow(self,business_info, packages_info,business_type):
+    def _package_filler(self, package_info):
+        slots = SlotStore() if self.incremental_slots else None
+        return PackageFillerAgent(package_info, slot_store=slots), slots
+
+    async def _open_package_filler(self, package_info, ignore_inputs=None, stream=False):
+        """Create the package filler agent and get its first question."""
+        pf_agent, slots = self._package_filler(package_info)
+        send = self._send if stream else self._send_quiet
+        if not ignore_inputs:
+            response = await send(pf_agent, "Ask about the package inputs", use_cache=True)
+        else:
+            response = await send(pf_agent, "Ask about the package inputs, but ignore this(don't mention them either):"+ignore_inputs, use_cache=True)
+        self._merge_slots(slots, response)
+        return pf_agent, slots, response
+
+    def _package_opener_key(self, package_info, ignore_inputs):
+        return (f"package_opener:{package_info.name}",
+                SpeculativeScheduler.fingerprint(package_info.model_dump(), ignore_inputs, self.incremental_slots))
+
+    async def create_ebusiness_workflow(self,business_info, packages_info,business_type):
         still_responding = True
-        if business_type == BusinessType.e_commerce:
-            ecom_business_agent = EcommerceFlowAgent(business_info, packages_info)
-            #Flujo de commercio es quemado por que hacer un workflow, darlo quemadito.
+        checkpoint_key = "workflow"
+        ecom_business_agent, steps = self._workflow_agent(business_info, packages_info, business_type)
+        response = self._restore_turn(checkpoint_key, ecom_business_agent, steps=steps)
+        if response is not None:
+            self._print_prepared(response)
         else:
-            ecom_business_agent = SimpleInformativeFlowAgent()
-        response = ecom_business_agent.send_message(f"Dame el flujo de trabajo en pasos especificos basado en esta info, no menciones que te lo pedi: **Info de negocio**\n{business_info}\n **Paquetes** \n{packages_info} ")
-        print(getattr(response, "bot_response", ""))
+            prepared = await self._speculation.take(*self._workflow_draft_key(business_info, packages_info, business_type))
+            if prepared is not None:
+                ecom_business_agent, steps, response = prepared
+                self._print_prepared(response)
+            else:
+                ecom_business_agent, steps, response = await self._open_workflow_agent(business_info, packages_info, business_type, stream=self.stream)
+            self._save_turn(checkpoint_key, ecom_business_agent, steps=steps)
+        self._print_bot_response(response)
         while(still_responding):
-            user_message = input(">>>")
-            response = ecom_business_agent.send_message(user_message)
+            user_message = await self._read_input(">>>")
+            response = await self._send(ecom_business_agent, user_message)
+            self._apply_workflow_edits(steps, response)
+            self._save_turn(checkpoint_key, ecom_business_agent, steps=steps)
             user_confirmed = bool(getattr(response, "user_confirmed", False))
             if response.user_want_workflow:
-                print(response.business_workflow)
-                print(getattr(response, "bot_response", ""))
-            else:
-                print(getattr(response, "bot_response", ""))
+                self.io.write(steps.render() if steps is not None else response.business_workflow)
+            self._print_bot_response(response)
 
             if user_confirmed:
-                print(getattr(response, "bot_response", "")+"\n")
+                self._print_bot_response(response, "\n")
+                if steps is not None:
+                    return EBusinessWorkflowStructure(bot_response=response.bot_response,
+                                                      user_want_workflow=str(response.user_want_workflow),
+                                                      business_workflow=steps.render(),
+                                                      user_confirmed=True)
                 return response
 
+    def _workflow_agent(self, business_info, packages_info, business_type):
+        # Patch mode: the workflow lives here as steps, the model only returns step edits
+        steps = WorkflowSteps() if self.patch_workflow else None
+        if business_type == BusinessType.e_commerce:
+            ecom_business_agent = EcommerceFlowAgent(business_info, packages_info, workflow_steps=steps)
+            #Flujo de commercio es quemado por que hacer un workflow, darlo quemadito.
+        else:
+            ecom_business_agent = SimpleInformativeFlowAgent(workflow_steps=steps)
+        return ecom_business_agent, steps
+
+    async def _open_workflow_agent(self, business_info, packages_info, business_type, stream=False):
+        """Create the workflow agent and get its first draft."""
+        ecom_business_agent, steps = self._workflow_agent(business_info, packages_info, business_type)
+        send = self._send if stream else self._send_quiet
+        response = await send(ecom_business_agent, f"Dame el flujo de trabajo en pasos especificos basado en esta info, no menciones que te lo pedi: **Info de negocio**\n{business_info}\n **Paquetes** \n{packages_info} ", use_cache=True)
+        self._apply_workflow_edits(steps, response)
+        return ecom_business_agent, steps, response
+
+    def _workflow_draft_key(self, business_info, packages_info, business_type):
+        return ("workflow_draft",
+                SpeculativeScheduler.fingerprint(business_info, packages_info, business_type.value, self.patch_workflow))
+
+    def _apply_workflow_edits(self, steps, response):
+        if steps is not None:
+            errors = steps.apply(response.edits)
+            if errors:
+                logger.info(f"Skipped workflow edits: {errors}")
+
     def create_ecommerce_workflow(self,packages):
         wf = """Strictly Create this workflow:"""
         for index, package in enumerate(packages):
             wf +=f"{index+1}. Use this package {package} .\n"
         wf += "Connect all packages with conditionals using packages outputs, if the package has no output then connect them directly."
         return wf
-    def fill_packages_inputs(self, packages_info):
+    async def fill_packages_inputs(self, packages_info, collected_answers=None):
+        if self.batch_prefill and collected_answers:
+            return await self.prefill_packages_inputs(packages_info, collected_answers)
         packages = []
         for package_info in packages_info:
-            package = {"usage":package_info["info"].usage,"info":self.fill_package_inputs(package_info["info"],
+            package = {"usage":package_info["info"].usage,"info":await self.fill_package_inputs(package_info["info"],
             package_info.get("ignore_inputs"))}
             packages.append(package)
         return packages
 
+    async def prefill_packages_inputs(self, packages_info, collected_answers):
+        """Fill the inputs of every package in one conversation, starting from the answers already collected."""
+        checkpoint_key = "packages_prefill"
+        prefill_agent, slot_stores = self._packages_prefill_agent(packages_info, collected_answers)
+        response = self._restore_turn(checkpoint_key, prefill_agent, slot_stores)
+        if response is not None:
+            self._print_prepared(response)
+        else:
+            prepared = await self._speculation.take(*self._prefill_key(packages_info, collected_answers))
+            if prepared is not None:
+                prefill_agent, slot_stores, response = prepared
+                self._print_prepared(response)
+            else:
+                prefill_agent, slot_stores, response = await self._open_packages_prefill(packages_info, collected_answers, stream=self.stream)
+            self._save_turn(checkpoint_key, prefill_agent, slot_stores)
+        self._print_bot_response(response)
+        while True:
+            user_message = await self._read_input(">>>")
+            if not user_message:
+                continue
+            self.io.write("")
+            response = await self._send(prefill_agent, user_message)
+            self._merge_package_slots(slot_stores, response)
+            self._save_turn(checkpoint_key, prefill_agent, slot_stores)
+            self._print_bot_response(response, "\n")
+            if response.all_inputs_filled and response.user_confirmed:
+                return [{"usage": package["info"].usage,
+                         "info": self._package_inputs_from_slots(package["info"], response, slot_stores[package["info"].name])}
+                        for package in packages_info]
+
+    def _packages_prefill_agent(self, packages_info, collected_answers):
+        slot_stores = {package["info"].name: SlotStore() for package in packages_info}
+        return PackagesPrefillAgent(packages_info, collected_answers, slot_stores), slot_stores
+
+    async def _open_packages_prefill(self, packages_info, collected_answers, stream=False):
+        """Create the prefill agent and get the prefilled inputs plus the questions about the gaps."""
+        prefill_agent, slot_stores = self._packages_prefill_agent(packages_info, collected_answers)
+        send = self._send if stream else self._send_quiet
+        response = await send(prefill_agent, "Fill the package inputs with my previous answers and ask me about the missing ones", use_cache=True)
+        self._merge_package_slots(slot_stores, response)
+        return prefill_agent, slot_stores, response
+
+    def _prefill_key(self, packages_info, collected_answers):
+        packages = [(package["info"].model_dump(), package.get("ignore_inputs")) for package in packages_info]
+        return "packages_prefill", SpeculativeScheduler.fingerprint(packages, collected_answers)
+
+    def _merge_package_slots(self, slot_stores, response):
+        lowered = {name.strip().lower(): slots for name, slots in slot_stores.items()}
+        for package in response.packages:
+            slots = slot_stores.get(package.package_name) or lowered.get(package.package_name.strip().lower())
+            if slots is None:
+                logger.info(f"Ignoring inputs for unknown package {package.package_name}")
+                continue
+            slots.apply(package.changed_slots, package.removed_slots)
+
     def format_packages_as_calls(self, packages: List) -> str:
         calls: List[str] = []
         for pkg in packages:
@@ -285,6 +671,94 @@ class JelouWizard():
             calls.append(f"Paquete \"{name}\" con las siguientes inputs:\n{inputs_str} y output {outputs}.")
         return calls
 
+    def _save_turn(self, key, agent, slots=None, steps=None):
+        """Checkpoint an interactive phase after an agent turn, see _restore_turn."""
+        if self.checkpointer is None or key is None:
+            return
+        if isinstance(slots, dict):
+            saved_slots = {name: store.as_dict() for name, store in slots.items()}
+        else:
+            saved_slots = slots.as_dict() if slots is not None else None
+        state = {"agent": agent.get_state(), "slots": saved_slots, "steps": steps.steps if steps is not None else None}
+        self.checkpointer.save_turn(self.session_id, key, state)
+
+    def _restore_turn(self, key, agent, slots=None, steps=None):
+        """Load the last checkpointed turn of a phase into a fresh agent, returns its last response or None."""
+        if self.checkpointer is None or key is None:
+            return None
+        state = self.checkpointer.load_turn(self.session_id, key)
+        if state is None:
+            return None
+        agent.load_state(state["agent"])
+        if isinstance(slots, dict):
+            for name, saved in (state["slots"] or {}).items():
+                if name in slots:
+                    slots[name].apply(saved)
+        elif slots is not None:
+            slots.apply(state["slots"])
+        if steps is not None:
+            steps.steps = list(state["steps"] or [])
+        logger.info(f"Resumed {key} of session {self.session_id}")
+        return agent.last_response
+
+    def _merge_slots(self, slots, response):
+        if slots is not None:
+            slots.apply(response.changed_slots, response.removed_slots)
+
+    def _package_inputs_from_slots(self, package_info, response, slots):
+        """Full PackageInputsStructure for a package filled in incremental mode."""
+        inputs = getattr(package_info, "inputs", None) or []
+        outputs = getattr(package_info, "outputs", None) or []
+        return PackageInputsStructure(
+            bot_response=response.bot_response,
+            package_name=getattr(response, "package_name", package_info.name),
+            package_inputs=json.dumps(inputs, ensure_ascii=False) if inputs else "No inputs",
+            package_outputs=json.dumps(outputs, ensure_ascii=False) if outputs else "No outputs",
+            all_inputs_filled=response.all_inputs_filled,
+            user_confirmed=response.user_confirmed,
+            updated_slots=slots.as_dict(),
+        )
+
+    async def _send(self, agent, message, use_cache=None):
+        """Send a message to a structured agent, streaming bot_response to the terminal in stream mode."""
+        if not self.stream:
+            return await agent.asend_message(message, use_cache=use_cache)
+        printed = ""
+        async for partial in agent.astream_message(message, use_cache=use_cache):
+            text = getattr(partial, "bot_response", None) or ""
+            # Partials only grow, print what's new since the last one
+            if len(text) > len(printed) and text.startswith(printed):
+                self.io.write(text[len(printed):], end="", flush=True)
+                printed = text
+        response = agent.last_response
+        # Catch up on anything the partials didn't show
+        if not response.bot_response.startswith(printed):
+            self.io.write("\n" + response.bot_response, end="")
+        elif response.bot_response != printed:
+            self.io.write(response.bot_response[len(printed):], end="")
+        self.io.write("")
+        return response
+
+    async def _send_quiet(self, agent, message, use_cache=None):
+        # Background turns can't print, the user is still answering another question
+        return await agent.asend_message(message, use_cache=use_cache)
+
+    def _print_prepared(self, response):
+        # Speculative and resumed turns weren't streamed, _print_bot_response only prints the suffix in stream mode
+        if self.stream:
+            self.io.write(response.bot_response)
+
+    def _print_bot_response(self, response, suffix=""):
+        # In stream mode the bot response was already printed by _send
+        if self.stream:
+            self.io.write(suffix, end="")
+        else:
+            self.io.write(getattr(response, "bot_response", "")+suffix)
+
+    async def _read_input(self, prompt):
+        # Never blocks the event loop: ConsoleIO reads in a worker thread, QueueIO awaits the session's queue
+        return await self.io.read(prompt)
+
     def _format_answers(self, answers: Dict[str, str]) -> str:
         """Return a single string concatenating questions and answers."""
         parts: List[str] = []
@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SqliteCheckpointer(MemorySaver):
+    """
+    Checkpoints of the wizard graph plus the state of every in-progress agent turn, in SQLite.
+
+    Graph checkpoints reuse MemorySaver's logic: every put is written through to the
+    database and a thread is loaded back into memory the first time it's read. Turns hold
+    what a phase needs to continue a conversation (agent history, last response, slots),
+    so a resumed session doesn't repeat paid-for LLM calls.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._loaded = set()
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    checkpoint_type TEXT NOT NULL,
+                    checkpoint BLOB NOT NULL,
+                    metadata_type TEXT NOT NULL,
+                    metadata BLOB NOT NULL,
+                    parent_id TEXT,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    value_type TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));
+                CREATE TABLE IF NOT EXISTS turns (
+                    thread_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (thread_id, key));
+            """)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    # Graph checkpoints
+
+    def _load_thread(self, thread_id: str) -> None:
+        if thread_id in self._loaded:
+            return
+        with self._lock:
+            if thread_id in self._loaded:
+                return
+            conn = self._connect()
+            try:
+                for ns, checkpoint_id, c_type, checkpoint, m_type, metadata, parent_id in conn.execute(
+                        "SELECT checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id "
+                        "FROM checkpoints WHERE thread_id = ?", (thread_id,)):
+                    self.storage[thread_id][ns][checkpoint_id] = ((c_type, checkpoint), (m_type, metadata), parent_id)
+                for ns, checkpoint_id, task_id, idx, channel, v_type, value in conn.execute(
+                        "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value "
+                        "FROM writes WHERE thread_id = ?", (thread_id,)):
+                    self.writes[(thread_id, ns, checkpoint_id)][(task_id, idx)] = (task_id, channel, (v_type, value))
+            finally:
+                conn.close()
+            self._loaded.add(thread_id)
+
+    def get_tuple(self, config):
+        self._load_thread(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config:
+            self._load_thread(config["configurable"]["thread_id"])
+        return super().list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        self._load_thread(thread_id)
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        ns = next_config["configurable"]["checkpoint_ns"]
+        (c_type, c_data), (m_type, m_data), parent_id = self.storage[thread_id][ns][checkpoint["id"]]
+        self._execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                      [(thread_id, ns, checkpoint["id"], c_type, c_data, m_type, m_data, parent_id)])
+        return next_config
+
+    def put_writes(self, config, writes, task_id):
+        thread_id = config["configurable"]["thread_id"]
+        self._load_thread(thread_id)
+        super().put_writes(config, writes, task_id)
+        key = (thread_id, config["configurable"]["checkpoint_ns"], config["configurable"]["checkpoint_id"])
+        rows = [(*key, task, idx, channel, v_type, value)
+                for (task, idx), (_, channel, (v_type, value)) in self.writes[key].items() if task == task_id]
+        self._execute("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _execute(self, sql: str, rows) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # Turns
+
+    def save_turn(self, thread_id: str, key: str, state: Dict[str, Any]) -> None:
+        self._execute("INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?)",
+                      [(thread_id, key, json.dumps(state, ensure_ascii=False), time.time())])
+
+    def load_turn(self, thread_id: str, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT state FROM turns WHERE thread_id = ? AND key = ?", (thread_id, key)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def clear_turns(self, thread_id: str) -> None:
+        self._execute("DELETE FROM turns WHERE thread_id = ?", [(thread_id,)])
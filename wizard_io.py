@@ -0,0 +1,94 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Dict, List
+
+
+class WizardIO(ABC):
+    """Where a wizard session writes its output and reads the user's messages from."""
+
+    @abstractmethod
+    def write(self, *values: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        """Same signature as print."""
+
+    @abstractmethod
+    async def read(self, prompt: str = "") -> str:
+        """Wait for the user's next message."""
+
+
+class ConsoleIO(WizardIO):
+    """Terminal session: print and input, the blocking read runs in a worker thread."""
+
+    def write(self, *values: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        print(*values, sep=sep, end=end, flush=flush)
+
+    async def read(self, prompt: str = "") -> str:
+        return await asyncio.to_thread(input, prompt)
+
+
+class NullIO(WizardIO):
+    """Headless runs: output is dropped and there is nobody to answer."""
+
+    def write(self, *values: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        pass
+
+    async def read(self, prompt: str = "") -> str:
+        raise RuntimeError("No user input available in headless mode")
+
+
+class QueueIO(WizardIO):
+    """
+    Session driven through queues (server mode).
+
+    User messages are fed into a bounded queue, feed() refuses new ones while
+    max_pending_messages are still unread. Output is buffered as events until the client
+    collects them; consecutive writes are merged into one output event.
+    """
+
+    def __init__(self, max_pending_messages: int = 4):
+        self._inbound: asyncio.Queue = asyncio.Queue(maxsize=max_pending_messages)
+        self._events: deque = deque()
+        self._event_ready = asyncio.Event()
+        self.waiting_for_input = False
+
+    def write(self, *values: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        text = sep.join(str(value) for value in values) + end
+        if self._events and self._events[-1]["type"] == "output":
+            self._events[-1]["text"] += text
+            return
+        self.emit({"type": "output", "text": text})
+
+    async def read(self, prompt: str = "") -> str:
+        self.emit({"type": "prompt", "text": prompt})
+        self.waiting_for_input = True
+        try:
+            return await self._inbound.get()
+        finally:
+            self.waiting_for_input = False
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self._events.append(event)
+        self._event_ready.set()
+
+    def feed(self, message: str) -> bool:
+        """Queue a user message, False if the session has too many unread ones."""
+        try:
+            self._inbound.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def pending_messages(self) -> int:
+        return self._inbound.qsize()
+
+    async def next_events(self, timeout: float = 0.0) -> List[Dict[str, Any]]:
+        """Every buffered event, waiting up to timeout seconds for the first one."""
+        if not self._events and timeout > 0:
+            try:
+                await asyncio.wait_for(self._event_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        events = list(self._events)
+        self._events.clear()
+        self._event_ready.clear()
+        return events